@@ -0,0 +1,92 @@
+"""
+Liability projection benchmark.
+
+Times projection.project (vectorized, one pass per rate) against the
+straightforward per-deposit, per-week loop on synthetic deposits, checks
+that both agree, and optionally times loading the arrays from a seeded
+database (see seed_data.py).
+
+    python benchmarks/liabilities.py --deposits 1000000 --weeks 52 --rates 0.01 0.02 0.03
+    python benchmarks/liabilities.py --db /tmp/bench.db
+
+The loop is run on --loop-sample deposits and scaled up, since the full run
+takes minutes.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+MIN_INVEST_DAYS = 60
+
+
+def loop_projection(amounts, days, weeks, rate, min_invest_days=MIN_INVEST_DAYS):
+    """Reference: the per-deposit loop the vectorized version replaces."""
+    liability = [0.0] * (weeks + 1)
+    unlocked = [0.0] * (weeks + 1)
+    for amount, age in zip(amounts.tolist(), days.tolist()):
+        for k in range(weeks + 1):
+            d = age + 7 * k
+            value = amount * (1 + rate) ** (d / 7)
+            liability[k] += value
+            if d >= min_invest_days:
+                unlocked[k] += value
+    return np.array(liability), np.array(unlocked)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--deposits", type=int, default=1_000_000)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.01, 0.02, 0.03])
+    parser.add_argument("--loop-sample", type=int, default=20_000)
+    parser.add_argument("--db", help="seeded SQLite file: also time load_deposits()")
+    args = parser.parse_args()
+
+    from src.app.projection import project
+
+    rng = np.random.default_rng(42)
+    amounts = rng.uniform(10, 5000, args.deposits).round(2)
+    days = rng.integers(0, 365, args.deposits)
+
+    started = time.perf_counter()
+    results = [project(amounts, days, args.weeks, rate, MIN_INVEST_DAYS) for rate in args.rates]
+    vectorized = time.perf_counter() - started
+
+    sample = slice(0, min(args.loop_sample, args.deposits))
+    started = time.perf_counter()
+    reference = [loop_projection(amounts[sample], days[sample], args.weeks, rate) for rate in args.rates]
+    loop = (time.perf_counter() - started) * args.deposits / len(amounts[sample])
+
+    for rate, (liability, unlocked) in zip(args.rates, reference):
+        check = project(amounts[sample], days[sample], args.weeks, rate, MIN_INVEST_DAYS)
+        assert np.allclose(check["liability"], liability, rtol=1e-9), rate
+        assert np.allclose(check["unlocked"], unlocked, rtol=1e-9), rate
+
+    print(f"{args.deposits} deposits x {args.weeks + 1} weeks x {len(args.rates)} rates")
+    print(f"vectorized     {vectorized * 1000:10.1f} ms")
+    print(f"per-deposit    {loop * 1000:10.1f} ms (scaled from {len(amounts[sample])} deposits)")
+    print(f"speedup        {loop / vectorized:10.0f}x  (results match the loop)")
+    print(f"week {args.weeks} owed at {args.rates[-1]:.2%}/wk: "
+          f"{results[-1]['liability'][-1]:,.2f} USDT ({results[-1]['unlocked'][-1]:,.2f} unlocked)")
+
+    if args.db:
+        os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.abspath(args.db)}"
+        from src.app import create_app
+        from src.app.projection import load_deposits
+
+        app = create_app()
+        with app.app_context():
+            started = time.perf_counter()
+            loaded, _ = load_deposits()
+            print(f"load_deposits  {(time.perf_counter() - started) * 1000:10.1f} ms "
+                  f"({loaded.size} approved deposits from {args.db})")
+
+
+if __name__ == "__main__":
+    main()
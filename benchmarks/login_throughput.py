@@ -0,0 +1,126 @@
+"""
+Login throughput benchmark.
+
+For each argon2 cost setting, a fresh process boots the app on a temporary
+SQLite database with one user and fires POST /login from several client
+threads at once, reporting throughput and p50/p99 latency. Logins that were
+shed with 503 (hash queue full) are counted separately.
+
+    python benchmarks/login_throughput.py
+    python benchmarks/login_throughput.py --costs 1:19456 3:65536 --threads 16 --logins 20
+    python benchmarks/login_throughput.py --hash-workers 4 --json
+
+A cost is TIME:MEMORY_KIB (ARGON2_TIME_COST:ARGON2_MEMORY_COST).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+EMAIL, PASSWORD = "bench@example.com", "correct horse battery staple"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_child(threads, logins):
+    """Runs inside the per-setting process; ARGON2_* come from the environment."""
+    from src.app import create_app, db
+    from src.app.migrations import upgrade
+    from src.app.models import User
+    from src.app.passwords import hash_password
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
+        db.session.add(User(username="bench", email=EMAIL, password=hash_password(PASSWORD)))
+        db.session.commit()
+
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def client_thread():
+        client = app.test_client()
+        barrier.wait()
+        for _ in range(logins):
+            start = time.perf_counter()
+            status = client.post("/login", data={"email": EMAIL, "password": PASSWORD}).status_code
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+
+    workers = [threading.Thread(target=client_thread) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+
+    ok = [ms for ms, status in zip(latencies, statuses) if status == 302]
+    return {
+        "logins": len(latencies),
+        "ok": len(ok),
+        "shed_503": statuses.count(503),
+        "logins_per_s": round(len(ok) / wall, 1),
+        "p50_ms": round(statistics.median(ok), 1) if ok else None,
+        "p99_ms": round(percentile(ok, 99), 1) if ok else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--costs", nargs="+", default=["1:19456", "2:65536", "3:65536"])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=10, help="logins per client thread")
+    parser.add_argument("--hash-workers", type=int, default=None, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.threads, args.logins)))
+        return
+
+    results = []
+    for cost in args.costs:
+        time_cost, memory_cost = cost.split(":")
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, ARGON2_TIME_COST=time_cost, ARGON2_MEMORY_COST=memory_cost,
+                       SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp}/login.db",
+                       RATE_LIMIT_ENABLED=os.getenv("RATE_LIMIT_ENABLED", "0"))  # one client address for all logins
+            if args.hash_workers:
+                env["PASSWORD_HASH_WORKERS"] = str(args.hash_workers)
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", "--threads", str(args.threads),
+                 "--logins", str(args.logins)],
+                env=env, capture_output=True, text=True, check=True,
+            )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        result["cost"] = cost
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.threads} client threads x {args.logins} logins")
+    print(f"{'cost (t:KiB)':<14}{'logins/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'503s':>7}")
+    for r in results:
+        print(f"{r['cost']:<14}{r['logins_per_s']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['shed_503']:>7}")
+
+
+if __name__ == "__main__":
+    main()
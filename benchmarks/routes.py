@@ -0,0 +1,262 @@
+"""
+Per-route benchmark driver.
+
+Seeds a synthetic database (see seed_data.py), or copies an existing one,
+then drives each route through the Flask test client from WORKERS concurrent
+threads and reports throughput, latency percentiles, status codes and SQL
+queries per request. Results are JSON so runs can be compared across commits:
+
+    python benchmarks/routes.py --users 100000 --deposits 1000000 --out after.json
+    python benchmarks/routes.py --db /tmp/bench.db --routes dashboard admin --baseline before.json
+
+Approval routes consume pending rows, so they run last and each request
+approves a different deposit / KYC submission.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Every simulated client shares one address: measure the routes, not the limiter
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import seed_data  # noqa: E402
+
+
+# -------------------------
+# Route scenarios: pools -> (method, path, user_id, form data)
+# -------------------------
+class Pools:
+    """Ids the scenarios draw from, loaded once from the seeded database."""
+
+    def __init__(self, app, sample=5000):
+        from sqlalchemy import select
+        from src.app import db
+        from src.app.models import User, KYCLog, Deposit
+
+        with app.app_context():
+            def ids(query):
+                return list(db.session.execute(query.limit(sample)).scalars())
+
+            self.users = ids(select(User.id).order_by(db.func.random()))
+            self.verified = ids(select(User.id).where(User.kyc_status == "approved")
+                                .order_by(db.func.random()))
+            self.pending_deposits = ids(select(Deposit.id).where(Deposit.status == "pending")
+                                        .order_by(Deposit.id))
+            self.pending_kyc = ids(select(KYCLog.id).where(KYCLog.status == "pending")
+                                   .order_by(KYCLog.id))
+            self.admin = db.session.execute(select(User.id).where(User.is_admin)).scalar()
+        self._lock = threading.Lock()
+
+    def take(self, name):
+        with self._lock:
+            pool = getattr(self, name)
+            return pool.pop() if pool else None
+
+
+def _approve_deposit(rng, pools):
+    dep_id = pools.take("pending_deposits")
+    return dep_id and ("GET", f"/admin/approve_deposit/{dep_id}", pools.admin, None)
+
+
+def _approve_kyc(rng, pools):
+    kyc_id = pools.take("pending_kyc")
+    return kyc_id and ("GET", f"/admin/approve_kyc/{kyc_id}", pools.admin, None)
+
+
+SCENARIOS = {
+    "dashboard": lambda rng, p: ("GET", "/dashboard", rng.choice(p.users), None),
+    "deposit": lambda rng, p: ("GET", "/deposit", rng.choice(p.verified), None),
+    "withdraw": lambda rng, p: ("GET", "/withdraw", rng.choice(p.verified), None),
+    "admin": lambda rng, p: ("GET", "/admin", p.admin, None),
+    "admin_pending": lambda rng, p: ("GET", "/admin?status=pending", p.admin, None),
+    "login": lambda rng, p: ("POST", "/login", None, {"email": seed_data.ADMIN_EMAIL,
+                                                      "password": seed_data.BENCH_PASSWORD}),
+    "approve_deposit": _approve_deposit,
+    "approve_kyc": _approve_kyc,
+}
+
+
+# -------------------------
+# Driver
+# -------------------------
+_queries = threading.local()
+
+
+def count_queries(app):
+    from sqlalchemy import event
+    from src.app import db
+
+    def before_cursor_execute(*_):
+        _queries.n = getattr(_queries, "n", 0) + 1
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_route(app, pools, name, requests, workers, seed):
+    scenario = SCENARIOS[name]
+    samples, statuses = [], Counter()
+    lock = threading.Lock()
+    per_worker = [requests // workers + (1 if i < requests % workers else 0) for i in range(workers)]
+    barrier = threading.Barrier(workers)
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = app.test_client()
+        current = object()
+        barrier.wait()
+        for _ in range(per_worker[index]):
+            call = scenario(rng, pools)
+            if not call:
+                break  # pool of pending rows used up
+            method, path, user_id, data = call
+            if user_id != current:
+                with client.session_transaction() as sess:
+                    sess.clear()
+                    if user_id is not None:
+                        sess["_user_id"], sess["_fresh"] = str(user_id), True
+                current = user_id
+            _queries.n = 0
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples.append((elapsed, _queries.n))
+                statuses[response.status_code] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies = sorted(ms for ms, _ in samples)
+    queries = [q for _, q in samples]
+    if not latencies:
+        return {"requests": 0}
+    return {
+        "requests": len(samples),
+        "errors": sum(n for code, n in statuses.items() if code >= 500),
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+        "throughput_rps": round(len(samples) / wall, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 2),
+            "p50": round(_percentile(latencies, 50), 2),
+            "p90": round(_percentile(latencies, 90), 2),
+            "p99": round(_percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2),
+        },
+        "queries_per_request": {"mean": round(statistics.mean(queries), 2), "max": max(queries)},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """Print per-route deltas against an earlier report."""
+    print(f"\nvs baseline {baseline['meta'].get('commit')}:")
+    for name, now in report["routes"].items():
+        before = baseline["routes"].get(name)
+        if not before or not now.get("requests") or not before.get("requests"):
+            continue
+
+        def delta(a, b):
+            return f"{(a - b) / b * 100:+.0f}%" if b else "n/a"
+
+        print(f"  {name:<16} rps {delta(now['throughput_rps'], before['throughput_rps']):>6}  "
+              f"p50 {delta(now['latency_ms']['p50'], before['latency_ms']['p50']):>6}  "
+              f"p99 {delta(now['latency_ms']['p99'], before['latency_ms']['p99']):>6}  "
+              f"queries {before['queries_per_request']['mean']} -> {now['queries_per_request']['mean']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", help="existing seeded SQLite file (copied, never modified)")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--deposits", type=int, default=100_000)
+    parser.add_argument("--routes", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent client threads")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        if args.db:
+            shutil.copy(args.db, path)
+            os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+            from src.app import create_app
+            from src.app.migrations import upgrade
+
+            app = create_app()
+            with app.app_context():
+                upgrade()
+            counts = None
+        else:
+            app, counts = seed_data.create_database(path, args.users, args.deposits, args.seed)
+
+        pools = Pools(app)
+        count_queries(app)
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "when": datetime.utcnow().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "db_profile": os.getenv("DB_PROFILE", "default"),
+                "seeded": counts or {"db": args.db},
+                "requests_per_route": args.requests,
+                "workers": args.workers,
+            },
+            "routes": {},
+        }
+        ordered = sorted(args.routes, key=lambda r: r.startswith("approve_"))
+        for name in ordered:
+            report["routes"][name] = run_route(app, pools, name, args.requests, args.workers, args.seed)
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    print(f"{'route':<16}{'req':>6}{'rps':>9}{'p50 ms':>9}{'p99 ms':>9}{'q/req':>7}  status")
+    for name, r in report["routes"].items():
+        if not r.get("requests"):
+            print(f"{name:<16}{0:>6}  (nothing to do)")
+            continue
+        print(f"{name:<16}{r['requests']:>6}{r['throughput_rps']:>9}{r['latency_ms']['p50']:>9}"
+              f"{r['latency_ms']['p99']:>9}{r['queries_per_request']['mean']:>7}  {r['status_codes']}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            compare(report, json.load(fh))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Synthetic data seeder.
+
+Bulk-inserts users, KYC submissions, deposits and the matching ledger entries
+into a fresh database, with a realistic spread of statuses and timestamps:
+
+- users: ~60% KYC approved, ~30% pending, ~10% rejected; user 1 is an admin
+- KYC logs: one per user plus resubmissions for ~20% of users
+- deposits: spread over the last DAYS days, ~70% approved / 20% pending /
+  10% rejected; approved ones are credited through ledger entries, so
+  `flask ledger-reconcile` passes on the seeded data
+
+Every user has the password BENCH_PASSWORD (one hash is shared, so seeding
+doesn't spend hours in argon2).
+
+    python benchmarks/seed_data.py --db /tmp/bench.db --users 100000 --deposits 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "admin@bench.local"
+DAYS = 365
+CHUNK = 20_000
+MICRO = 1_000_000
+
+KYC_STATUSES = (("approved", 0.6), ("pending", 0.3), ("rejected", 0.1))
+DEPOSIT_STATUSES = (("approved", 0.7), ("pending", 0.2), ("rejected", 0.1))
+
+
+def _pick(rng, weighted):
+    roll, acc = rng.random(), 0.0
+    for value, weight in weighted:
+        acc += weight
+        if roll < acc:
+            return value
+    return weighted[-1][0]
+
+
+def _insert(table, rows):
+    from sqlalchemy import insert
+    from src.app import db
+
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(insert(table), rows[start:start + CHUNK])
+
+
+def seed(users, deposits, seed=42, now=None):
+    """Insert the synthetic data set (inside an app context). Returns row counts."""
+    from src.app import db
+    from src.app.models import User, KYCLog, Deposit, LedgerEntry
+    from src.app.passwords import hash_password
+    from src.app.rollups import rebuild
+    from src.app.unlocks import rebuild as rebuild_unlocks
+
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    password = hash_password(BENCH_PASSWORD)
+
+    def moment():
+        return now - timedelta(seconds=rng.randrange(DAYS * 86400))
+
+    user_rows, kyc_rows = [], []
+    for uid in range(1, users + 1):
+        status = "approved" if uid == 1 else _pick(rng, KYC_STATUSES)
+        user_rows.append({
+            "id": uid, "username": f"user{uid}", "password": password,
+            "email": ADMIN_EMAIL if uid == 1 else f"user{uid}@bench.local",
+            "kyc_status": status, "is_admin": uid == 1,
+            "balance_micro": 0, "total_deposits_micro": 0, "total_withdrawals_micro": 0,
+            "total_earnings": 0.0,
+        })
+        submissions = 2 if rng.random() < 0.2 else 1
+        for n in range(submissions):
+            kyc_rows.append({
+                "user_id": uid, "full_name": f"User {uid}", "id_number": f"ID{uid:08d}",
+                "document_path": f"/bench/{uid}_{n}.jpg",
+                "status": status if n == submissions - 1 else "rejected",
+                "timestamp": moment(),
+            })
+    kyc_rows.sort(key=lambda row: row["timestamp"])
+
+    deposit_rows, ledger_rows = [], []
+    for dep_id in range(1, deposits + 1):
+        uid = rng.randint(1, users)
+        amount = round(rng.uniform(10, 5000), 2)
+        status = _pick(rng, DEPOSIT_STATUSES)
+        ts = moment()
+        deposit_rows.append({
+            "id": dep_id, "user_id": uid, "amount": amount, "network": "TRC20",
+            "tx_hash": f"{rng.getrandbits(128):032x}", "status": status, "timestamp": ts,
+            "accrued_interest": 0.0,
+        })
+        if status == "approved":
+            micro = round(amount * MICRO)
+            user_rows[uid - 1]["balance_micro"] += micro
+            user_rows[uid - 1]["total_deposits_micro"] += micro
+            ledger_rows.append({"user_id": uid, "amount_micro": micro, "kind": "deposit",
+                                "reference": f"deposit:{dep_id}", "timestamp": ts})
+
+    _insert(User.__table__, user_rows)
+    _insert(KYCLog.__table__, kyc_rows)
+    _insert(Deposit.__table__, deposit_rows)
+    _insert(LedgerEntry.__table__, ledger_rows)
+    db.session.commit()
+    rebuild()  # rows went in below the ORM hooks, so derive the rollup counters once
+    rebuild_unlocks(now)  # ... and the per-deposit / per-user withdrawal unlock state
+    return {"users": len(user_rows), "kyc_logs": len(kyc_rows),
+            "deposits": len(deposit_rows), "ledger_entries": len(ledger_rows)}
+
+
+def create_database(path, users, deposits, seed_value=42):
+    """Fresh schema + synthetic data at `path`. Returns (app, counts)."""
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.abspath(path)}"
+    from src.app import create_app
+    from src.app.migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        upgrade()
+        counts = seed(users, deposits, seed_value)
+    return app, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", required=True, help="SQLite file to create (must not exist)")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--deposits", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists")
+    started = time.perf_counter()
+    _, counts = create_database(args.db, args.users, args.deposits, args.seed)
+    print(f"seeded {counts} in {time.perf_counter() - started:.1f}s -> {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Application startup benchmark.
+
+Every sample runs in a fresh interpreter (a cold worker) and measures:
+
+- import:  `import run` (package import + the single create_app call)
+- first:   the first request served by that worker (GET /login)
+- upgrade: create_all() + pending migrations, i.e. the work the old boot path
+           did in every worker (twice, through src.app and run.py)
+
+The schema is created once up front, the same way a deploy runs
+`flask --app run db-upgrade` before starting workers.
+
+    python benchmarks/startup.py --runs 10
+    python benchmarks/startup.py --runs 5 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import run
+t1 = time.perf_counter()
+client = run.app.test_client()
+status = client.get("/login").status_code
+t2 = time.perf_counter()
+upgrade_ms = None
+if "--upgrade" in sys.argv:
+    from src.app.migrations import upgrade
+    with run.app.app_context():
+        t3 = time.perf_counter()
+        upgrade()
+        upgrade_ms = (time.perf_counter() - t3) * 1000
+heavy = sorted(m for m in ("qrcode", "PIL", "numpy", "binance", "argon2", "redis") if m in sys.modules)
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000,
+                  "upgrade_ms": upgrade_ms, "status": status, "heavy_modules": heavy}))
+"""
+
+
+def sample(env, upgrade=False):
+    args = [sys.executable, "-c", PROBE] + (["--upgrade"] if upgrade else [])
+    out = subprocess.run(args, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(values):
+    values = sorted(values)
+    return {"p50": round(statistics.median(values), 1), "max": round(values[-1], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp}/startup.db",
+                   PYTHONPATH=ROOT)
+        subprocess.run([sys.executable, "-m", "flask", "--app", "run", "db-upgrade"],
+                       cwd=ROOT, env=env, capture_output=True, check=True)
+
+        samples = [sample(env, upgrade=True) for _ in range(args.runs)]
+
+    result = {
+        "runs": args.runs,
+        "import_ms": summarize([s["import_ms"] for s in samples]),
+        "first_request_ms": summarize([s["first_request_ms"] for s in samples]),
+        "upgrade_ms": summarize([s["upgrade_ms"] for s in samples]),
+        "heavy_modules_loaded": samples[-1]["heavy_modules"],
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"runs: {args.runs}")
+    for key in ("import_ms", "first_request_ms", "upgrade_ms"):
+        print(f"{key:<18} p50 {result[key]['p50']:>7} ms   max {result[key]['max']:>7} ms")
+    print("heavy modules loaded at boot:", ", ".join(result["heavy_modules_loaded"]) or "none")
+
+
+if __name__ == "__main__":
+    main()
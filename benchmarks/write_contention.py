@@ -0,0 +1,153 @@
+"""
+Multi-process SQLite write-contention benchmark.
+
+Each worker process repeats the old dashboard pattern (read a user's
+deposits, update the user row, commit) against one shared database file and
+records how long each write transaction took, including time spent waiting
+on SQLite's lock. Runs once per DB profile so the default journaling and the
+production profile (WAL, synchronous=NORMAL, busy timeout) can be compared.
+
+    python benchmarks/write_contention.py --workers 8 --ops 300
+    python benchmarks/write_contention.py --profile production --json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+# Importing the package boots the app; keep that off the real platform.db
+os.environ.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite://")
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from src.app.database import engine_options, install_pragmas  # noqa: E402
+
+USERS = 200
+DEPOSITS_PER_USER = 5
+
+
+def _engine(uri, profile):
+    engine = create_engine(uri, **engine_options(uri, profile))
+    install_pragmas(engine, profile)
+    return engine
+
+
+def setup_database(path):
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE user (id INTEGER PRIMARY KEY, total_earnings FLOAT DEFAULT 0);
+        CREATE TABLE deposit (id INTEGER PRIMARY KEY, user_id INTEGER, amount FLOAT, status TEXT);
+        CREATE INDEX ix_deposit_user_id ON deposit (user_id);
+    """)
+    conn.executemany("INSERT INTO user (id) VALUES (?)", [(i,) for i in range(1, USERS + 1)])
+    conn.executemany(
+        "INSERT INTO deposit (user_id, amount, status) VALUES (?, ?, 'approved')",
+        [(u, 100.0) for u in range(1, USERS + 1) for _ in range(DEPOSITS_PER_USER)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def worker(uri, profile, ops, seed, results):
+    engine = _engine(uri, profile)
+    latencies, errors = [], 0
+    for i in range(ops):
+        user_id = (seed * 7919 + i) % USERS + 1
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                total = conn.execute(
+                    text("SELECT SUM(amount) FROM deposit WHERE user_id = :u AND status = 'approved'"),
+                    {"u": user_id},
+                ).scalar()
+                conn.execute(
+                    text("UPDATE user SET total_earnings = :t WHERE id = :u"),
+                    {"t": total * 0.02, "u": user_id},
+                )
+        except OperationalError:
+            errors += 1  # "database is locked" after the busy timeout ran out
+            continue
+        latencies.append(time.perf_counter() - started)
+    engine.dispose()
+    results.put((latencies, errors))
+
+
+def run(profile, workers, ops):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        setup_database(path)
+        uri = f"sqlite:///{path}"
+
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(uri, profile, ops, n, results))
+            for n in range(workers)
+        ]
+        started = time.perf_counter()
+        for p in procs:
+            p.start()
+        collected = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(l for lats, _ in collected for l in lats)
+    errors = sum(e for _, e in collected)
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+
+    return {
+        "profile": profile,
+        "workers": workers,
+        "ops_per_worker": ops,
+        "committed": len(latencies),
+        "lock_errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_tps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+            "p50": round(pct(0.50), 2) if latencies else None,
+            "p99": round(pct(0.99), 2) if latencies else None,
+            "max": round(latencies[-1] * 1000, 2) if latencies else None,
+        },
+        # Time a transaction spent beyond the uncontended median ~ time waiting on the lock
+        "lock_wait_ms_total": round(
+            sum(max(0.0, l - latencies[len(latencies) // 2]) for l in latencies) * 1000, 1
+        ) if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=300, help="transactions per worker")
+    parser.add_argument("--profile", choices=("default", "production"), action="append",
+                        help="profile(s) to run; default runs both")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    reports = [run(p, args.workers, args.ops) for p in (args.profile or ["default", "production"])]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    for r in reports:
+        lat = r["latency_ms"]
+        print(f"{r['profile']:>10}: {r['throughput_tps']:>8} tx/s  "
+              f"p50 {lat['p50']} ms  p99 {lat['p99']} ms  max {lat['max']} ms  "
+              f"lock wait {r['lock_wait_ms_total']} ms  lock errors {r['lock_errors']}")
+
+
+if __name__ == "__main__":
+    main()
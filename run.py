@@ -3,4 +3,10 @@ from src.app import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Local dev server: create/migrate the schema first (production runs
+    # `flask --app run db-upgrade` as a release step instead).
+    from src.app.migrations import upgrade
+
+    with app.app_context():
+        upgrade()
+    app.run(debug=True)
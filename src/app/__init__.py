@@ -2,7 +2,9 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
 import os
+import sys
 
 # ------------------------------------------------
 # Base directory & load environment variables
@@ -11,7 +13,7 @@ import os
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 ENV_PATH = os.path.join(BASE_DIR, ".env")
 loaded = load_dotenv(ENV_PATH)
-print(f"[INIT] Loaded .env from: {ENV_PATH} -> Success: {loaded}")
+print(f"[INIT] Loaded .env from: {ENV_PATH} -> Success: {loaded}", file=sys.stderr)
 
 # ------------------------------------------------
 # Initialize extensions
@@ -29,11 +31,25 @@ def create_app():
 
     # ------------------------------------------------
     # DATABASE (works locally + Render)
+    # SQLALCHEMY_DATABASE_URI from the environment wins (e.g. a server DB);
+    # DB_PROFILE=production enables WAL, busy timeout and pool tuning.
     # ------------------------------------------------
+    from src.app.database import engine_options, install_pragmas
+    from src.app.config import DB_PROFILE
+
     db_path = os.path.join(BASE_DIR, "platform.db")
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    db_uri = os.getenv("SQLALCHEMY_DATABASE_URI") or f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_uri
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(db_uri, DB_PROFILE)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # ------------------------------------------------
+    # UPLOADS: requests over the KYC cap are refused (413) before they are read
+    # ------------------------------------------------
+    from src.app.config import KYC_MAX_UPLOAD_MB
+
+    app.config["MAX_CONTENT_LENGTH"] = (KYC_MAX_UPLOAD_MB + 1) * 1024 * 1024  # + room for form fields
+
     # ------------------------------------------------
     # BINANCE WALLET SETTINGS
     # ------------------------------------------------
@@ -44,6 +60,11 @@ def create_app():
     # Initialize Flask extensions
     # ------------------------------------------------
     db.init_app(app)
+    from src.app.metrics import init_metrics
+
+    with app.app_context():
+        install_pragmas(db.engine, DB_PROFILE)
+        init_metrics(app, db.engine)  # request/SQL timing + /metrics
     login_manager.init_app(app)
     login_manager.login_view = "main.login"
 
@@ -56,18 +77,34 @@ def create_app():
     app.register_blueprint(main)
     app.register_blueprint(admin)
 
+    from src.app.commands import register_commands
+    register_commands(app)
+
     # ------------------------------------------------
-    # Create database tables
+    # Schema setup is NOT done here: every gunicorn worker runs this factory,
+    # and concurrent create_all()/migrations race on the SQLite file.
+    # Run `flask --app run db-upgrade` once per deploy instead.
+    # Boot diagnostics go to stderr so CLI output (e.g. exports) stays clean.
     # ------------------------------------------------
-    with app.app_context():
-        db.create_all()
-        print("[INIT] Database initialized:", db_path)
-        print("[INIT] Master Wallet:", app.config["BINANCE_MASTER_ADDRESS"])
-        print("[INIT] Network:", app.config["BINANCE_NETWORK"])
+    print("[INIT] Database:", make_url(db_uri).render_as_string(hide_password=True),
+          f"(profile: {DB_PROFILE})", file=sys.stderr)
+    print("[INIT] Master Wallet:", app.config["BINANCE_MASTER_ADDRESS"], file=sys.stderr)
+    print("[INIT] Network:", app.config["BINANCE_NETWORK"], file=sys.stderr)
 
     return app
 
+
 # ------------------------------------------------
-# Expose app for Gunicorn (Render)
+# Expose app for Gunicorn (Render): `gunicorn run:app`.
+# `gunicorn src.app:app` still works — the app is built on first access,
+# so importing this package (e.g. from run.py) no longer boots a second app.
 # ------------------------------------------------
-app = create_app()
+_app = None
+
+def __getattr__(name):
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,22 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, \
+    Response, stream_with_context, send_file
 from flask_login import login_required, current_user
-from .models import User, KYCLog
-from . import db
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
+import math
+import mimetypes
+import os
+from .models import User, KYCLog, Deposit, WithdrawalRequest
+from .pagination import keyset_page, id_page
+from .config import ADMIN_PAGE_SIZE, ADMIN_PAGE_MAX, BULK_MAX_ITEMS, ADMIN_LIVE_FALLBACK_SECONDS
+from . import db, ledger, bulk, payouts, rollups, exports, outbox, archive, live
+from .cache import invalidate_dashboard
 
 admin = Blueprint('admin', __name__)
 
+ADMIN_STATUSES = ('pending', 'approved', 'rejected')
+
 # ?? Restrict access to admins
 @admin.before_request
 def restrict_to_admins():
@@ -12,22 +24,133 @@ def restrict_to_admins():
         flash("Access denied. Admins only.", "danger")
         return redirect(url_for('main.dashboard'))
 
-# ?? Admin dashboard: view users and KYC logs
+# ?? Admin dashboard: paginated, filterable view of users, KYC logs and deposits
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d") if value else None
+    except ValueError:
+        return None
+
+
+def admin_filters():
+    """Filters shared by every admin table, read from the query string."""
+    status = request.args.get('status', '').strip().lower()
+    date_to = _parse_date(request.args.get('date_to'))
+    return {
+        'status': status if status in ADMIN_STATUSES else '',
+        'user': request.args.get('user', '').strip(),
+        'date_from': _parse_date(request.args.get('date_from')),
+        # date_to is inclusive of the whole day
+        'date_to': date_to + timedelta(days=1) if date_to else None,
+    }
+
+
+def _user_match(user):
+    """?user= accepts an id, a username or an email."""
+    if user.isdigit():
+        return User.id == int(user)
+    return (User.username == user) | (User.email == user)
+
+
+def _filter_by_user(query, model, user):
+    if not user:
+        return query
+    if user.isdigit():
+        return query.filter(model.user_id == int(user))
+    return query.join(User, model.user_id == User.id).filter(_user_match(user))
+
+
+def _filter_records(query, model, filters):
+    if filters['status']:
+        query = query.filter(model.status == filters['status'])
+    if filters['date_from']:
+        query = query.filter(model.timestamp >= filters['date_from'])
+    if filters['date_to']:
+        query = query.filter(model.timestamp < filters['date_to'])
+    return _filter_by_user(query, model, filters['user'])
+
+
+def _page_url(**changes):
+    """Current admin URL with some query args replaced (keeps filters and other cursors)."""
+    args = request.args.to_dict()
+    args.update(changes)
+    return url_for(request.endpoint, **{k: v for k, v in args.items() if v})
+
+
+def render_admin_dashboard():
+    filters = admin_filters()
+    limit = min(request.args.get('limit', ADMIN_PAGE_SIZE, type=int) or ADMIN_PAGE_SIZE, ADMIN_PAGE_MAX)
+
+    users_q = User.query
+    if filters['status']:
+        users_q = users_q.filter(User.kyc_status == filters['status'])
+    if filters['user']:
+        users_q = users_q.filter(_user_match(filters['user']))
+    users, next_user = id_page(users_q, User.id, request.args.get('user_after', type=int), limit)
+
+    # Owning user is eager-loaded so the template never lazy-loads per row
+    kyc_q = _filter_records(KYCLog.query.options(joinedload(KYCLog.user)), KYCLog, filters)
+    kycs, next_kyc = keyset_page(kyc_q, KYCLog.timestamp, KYCLog.id,
+                                 request.args.get('kyc_cursor'), limit)
+
+    dep_q = _filter_records(Deposit.query.options(joinedload(Deposit.user)), Deposit, filters)
+    deposits, next_dep = keyset_page(dep_q, Deposit.timestamp, Deposit.id,
+                                     request.args.get('dep_cursor'), limit)
+
+    # Withdrawal requests waiting for review, oldest first
+    withdrawals = WithdrawalRequest.query.options(joinedload(WithdrawalRequest.user)) \
+                                         .filter_by(status='requested') \
+                                         .order_by(WithdrawalRequest.id).limit(limit).all()
+
+    return render_template('admin_dashboard.html', kpi=rollups.snapshot(days=1)["total"],
+                           users=users, kycs=kycs, deposits=deposits, withdrawals=withdrawals,
+                           next_user=next_user, next_kyc=next_kyc, next_dep=next_dep,
+                           filters=request.args.to_dict(), statuses=ADMIN_STATUSES,
+                           page_url=_page_url)
+
+
 @admin.route('/admin')
 @login_required
 def admin_dashboard():
-    users = User.query.all()
-    kycs = KYCLog.query.all()
-    return render_template('admin_dashboard.html', users=users, kycs=kycs)
+    return render_admin_dashboard()
+
+
+# ?? Live review queue: rendered once, then kept current by /admin/queue/stream (see live.py)
+@admin.route('/admin/queue')
+@login_required
+def queue():
+    cursor, deposits, kycs = live.snapshot(min(request.args.get('limit', ADMIN_PAGE_MAX, type=int)
+                                               or ADMIN_PAGE_MAX, ADMIN_PAGE_MAX))
+    if _wants_json() or request.args.get('format') == 'json':
+        return jsonify(last_event_id=cursor, deposits=deposits, kycs=kycs)
+    return render_template('admin_queue.html', last_event_id=cursor, deposits=deposits, kycs=kycs,
+                           live=live.supported(), poll_seconds=ADMIN_LIVE_FALLBACK_SECONDS)
+
+
+@admin.route('/admin/queue/stream')
+@login_required
+def queue_stream():
+    if not live.supported():
+        abort(404)  # the page polls snapshots instead (see live.py)
+    # EventSource sends Last-Event-ID when it reconnects; the first connect passes the snapshot's cursor
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_event_id', type=int)
+    if last_id is None:
+        last_id = live.latest_id()
+        db.session.rollback()
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(live.stream(last_id)), mimetype="text/event-stream", headers=headers)
 
 # ? Approve a KYC submission
 @admin.route('/admin/kyc/approve/<int:kyc_id>')
 @login_required
 def approve_kyc(kyc_id):
     kyc = KYCLog.query.get_or_404(kyc_id)
-    kyc.status = 'approved'
-    kyc.user.kyc_status = 'approved'
-    db.session.commit()
+    result = bulk.set_kyc_status([kyc.id], 'approved')[0]
+    if result['result'] == 'skipped':
+        flash(f"KYC already {result['status']}.", "info")
+        return redirect(url_for('admin.admin_dashboard'))
     flash(f"KYC for {kyc.user.username} approved ?", "success")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -36,9 +159,10 @@ def approve_kyc(kyc_id):
 @login_required
 def reject_kyc(kyc_id):
     kyc = KYCLog.query.get_or_404(kyc_id)
-    kyc.status = 'rejected'
-    kyc.user.kyc_status = 'rejected'
-    db.session.commit()
+    result = bulk.set_kyc_status([kyc.id], 'rejected')[0]
+    if result['result'] == 'skipped':
+        flash(f"KYC already {result['status']}.", "info")
+        return redirect(url_for('admin.admin_dashboard'))
     flash(f"KYC for {kyc.user.username} rejected ?", "danger")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -48,10 +172,12 @@ def reject_kyc(kyc_id):
 def credit_user(user_id):
     user = User.query.get_or_404(user_id)
     amount = request.form.get('amount', type=float)
-    if amount and amount > 0:
-        user.balance += amount
-        user.total_deposits += amount
+    if amount and math.isfinite(amount) and amount > 0:
+        entry = ledger.credit(user.id, amount, memo=f"admin:{current_user.id}")
+        outbox.emit("balance.credited", user_id=user.id, amount_micro=entry.amount_micro,
+                    ledger_entry_id=entry.id, admin_id=current_user.id)
         db.session.commit()
+        invalidate_dashboard(user.id)
         flash(f"{amount:.2f} credited to {user.username}'s account ?", "success")
     else:
         flash("Invalid amount", "danger")
@@ -63,11 +189,208 @@ def credit_user(user_id):
 def debit_user(user_id):
     user = User.query.get_or_404(user_id)
     amount = request.form.get('amount', type=float)
-    if amount and 0 < amount <= user.balance:
-        user.balance -= amount
-        user.total_withdrawals += amount
-        db.session.commit()
-        flash(f"{amount:.2f} debited from {user.username}'s account ?", "success")
-    else:
+    if not amount or not math.isfinite(amount) or amount <= 0:
         flash("Invalid amount or insufficient balance", "danger")
+        return redirect(url_for('admin.admin_dashboard'))
+
+    try:
+        # The balance check happens inside the UPDATE, not on a value read earlier
+        entry = ledger.debit(user.id, amount, memo=f"admin:{current_user.id}")
+    except ledger.InsufficientFunds:
+        db.session.rollback()
+        flash("Invalid amount or insufficient balance", "danger")
+        return redirect(url_for('admin.admin_dashboard'))
+
+    outbox.emit("balance.debited", user_id=user.id, amount_micro=-entry.amount_micro,
+                ledger_entry_id=entry.id, admin_id=current_user.id)
+    db.session.commit()
+    invalidate_dashboard(user.id)
+    flash(f"{amount:.2f} debited from {user.username}'s account ?", "success")
     return redirect(url_for('admin.admin_dashboard'))
+
+# ?? Platform KPIs from the rollup counters (constant time, see rollups.py)
+@admin.route('/admin/stats')
+@login_required
+def stats():
+    days = min(request.args.get('days', 30, type=int), 366)
+    snapshot = rollups.snapshot(days=days)
+    if _wants_json() or request.args.get('format') == 'json':
+        return jsonify(snapshot)
+    return render_template('admin_stats.html', stats=snapshot, days=days)
+
+
+# ?? Liability projection vs treasury: /admin/liabilities?weeks=26&rate=0.015&rate=0.02
+@admin.route('/admin/liabilities')
+@login_required
+def liabilities():
+    from .projection import report
+    from .config import PROJECTION_WEEKS, PROJECTION_RATES
+
+    weeks = max(1, min(request.args.get('weeks', PROJECTION_WEEKS, type=int), 520))
+    rates = request.args.getlist('rate', type=float) or PROJECTION_RATES
+    result = report(weeks=weeks, rates=rates, use_cache=request.args.get('fresh') != '1')
+    if _wants_json() or request.args.get('format') == 'json':
+        return jsonify(result)
+    return render_template('admin_liabilities.html', report=result)
+
+
+# ?? Streaming exports: /admin/export/deposits?format=csv&status=approved&date_from=2025-01-01&gzip=1
+@admin.route('/admin/export/<kind>')
+@login_required
+def export(kind):
+    fmt = request.args.get('format', 'csv')
+    if kind not in exports.EXPORTS or fmt not in exports.FORMATS:
+        abort(404)
+    gzip = request.args.get('gzip') in ('1', 'true', 'yes')
+    filters = admin_filters()
+    user = filters['user']
+    if user and not user.isdigit():
+        found = db.session.execute(select(User.id).where(_user_match(user))).scalar()
+        if found is None:
+            abort(404)
+        user = found
+    # ?status= for users means their KYC status
+    status = request.args.get('status', '').strip().lower() if kind == 'users' else filters['status']
+
+    chunks = exports.stream(kind, fmt, gzip, status=status or None,
+                            user_id=int(user) if user else None,
+                            date_from=filters['date_from'], date_to=filters['date_to'])
+    headers = {"Content-Disposition": f'attachment; filename="{exports.filename(kind, fmt, gzip)}"',
+               "X-Accel-Buffering": "no"}  # let proxies pass chunks through as they are produced
+    if gzip:
+        return Response(stream_with_context(chunks), mimetype="application/gzip", headers=headers)
+    return Response(stream_with_context(chunks), mimetype=exports.FORMATS[fmt], headers=headers)
+
+
+# ?? Archived deposits / KYC logs: /admin/archive?kind=kyc_log&user=alice, /admin/archive?kind=deposit&id=42
+@admin.route('/admin/archive')
+@login_required
+def archived():
+    kind = request.args.get('kind', 'deposit')
+    if kind not in archive.KINDS:
+        abort(404)
+    record_id = request.args.get('id', type=int)
+    user = request.args.get('user', '').strip()
+    user_id = None
+    if user:
+        user_id = db.session.execute(select(User.id).where(_user_match(user))).scalar()
+        if user_id is None:
+            user_id = int(user) if user.isdigit() else -1  # the user row itself may be gone
+
+    if record_id:
+        record = archive.get(kind, record_id)
+        records, next_before = ([record] if record else []), None
+    else:
+        records, next_before = archive.find(kind, user_id=user_id, before=request.args.get('before', type=int),
+                                            limit=min(request.args.get('limit', ADMIN_PAGE_SIZE, type=int)
+                                                      or ADMIN_PAGE_SIZE, ADMIN_PAGE_MAX))
+    if _wants_json() or request.args.get('format') == 'json':
+        return jsonify(kind=kind, records=records, next_before=next_before)
+    return render_template('admin_archive.html', kind=kind, kinds=list(archive.KINDS), records=records,
+                           next_before=next_before, filters=request.args.to_dict(), page_url=_page_url)
+
+
+@admin.route('/admin/archive/kyc_log/<int:record_id>/document')
+@login_required
+def archived_document(record_id):
+    record = archive.get('kyc_log', record_id)
+    document = archive.open_document(record['document_path']) if record and record['document_path'] else None
+    if document is None:
+        abort(404)
+    name = os.path.basename(record['document_path'])
+    return send_file(document, mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                     download_name=name)
+
+
+# ?? Withdrawal review (payouts themselves run in the payout worker)
+@admin.route('/admin/withdrawals/<int:withdrawal_id>/approve', methods=['POST'])
+@login_required
+def approve_withdrawal(withdrawal_id):
+    if payouts.approve_withdrawal(withdrawal_id, note=f"admin:{current_user.id}"):
+        flash("Withdrawal approved and queued for payout.", "success")
+    else:
+        flash("Withdrawal is no longer awaiting review.", "danger")
+    return redirect(url_for('main.admin_dashboard'))
+
+
+@admin.route('/admin/withdrawals/<int:withdrawal_id>/reject', methods=['POST'])
+@login_required
+def reject_withdrawal(withdrawal_id):
+    if payouts.reject_withdrawal(withdrawal_id, note=f"admin:{current_user.id}"):
+        flash("Withdrawal rejected and refunded.", "danger")
+    else:
+        flash("Withdrawal is no longer awaiting review.", "danger")
+    return redirect(url_for('main.admin_dashboard'))
+
+
+# ?? Bulk actions: one transaction per request, per-item results
+def _wants_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+
+def _bulk_args():
+    """(args, ids) from a JSON body {"action": ..., "ids": [...]} or a form with repeated ids."""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        ids = data.get('ids', []) if isinstance(data, dict) else None
+        if not isinstance(ids, list):
+            abort(400)  # a bare list, a string of digits, ... is not a bulk request
+    else:
+        data = request.form
+        ids = request.form.getlist('ids')
+    return data, [int(i) for i in ids if str(i).strip().isdigit()]
+
+
+def _bulk_response(action, results):
+    counts = {}
+    for item in results:
+        counts[item['result']] = counts.get(item['result'], 0) + 1
+    if _wants_json():
+        return jsonify(action=action, counts=counts, results=results)
+
+    summary = ", ".join(f"{n} {result}" for result, n in counts.items()) or "nothing selected"
+    flash(f"Bulk {action}: {summary}", "success" if results else "danger")
+    return redirect(url_for('main.admin_dashboard'))
+
+
+@admin.route('/admin/deposits/bulk', methods=['POST'])
+@login_required
+def bulk_deposits():
+    data, ids = _bulk_args()
+    action = data.get('action')
+    if action not in ('approve', 'reject'):
+        abort(400)
+
+    # Filter mode: "all pending deposits under X USDT older than N minutes"
+    if not ids and data.get('filter') == 'pending':
+        max_amount = data.get('max_amount')
+        older_than = data.get('older_than_minutes')
+        try:
+            max_amount = float(max_amount) if max_amount not in (None, '') else None
+            older_than = int(older_than) if older_than not in (None, '') else None
+            if max_amount is not None and not math.isfinite(max_amount):
+                raise ValueError(max_amount)
+        except (TypeError, ValueError):
+            if _wants_json():
+                return jsonify(error="max_amount must be a number and older_than_minutes a whole number"), 400
+            flash("Invalid filter: amount must be a number and age a whole number of minutes", "danger")
+            return redirect(url_for('main.admin_dashboard'))
+        ids = bulk.pending_deposit_ids(max_amount=max_amount, older_than_minutes=older_than,
+                                       limit=BULK_MAX_ITEMS)
+
+    ids = ids[:BULK_MAX_ITEMS]
+    results = bulk.approve_deposits(ids) if action == 'approve' else bulk.reject_deposits(ids)
+    return _bulk_response(f"{action} deposits", results)
+
+
+@admin.route('/admin/kyc/bulk', methods=['POST'])
+@login_required
+def bulk_kyc():
+    data, ids = _bulk_args()
+    action = data.get('action')
+    if action not in ('approve', 'reject'):
+        abort(400)
+
+    status = 'approved' if action == 'approve' else 'rejected'
+    results = bulk.set_kyc_status(ids[:BULK_MAX_ITEMS], status)
+    return _bulk_response(f"{action} KYC", results)
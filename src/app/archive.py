@@ -0,0 +1,247 @@
+# src/app/archive.py
+"""
+Hot/cold archival of settled history.
+
+Over time Deposit and KYCLog fill up with rows that nothing reads any more:
+
+- deposits rejected more than ARCHIVE_DEPOSIT_DAYS ago;
+- reviewed (approved/rejected) KYC logs older than ARCHIVE_KYC_DAYS that a
+  newer submission from the same user has superseded. Only the latest KYC
+  log per user is ever read.
+
+`archive()` moves them, ARCHIVE_BATCH_SIZE rows per transaction, into
+`archived_record`. Each row is stored as zlib-compressed JSON beside the few
+columns lookups need. Each batch is one DELETE ... RETURNING from the hot
+table plus one INSERT, so a row is in exactly one place. The delete repeats
+the status condition, so a row that changed after it was selected stays hot.
+Approved deposits stay hot whatever their age, because they still earn
+interest, unlock and count as liabilities. Pending rows are never archived.
+
+Inside each KYC batch's transaction, after the DELETE, each archived document
+that no hot row still references (by hash, or by path for uploads made
+before documents were hashed) is gzip-compressed into ARCHIVE_DOCUMENT_DIR.
+Its preview and thumbnail are deleted. The check runs under the batch's
+write lock, so a resubmission of the same file commits either before it
+(and keeps the file hot) or after the files have moved. In that case
+`restore_document()` brings the file back. The KYC route calls it after
+every commit. Rollup counters are lifetime totals and do not change;
+rollups.rebuild() counts the archived rows too.
+
+Archived records are read back with `find()` / `get()` and
+`open_document()` (/admin/archive).
+
+    flask --app run archive --deposit-days 180 --kyc-days 90
+"""
+import gzip
+import json
+import os
+import shutil
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.orm import aliased
+
+from . import db
+from .cache import invalidate_dashboard
+from .models import ArchivedRecord, ChainTransfer, Deposit, KYCLog
+from .uploads import UPLOAD_FOLDER, derived_paths
+from .config import ARCHIVE_DEPOSIT_DAYS, ARCHIVE_KYC_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_DOCUMENT_DIR
+
+KINDS = {"deposit": Deposit, "kyc_log": KYCLog}
+SETTLED_KYC = ("approved", "rejected")
+
+
+def _pack(row):
+    return zlib.compress(json.dumps(row, default=str, separators=(",", ":")).encode(), 6)
+
+
+def _unpack(payload):
+    return json.loads(zlib.decompress(payload))
+
+
+# -------------------------
+# Candidates (index range scans on status, timestamp)
+# -------------------------
+def _deposit_candidates(cutoff, limit):
+    return (
+        select(Deposit.id)
+        .where(Deposit.status == "rejected", Deposit.timestamp < cutoff,
+               ~exists().where(ChainTransfer.deposit_id == Deposit.id))  # still referenced by a transfer
+        .order_by(Deposit.timestamp, Deposit.id).limit(limit)
+    )
+
+
+def _kyc_candidates(cutoff, limit):
+    newer = aliased(KYCLog)
+    return (
+        select(KYCLog.id)
+        .where(KYCLog.status.in_(SETTLED_KYC), KYCLog.timestamp < cutoff,
+               exists().where(newer.user_id == KYCLog.user_id, newer.id > KYCLog.id))
+        .order_by(KYCLog.timestamp, KYCLog.id).limit(limit)
+    )
+
+
+# -------------------------
+# Moving rows
+# -------------------------
+def _move(kind, ids, guard, now):
+    """DELETE the rows still matching `guard` and INSERT them into archived_record. Returns the rows."""
+    model = KINDS[kind]
+    table = model.__table__
+    rows = db.session.execute(
+        delete(table).where(table.c.id.in_(ids), guard).returning(*table.c)
+    ).mappings().all()
+    if rows:
+        db.session.execute(insert(ArchivedRecord), [{
+            "kind": kind, "record_id": row["id"], "user_id": row["user_id"], "status": row["status"],
+            "amount": row.get("amount"), "timestamp": row["timestamp"], "archived_at": now,
+            "payload": _pack(dict(row)),
+        } for row in rows])
+    return rows
+
+
+def archive_deposits(now=None, days=ARCHIVE_DEPOSIT_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move deposits rejected before now - days. Returns the number moved."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    moved = 0
+    while True:
+        ids = db.session.execute(_deposit_candidates(cutoff, batch_size)).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return moved
+        rows = _move("deposit", ids, Deposit.__table__.c.status == "rejected", now)
+        db.session.commit()
+        for user_id in {row["user_id"] for row in rows}:
+            invalidate_dashboard(user_id)  # the dashboard lists the user's deposits
+        moved += len(rows)
+        if not rows:
+            return moved  # everything selected changed status under us; next run retries
+
+
+def archive_kyc_logs(now=None, days=ARCHIVE_KYC_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move superseded, reviewed KYC logs older than now - days, then their documents. Returns (rows, documents)."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    moved = documents = 0
+    while True:
+        ids = db.session.execute(_kyc_candidates(cutoff, batch_size)).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return moved, documents
+        rows = _move("kyc_log", ids, KYCLog.__table__.c.status.in_(SETTLED_KYC), now)
+        try:
+            files = archive_documents(rows)  # same transaction as the DELETE
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            for row in rows:  # the rows stay hot, so do their files
+                if row["document_path"]:
+                    restore_document(row["document_path"])
+            raise
+        moved += len(rows)
+        documents += files
+        if not rows:
+            return moved, documents
+
+
+def archive(now=None, deposit_days=ARCHIVE_DEPOSIT_DAYS, kyc_days=ARCHIVE_KYC_DAYS,
+            batch_size=ARCHIVE_BATCH_SIZE):
+    now = now or datetime.utcnow()
+    deposits = archive_deposits(now, deposit_days, batch_size)
+    kyc_logs, documents = archive_kyc_logs(now, kyc_days, batch_size)
+    return {"deposits": deposits, "kyc_logs": kyc_logs, "documents": documents}
+
+
+# -------------------------
+# Documents
+# -------------------------
+def cold_path(document_path):
+    return os.path.join(ARCHIVE_DOCUMENT_DIR, os.path.basename(document_path) + ".gz")
+
+
+def archive_documents(rows):
+    """
+    Compress the documents of archived KYC rows into the cold directory,
+    unless a hot KYC log still uses the same file (uploads are stored once
+    per content hash; older uploads without a hash are matched by path).
+    Call it inside the transaction that deleted the rows. Returns the number
+    of files moved.
+    """
+    paths = {row["document_path"]: row["document_hash"] for row in rows if row["document_path"]}
+    if not paths:
+        return 0
+    hashes = [digest for digest in paths.values() if digest]
+    still_hot = set(db.session.execute(
+        select(KYCLog.document_path).where(KYCLog.document_path.in_(list(paths))).distinct()
+    ).scalars())
+    if hashes:
+        still_hot.update(db.session.execute(
+            select(KYCLog.document_hash).where(KYCLog.document_hash.in_(hashes)).distinct()
+        ).scalars())
+
+    moved = 0
+    os.makedirs(ARCHIVE_DOCUMENT_DIR, exist_ok=True)
+    for path, digest in paths.items():
+        if path in still_hot or digest in still_hot:
+            continue
+        hot = os.path.join(UPLOAD_FOLDER, os.path.basename(path))
+        if os.path.exists(hot):
+            cold = cold_path(path)
+            with open(hot, "rb") as src, gzip.open(f"{cold}.tmp", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(f"{cold}.tmp", cold)
+            os.remove(hot)
+            moved += 1
+        for derived in derived_paths(digest) if digest else ():  # previews can be rebuilt from the original
+            if os.path.exists(derived):
+                os.remove(derived)
+    return moved
+
+
+def restore_document(document_path):
+    """Put a cold document back in the upload folder if a hot row needs it. Returns True if restored."""
+    hot = os.path.join(UPLOAD_FOLDER, os.path.basename(document_path))
+    cold = cold_path(document_path)
+    if os.path.exists(hot) or not os.path.exists(cold):
+        return False
+    with gzip.open(cold, "rb") as src, open(f"{hot}.tmp", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(f"{hot}.tmp", hot)
+    return True
+
+
+def open_document(document_path):
+    """Binary file object for a KYC document, hot or cold, or None if it is gone."""
+    hot = os.path.join(UPLOAD_FOLDER, os.path.basename(document_path))
+    if os.path.exists(hot):
+        return open(hot, "rb")
+    cold = cold_path(document_path)
+    if os.path.exists(cold):
+        return gzip.open(cold, "rb")
+    return None
+
+
+# -------------------------
+# Lookup
+# -------------------------
+def _record(archived):
+    return {"kind": archived.kind, "archived_at": archived.archived_at, **_unpack(archived.payload)}
+
+
+def get(kind, record_id):
+    archived = db.session.get(ArchivedRecord, (kind, record_id))
+    return _record(archived) if archived else None
+
+
+def find(kind, user_id=None, before=None, limit=50):
+    """Archived records of one kind, newest id first; by user through the (kind, user_id, record_id) index."""
+    query = select(ArchivedRecord).where(ArchivedRecord.kind == kind)
+    if user_id is not None:
+        query = query.where(ArchivedRecord.user_id == user_id)
+    if before:
+        query = query.where(ArchivedRecord.record_id < before)
+    rows = db.session.execute(query.order_by(ArchivedRecord.record_id.desc()).limit(limit + 1)).scalars().all()
+    next_before = rows[limit - 1].record_id if len(rows) > limit else None
+    return [_record(row) for row in rows[:limit]], next_before
@@ -1,27 +1,182 @@
 # src/app/binance_utils.py
-from binance.client import Client
-from .config import BINANCE_API_KEY, BINANCE_API_SECRET, BINANCE_NETWORK
+"""
+Binance client layer.
 
-# Initialize Binance client
-client = Client(BINANCE_API_KEY, BINANCE_API_SECRET)
+The client is created on first use (importing this module does no network
+I/O), shares one keep-alive HTTP connection pool, and every call goes
+through `_call`, which tracks Binance's used-weight headers and backs off
+before/when the rate limit is hit. Balance and deposit-address lookups are
+cached for BINANCE_CACHE_TTL seconds. The *_async variants run the same
+calls on worker threads so callers can fan out with asyncio.gather.
+"""
+import asyncio
+import threading
+import time
 
-def get_balance(asset="USDT"):
-    """Get the available balance of a specific asset."""
-    info = client.get_asset_balance(asset)
-    if info:
-        return float(info['free'])
-    return 0.0
+from .cache import TTLCache
+from .metrics import observe_binance
+from .config import (
+    BINANCE_API_KEY, BINANCE_API_SECRET, BINANCE_NETWORK,
+    BINANCE_CACHE_TTL, BINANCE_POOL_SIZE, BINANCE_WEIGHT_LIMIT, BINANCE_MAX_RETRIES,
+)
+
+_client = None
+_client_lock = threading.Lock()
+_cache = TTLCache(maxsize=256, ttl=BINANCE_CACHE_TTL)
+
+
+# -------------------------
+# Client (lazy, pooled)
+# -------------------------
+def get_client():
+    """Create the Binance client on first use, with a pooled keep-alive session."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from binance.client import Client
+                from requests.adapters import HTTPAdapter
+
+                client = Client(BINANCE_API_KEY, BINANCE_API_SECRET, ping=False)
+                adapter = HTTPAdapter(pool_connections=BINANCE_POOL_SIZE, pool_maxsize=BINANCE_POOL_SIZE)
+                client.session.mount("https://", adapter)
+                _client = client
+    return _client
+
+
+# -------------------------
+# Rate-limit weight tracking
+# -------------------------
+class RateLimiter:
+    """
+    Follows X-MBX-USED-WEIGHT-1M from Binance responses. Once usage passes
+    90% of the limit, calls wait for the next minute window; a 429/418 makes
+    every caller wait for the server's Retry-After.
+    """
+
+    def __init__(self, limit=BINANCE_WEIGHT_LIMIT, headroom=0.9):
+        self.limit = limit
+        self.headroom = headroom
+        self.used_weight = 0
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.time()
+            delay = self.blocked_until - now
+            if delay <= 0 and self.used_weight >= self.limit * self.headroom:
+                delay = 60 - now % 60  # weight resets with the minute window
+                self.used_weight = 0
+        if delay > 0:
+            time.sleep(delay)
+
+    def update(self, headers):
+        weight = headers.get("x-mbx-used-weight-1m") if headers else None
+        if weight is not None:
+            with self._lock:
+                self.used_weight = int(weight)
+
+    def back_off(self, retry_after):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+
+
+rate_limiter = RateLimiter()
+
+
+def _call(method, *args, **kwargs):
+    """Invoke a client method with rate-limit tracking and backoff on 429/418."""
+    from binance.exceptions import BinanceAPIException
+
+    client = get_client()
+    for attempt in range(BINANCE_MAX_RETRIES + 1):
+        rate_limiter.wait()
+        started, outcome = time.perf_counter(), "error"
+        try:
+            result = getattr(client, method)(*args, **kwargs)
+            outcome = "ok"
+        except BinanceAPIException as exc:
+            outcome = str(exc.status_code)
+            if exc.status_code not in (418, 429) or attempt == BINANCE_MAX_RETRIES:
+                raise
+            headers = getattr(exc.response, "headers", {}) or {}
+            rate_limiter.back_off(int(headers.get("Retry-After", 2 ** attempt)))
+            continue
+        finally:
+            observe_binance(method, outcome, time.perf_counter() - started)
+            response = getattr(client, "response", None)
+            rate_limiter.update(getattr(response, "headers", None))
+        return result
+
+
+def _cached(key, loader):
+    value = _cache.get(key)
+    if value is None:
+        value = loader()
+        _cache.set(key, value)
+    return value
+
+
+# -------------------------
+# Public helpers
+# -------------------------
+def get_balance(asset="USDT", fresh=False):
+    """Get the available balance of a specific asset (cached unless fresh=True)."""
+    def load():
+        info = _call("get_asset_balance", asset)
+        if info:
+            return float(info['free'])
+        return 0.0
+
+    if fresh:
+        _cache.delete(("balance", asset))
+    return _cached(("balance", asset), load)
 
 def get_deposit_address(asset="USDT", network=None):
     """Get deposit address for the platform wallet."""
     if network is None:
         network = BINANCE_NETWORK
-    info = client.get_deposit_address(asset=asset, network=network)
-    return info['address']
+    return _cached(
+        ("deposit_address", asset, network),
+        lambda: _call("get_deposit_address", coin=asset, network=network)['address'],
+    )
 
-def withdraw(asset="USDT", amount=0.0, address=None, network=None):
-    """Withdraw to a specified address (e.g., user withdrawal)."""
+def get_deposit_history(asset="USDT", start_time=None):
+    """Deposit history for an asset, optionally only entries after start_time (ms)."""
+    params = {"coin": asset}
+    if start_time:
+        params["startTime"] = start_time
+    return _call("get_deposit_history", **params)
+
+def withdraw(asset="USDT", amount=0.0, address=None, network=None, withdraw_order_id=None):
+    """Withdraw to a specified address (e.g., user withdrawal).
+    withdraw_order_id is our idempotency key; Binance stores it with the withdrawal."""
     if network is None:
         network = BINANCE_NETWORK
-    result = client.withdraw(asset=asset, address=address, amount=amount, network=network)
+    params = {"coin": asset, "address": address, "amount": amount, "network": network}
+    if withdraw_order_id:
+        params["withdrawOrderId"] = withdraw_order_id
+    result = _call("withdraw", **params)
+    _cache.delete(("balance", asset))
     return result
+
+def get_withdrawal(withdraw_order_id):
+    """The withdrawal Binance recorded for one of our withdrawOrderIds, or None."""
+    rows = _call("get_withdraw_history", withdrawOrderId=withdraw_order_id)
+    return rows[0] if rows else None
+
+
+# -------------------------
+# Async variants (fan out with asyncio.gather)
+# -------------------------
+async def get_balance_async(asset="USDT", fresh=False):
+    return await asyncio.to_thread(get_balance, asset, fresh)
+
+async def get_deposit_address_async(asset="USDT", network=None):
+    return await asyncio.to_thread(get_deposit_address, asset, network)
+
+async def get_balances_async(assets):
+    """Balances for several assets concurrently: {asset: balance}."""
+    values = await asyncio.gather(*(get_balance_async(a) for a in assets))
+    return dict(zip(assets, values))
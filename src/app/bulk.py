@@ -0,0 +1,147 @@
+# src/app/bulk.py
+"""
+Set-based bulk approval/rejection for deposits and KYC submissions.
+
+Each operation runs in one transaction: a conditional UPDATE ... RETURNING
+claims exactly the rows still in a valid state, balances are credited in one
+ledger.post_many call, and per-item results report what happened to every
+requested id. Rows are claimed per current status (`_claim`), so the
+platform rollups know every row's old status exactly.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from . import db
+from .cache import invalidate_dashboard, invalidate_identity
+from .ledger import post_many, to_micro
+from .models import User, KYCLog, Deposit
+from .outbox import emit_many
+from .rollups import deposits_moved, kyc_logs_moved, users_moved
+from .unlocks import deposits_approved
+
+CHUNK = 500  # ids per IN (...) list, well under SQLite's bound-parameter limit
+
+
+def _chunks(ids):
+    ids = list(dict.fromkeys(int(i) for i in ids))  # dedupe, keep order
+    for start in range(0, len(ids), CHUNK):
+        yield ids[start:start + CHUNK]
+
+
+def _results(requested, changed, model, new_status):
+    """Per-item outcome: the new status, or why the row was left alone."""
+    changed = set(changed)
+    missing = set(requested) - changed
+    current = {}
+    for chunk in _chunks(missing):
+        current.update(db.session.execute(
+            select(model.id, model.status).where(model.id.in_(chunk))
+        ).all())
+
+    results = []
+    for item_id in dict.fromkeys(requested):
+        if item_id in changed:
+            results.append({"id": item_id, "result": new_status})
+        elif item_id in current:
+            results.append({"id": item_id, "result": "skipped", "status": current[item_id]})
+        else:
+            results.append({"id": item_id, "result": "not_found"})
+    return results
+
+
+def _claim(model, status_col, ids, allowed, new_status, returning):
+    """
+    Move rows whose status is in `allowed` (None = anything but new_status) to
+    new_status. Returns [(old_status, row)] for the rows this call changed.
+    """
+    claimed = []
+    for chunk in _chunks(ids):
+        current = {}
+        for row_id, status in db.session.execute(
+            select(model.id, status_col).where(model.id.in_(chunk), status_col != new_status)
+        ):
+            if allowed is None or status in allowed:
+                current.setdefault(status, []).append(row_id)
+        for old_status, group in current.items():
+            rows = db.session.execute(
+                update(model)
+                .where(model.id.in_(group), status_col == old_status)
+                .values({status_col.key: new_status})
+                .returning(*returning),
+                execution_options={"synchronize_session": False},
+            ).all()
+            claimed += [(old_status, row) for row in rows]
+    return claimed
+
+
+def pending_deposit_ids(max_amount=None, older_than_minutes=None, limit=1000):
+    """Ids of pending deposits matching a bulk filter, oldest first."""
+    query = select(Deposit.id).where(Deposit.status == "pending")
+    if max_amount is not None:
+        query = query.where(Deposit.amount < max_amount)
+    if older_than_minutes is not None:
+        query = query.where(Deposit.timestamp < datetime.utcnow() - timedelta(minutes=older_than_minutes))
+    return db.session.execute(query.order_by(Deposit.timestamp, Deposit.id).limit(limit)).scalars().all()
+
+
+# -------------------------
+# Deposits
+# -------------------------
+def approve_deposits(ids):
+    """Approve every pending deposit in `ids` and credit its owner (rejected ones stay rejected)."""
+    ids = [int(i) for i in ids]
+    moved = _claim(Deposit, Deposit.status, ids, ("pending",), "approved",
+                   (Deposit.id, Deposit.user_id, Deposit.amount, Deposit.timestamp))
+    claimed = [row for _, row in moved]
+
+    post_many([(user_id, to_micro(amount), "deposit", f"deposit:{dep_id}")
+               for dep_id, user_id, amount, _ in claimed])
+    deposits_moved([(old, "approved", row.amount) for old, row in moved])
+    deposits_approved(claimed)
+    emit_many("deposit.approved", [{"deposit_id": row.id, "user_id": row.user_id,
+                                    "amount_micro": to_micro(row.amount), "from_status": old}
+                                   for old, row in moved])
+    db.session.commit()
+
+    for user_id in {row.user_id for row in claimed}:
+        invalidate_dashboard(user_id)
+    return _results(ids, [row.id for row in claimed], Deposit, "approved")
+
+
+def reject_deposits(ids):
+    """Reject every pending deposit in `ids`."""
+    ids = [int(i) for i in ids]
+    moved = _claim(Deposit, Deposit.status, ids, ("pending",), "rejected",
+                   (Deposit.id, Deposit.user_id, Deposit.amount))
+    rejected = [row for _, row in moved]
+    deposits_moved([(old, "rejected", row.amount) for old, row in moved])
+    emit_many("deposit.rejected", [{"deposit_id": row.id, "user_id": row.user_id,
+                                    "amount_micro": to_micro(row.amount)} for row in rejected])
+    db.session.commit()
+
+    for user_id in {row.user_id for row in rejected}:
+        invalidate_dashboard(user_id)
+    return _results(ids, [row.id for row in rejected], Deposit, "rejected")
+
+
+# -------------------------
+# KYC
+# -------------------------
+def set_kyc_status(ids, status):
+    """Approve or reject every pending KYC submission in `ids`, and the owners' kyc_status."""
+    ids = [int(i) for i in ids]
+    moved = _claim(KYCLog, KYCLog.status, ids, ("pending",), status, (KYCLog.id, KYCLog.user_id))
+    changed = [row for _, row in moved]
+    kyc_logs_moved([(old, status) for old, _ in moved])
+
+    user_ids = list({row.user_id for row in changed})
+    users = _claim(User, User.kyc_status, user_ids, None, status, (User.id,))
+    users_moved([(old, status) for old, _ in users])
+    emit_many(f"kyc.{status}", [{"kyc_id": row.id, "user_id": row.user_id} for row in changed])
+    db.session.commit()
+
+    for user_id in user_ids:
+        invalidate_dashboard(user_id)
+        invalidate_identity(user_id)
+    return _results(ids, [row.id for row in changed], KYCLog, status)
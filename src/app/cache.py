@@ -0,0 +1,138 @@
+# src/app/cache.py
+"""
+Small caches shared by the routes.
+
+TTLCache is an in-process LRU with per-entry expiry. RedisCache is an
+optional shared backend (needs the `redis` package) so every gunicorn worker
+sees the same entries and the same invalidations. Redis being unreachable
+never fails a request: a read counts as a miss, a write or delete is skipped
+(a missed invalidation lasts until the entry's TTL), and both are logged.
+"""
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from .config import (
+    DASHBOARD_CACHE_TTL, DASHBOARD_CACHE_SIZE, DASHBOARD_CACHE_URL,
+    IDENTITY_CACHE_TTL, IDENTITY_CACHE_SIZE,
+)
+
+log = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """Same interface as TTLCache, stored in Redis under a key prefix."""
+
+    def __init__(self, url, prefix, ttl=60):
+        import redis  # optional dependency, only needed when a shared backend is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.errors = redis.RedisError
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def get(self, key, default=None):
+        try:
+            raw = self.client.get(self._key(key))
+        except self.errors as exc:
+            log.warning("cache %s: get %s failed, treating as a miss: %s", self.prefix, key, exc)
+            return default
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.client.set(self._key(key), pickle.dumps(value), ex=self.ttl if ttl is None else ttl)
+        except self.errors as exc:
+            log.warning("cache %s: set %s failed, not cached: %s", self.prefix, key, exc)
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+        except self.errors as exc:
+            log.warning("cache %s: delete %s failed, stale for up to %ss: %s", self.prefix, key, self.ttl, exc)
+
+    def clear(self):
+        try:
+            for key in self.client.scan_iter(f"{self.prefix}:*"):
+                self.client.delete(key)
+        except self.errors as exc:
+            log.warning("cache %s: clear failed, stale for up to %ss: %s", self.prefix, self.ttl, exc)
+
+
+def make_cache(prefix, maxsize, ttl, url=None):
+    """Shared Redis cache when `url` is set, otherwise an in-process TTLCache."""
+    if url:
+        return RedisCache(url, prefix, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+# -------------------------
+# Per-user dashboard summaries
+# -------------------------
+dashboard_cache = make_cache("dashboard", DASHBOARD_CACHE_SIZE, DASHBOARD_CACHE_TTL, DASHBOARD_CACHE_URL)
+
+
+def invalidate_dashboard(user_id):
+    """Drop a user's cached dashboard summary after their balance, deposits or KYC change."""
+    dashboard_cache.delete(user_id)
+
+
+def invalidate_all_dashboards():
+    dashboard_cache.clear()
+
+
+# -------------------------
+# Per-worker identity cache (see models.load_user)
+# -------------------------
+identity_cache = TTLCache(maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL)
+
+
+def invalidate_identity(user_id):
+    """Drop a user's cached auth fields after is_admin or kyc_status change."""
+    identity_cache.delete(user_id)
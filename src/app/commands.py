@@ -0,0 +1,277 @@
+# src/app/commands.py
+"""
+Flask CLI commands (run with `flask --app run <command>`).
+"""
+import time
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command("accrue-interest")
+@click.option("--batch-size", type=int, default=None, help="Deposits per vectorized batch.")
+@click.option("--interval", type=int, default=0,
+              help="Repeat every N seconds (0 = run once, e.g. from cron).")
+@with_appcontext
+def accrue_interest_command(batch_size, interval):
+    """Recompute accrued interest for all approved deposits."""
+    from .accrual import accrue_all
+    from .config import ACCRUAL_BATCH_SIZE
+
+    while True:
+        summary = accrue_all(batch_size=batch_size or ACCRUAL_BATCH_SIZE)
+        click.echo(
+            f"[ACCRUAL] {'resumed run ' if summary['resumed'] else ''}as of {summary['as_of']:%Y-%m-%d %H:%M:%S}: "
+            f"{summary['deposits']} deposits, {summary['users']} users, "
+            f"{summary['total_interest']:.2f} USDT interest"
+        )
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+@click.command("db-upgrade")
+@with_appcontext
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations."""
+    from .migrations import upgrade, current_version
+
+    applied = upgrade()
+    for number, description in applied:
+        click.echo(f"[DB] applied {number:03d}: {description}")
+    click.echo(f"[DB] schema at version {current_version()}")
+
+
+@click.command("check-query-plans")
+@with_appcontext
+def check_query_plans_command():
+    """EXPLAIN QUERY PLAN the hot queries; exit 1 if any does a full table scan."""
+    from .query_plans import check_query_plans
+
+    failed = False
+    for name, plan, ok in check_query_plans():
+        click.echo(f"[{'OK' if ok else 'SCAN'}] {name}")
+        for detail in plan:
+            click.echo(f"       {detail}")
+        failed = failed or not ok
+    if failed:
+        raise SystemExit(1)
+
+
+@click.command("ledger-reconcile")
+@click.option("--repair", is_flag=True, help="Reset cached balances to their ledger sums.")
+@with_appcontext
+def ledger_reconcile_command(repair):
+    """Compare cached user balances with the ledger; exit 1 on mismatch."""
+    from .ledger import reconcile, rebuild_balances, from_micro
+
+    mismatches = reconcile()
+    for user_id, cached, derived in mismatches:
+        click.echo(f"[LEDGER] user {user_id}: cached {from_micro(cached):.6f} != ledger {from_micro(derived):.6f}")
+    if not mismatches:
+        click.echo("[LEDGER] all balances match the ledger")
+    elif repair:
+        rebuild_balances()
+        click.echo(f"[LEDGER] repaired {len(mismatches)} balances")
+    else:
+        raise SystemExit(1)
+
+
+@click.command("export")
+@click.argument("kind", type=click.Choice(["users", "deposits", "kyc"]))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="csv")
+@click.option("--status", default=None, help="Only rows with this status (KYC status for users).")
+@click.option("--user-id", type=int, default=None)
+@click.option("--since", type=click.DateTime(["%Y-%m-%d"]), default=None, help="From this day (inclusive).")
+@click.option("--until", type=click.DateTime(["%Y-%m-%d"]), default=None, help="Before this day (exclusive).")
+@click.option("--gzip", is_flag=True, help="Compress the output.")
+@click.option("-o", "--output", type=click.File("wb"), default="-", help="Output file (default stdout).")
+@with_appcontext
+def export_command(kind, fmt, status, user_id, since, until, gzip, output):
+    """Stream users, deposits or KYC logs as CSV or JSONL."""
+    from .exports import stream
+
+    for chunk in stream(kind, fmt, gzip, status=status, user_id=user_id,
+                        date_from=since, date_to=until):
+        output.write(chunk)
+
+
+@click.command("liability-report")
+@click.option("--weeks", type=int, default=None, help="Projection horizon in weeks.")
+@click.option("--rate", "rates", type=float, multiple=True, help="Weekly rate scenario (repeatable).")
+@click.option("--treasury", type=float, default=None, help="Use this USDT balance instead of asking Binance.")
+@click.option("--json", "as_json", is_flag=True)
+@with_appcontext
+def liability_report_command(weeks, rates, treasury, as_json):
+    """Project owed interest/unlocking principal and compare with the treasury; exit 1 on a shortfall."""
+    import json
+    from .projection import report
+    from .config import PROJECTION_WEEKS, PROJECTION_RATES
+
+    result = report(weeks=weeks or PROJECTION_WEEKS, rates=list(rates) or PROJECTION_RATES,
+                    treasury=treasury, use_cache=False)
+    if as_json:
+        click.echo(json.dumps(result, default=str, indent=2))
+    else:
+        balance = result["treasury"]["balance"]
+        withdrawals = result["withdrawals"]
+        click.echo(f"[LIABILITY] {result['deposits']} approved deposits, principal "
+                   f"{result['principal']:.2f} USDT, withdrawn {withdrawals['withdrawn']:.2f}, treasury "
+                   + (f"{balance:.2f} USDT ({withdrawals['held']:.2f} held for withdrawals)" if balance is not None
+                      else f"unavailable ({result['treasury']['error']})"))
+        horizon = result["horizon_weeks"]
+        for scenario in result["scenarios"]:
+            weekly = scenario["weeks"]
+            shortfall = scenario["first_shortfall_week"]
+            click.echo(f"  rate {scenario['rate']:.4f}/wk: now owe {weekly['liability'][0]:.2f} "
+                       f"({weekly['unlocked'][0]:.2f} unlocked), week {horizon} owe "
+                       f"{weekly['liability'][-1]:.2f} ({weekly['unlocked'][-1]:.2f} unlocked), "
+                       + ("no shortfall" if shortfall is None else f"SHORTFALL from week {shortfall}"))
+    if any(s["first_shortfall_week"] is not None for s in result["scenarios"]):
+        raise SystemExit(1)
+
+
+@click.command("rollups-rebuild")
+@with_appcontext
+def rollups_rebuild_command():
+    """Recompute the platform rollup counters from the source tables."""
+    from .rollups import rebuild
+
+    summary = rebuild()
+    click.echo(f"[ROLLUPS] rebuilt {summary['counters']} counters ({summary['days']} days)")
+
+
+@click.command("archive")
+@click.option("--deposit-days", type=int, default=None, help="Archive deposits rejected more than N days ago.")
+@click.option("--kyc-days", type=int, default=None, help="Archive superseded, reviewed KYC logs older than N days.")
+@click.option("--batch-size", type=int, default=None, help="Rows moved per transaction.")
+@with_appcontext
+def archive_command(deposit_days, kyc_days, batch_size):
+    """Move settled deposits and KYC logs (and their documents) to cold storage."""
+    from . import archive
+    from .config import ARCHIVE_DEPOSIT_DAYS, ARCHIVE_KYC_DAYS, ARCHIVE_BATCH_SIZE
+
+    summary = archive.archive(deposit_days=ARCHIVE_DEPOSIT_DAYS if deposit_days is None else deposit_days,
+                              kyc_days=ARCHIVE_KYC_DAYS if kyc_days is None else kyc_days,
+                              batch_size=batch_size or ARCHIVE_BATCH_SIZE)
+    click.echo(f"[ARCHIVE] moved {summary['deposits']} deposits, {summary['kyc_logs']} KYC logs, "
+               f"{summary['documents']} documents")
+
+
+@click.command("unlock-sweep")
+@click.option("--interval", type=int, default=0,
+              help="Repeat every N seconds (0 = run once, e.g. from cron).")
+@click.option("--rebuild", is_flag=True, help="Recompute all unlock state from the deposits instead.")
+@with_appcontext
+def unlock_sweep_command(interval, rebuild):
+    """Unlock deposits past MIN_INVEST_DAYS and show what unlocks over the next week."""
+    from datetime import datetime, timedelta
+    from . import unlocks
+
+    if rebuild:
+        summary = unlocks.rebuild()
+        click.echo(f"[UNLOCK] rebuilt {summary['deposits']} deposits, {summary['users']} users")
+        return
+    while True:
+        summary = unlocks.sweep()
+        now = datetime.utcnow()
+        count, users, amount = unlocks.upcoming(now, now + timedelta(days=7))
+        click.echo(f"[UNLOCK] unlocked {summary['deposits']} deposits ({summary['amount']:.2f} USDT, "
+                   f"{summary['users']} users); next 7 days: {count} deposits, {amount:.2f} USDT, {users} users")
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+@click.command("watch-deposits")
+@click.option("--source", "sources", multiple=True, default=["binance"],
+              type=click.Choice(["binance", "trongrid", "fake"]), help="Transfer source(s) to poll.")
+@click.option("--interval", type=int, default=None, help="Seconds between polls.")
+@click.option("--once", is_flag=True, help="Poll a single time and exit.")
+@with_appcontext
+def watch_deposits_command(sources, interval, once):
+    """Poll chain/exchange sources and auto-approve matching pending deposits."""
+    import asyncio
+    from .deposit_watcher import SOURCES, run
+    from .config import WATCHER_INTERVAL
+
+    def report(summary):
+        click.echo(f"[WATCHER] fetched {summary['fetched']} approved {summary['approved']} "
+                   f"amount mismatches {summary['amount_mismatch']} "
+                   f"duplicate hashes {summary['duplicate_hash']} errors {summary['errors']}")
+
+    asyncio.run(run([SOURCES[name]() for name in sources], interval or WATCHER_INTERVAL,
+                    once=once, on_poll=report))
+
+
+@click.command("process-payouts")
+@click.option("--batch-size", type=int, default=None, help="Requests claimed per batch.")
+@click.option("--concurrency", type=int, default=None, help="Parallel withdraw calls.")
+@click.option("--interval", type=int, default=10, help="Seconds to sleep when the queue is empty.")
+@click.option("--once", is_flag=True, help="Process a single batch and exit.")
+@click.option("--fake", is_flag=True, help="Use the local fake gateway instead of Binance.")
+@with_appcontext
+def process_payouts_command(batch_size, concurrency, interval, once, fake):
+    """Pay approved withdrawal requests in batches."""
+    from .payouts import BinanceGateway, FakeGateway, process_batch, recover_stale
+    from .config import PAYOUT_BATCH_SIZE, PAYOUT_CONCURRENCY
+
+    gateway = FakeGateway() if fake else BinanceGateway()
+    while True:
+        recovered = recover_stale(gateway)
+        summary = process_batch(gateway, batch_size or PAYOUT_BATCH_SIZE,
+                                concurrency or PAYOUT_CONCURRENCY)
+        click.echo(f"[PAYOUT] {summary} (recovered {recovered} stale)")
+        if once:
+            break
+        if not any(summary.values()):
+            time.sleep(interval)
+
+
+@click.command("outbox-worker")
+@click.option("--batch-size", type=int, default=None, help="Events claimed per batch.")
+@click.option("--interval", type=float, default=1.0, help="Seconds to sleep when nothing is due.")
+@click.option("--once", is_flag=True, help="Process a single batch and exit.")
+@click.option("--requeue-dead", is_flag=True, help="Retry dead events, then exit.")
+@with_appcontext
+def outbox_worker_command(batch_size, interval, once, requeue_dead):
+    """Deliver outbox events to their handlers (at-least-once, with retries)."""
+    import logging
+    from . import outbox
+    from .config import OUTBOX_BATCH_SIZE
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if requeue_dead:
+        click.echo(f"[OUTBOX] requeued {outbox.requeue_dead()} dead events")
+        return
+
+    idle = False
+    while True:
+        summary = outbox.process_batch(batch_size or OUTBOX_BATCH_SIZE)
+        busy = any(summary.values())
+        if busy:
+            click.echo(f"[OUTBOX] {summary}")
+        elif not idle:
+            removed = outbox.purge()  # housekeeping once per idle stretch
+            if removed:
+                click.echo(f"[OUTBOX] purged {removed} delivered events")
+        idle = not busy
+        if once:
+            break
+        if idle:
+            time.sleep(interval)
+
+
+def register_commands(app):
+    app.cli.add_command(accrue_interest_command)
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(ledger_reconcile_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(liability_report_command)
+    app.cli.add_command(rollups_rebuild_command)
+    app.cli.add_command(archive_command)
+    app.cli.add_command(unlock_sweep_command)
+    app.cli.add_command(watch_deposits_command)
+    app.cli.add_command(process_payouts_command)
+    app.cli.add_command(outbox_worker_command)
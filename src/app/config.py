@@ -29,4 +29,166 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'supersecretkey123')
 # Investment settings
 # -------------------------
 WEEKLY_INTEREST_RATE = float(os.getenv('WEEKLY_INTEREST_RATE', 0.02))  # 2% per week
-MIN_INVEST_DAYS = int(os.getenv('MIN_INVEST_DAYS', 60))                # 60 days minimum for withdrawals
\ No newline at end of file
+MIN_INVEST_DAYS = int(os.getenv('MIN_INVEST_DAYS', 60))                # 60 days minimum for withdrawals
+
+# -------------------------
+# Interest accrual job
+# -------------------------
+ACCRUAL_BATCH_SIZE = int(os.getenv('ACCRUAL_BATCH_SIZE', 5000))     # deposits per vectorized batch
+
+# -------------------------
+# Dashboard summary cache
+# -------------------------
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 30))          # seconds
+DASHBOARD_CACHE_SIZE = int(os.getenv('DASHBOARD_CACHE_SIZE', 10000))     # users kept per worker
+DASHBOARD_CACHE_URL = os.getenv('DASHBOARD_CACHE_URL')                   # e.g. redis://localhost:6379/0 (shared across workers)
+
+# -------------------------
+# Identity cache (per worker: id, username, is_admin, kyc_status for current_user)
+# -------------------------
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', 30))            # seconds; bounds staleness on other workers
+IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', 10000))
+
+# -------------------------
+# Admin dashboard
+# -------------------------
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 50))                  # rows per table per page
+ADMIN_PAGE_MAX = int(os.getenv('ADMIN_PAGE_MAX', 200))                   # upper bound for ?limit=
+
+# -------------------------
+# Database engine profile
+# -------------------------
+# "default" keeps SQLite's stock journaling; "production" turns on WAL,
+# synchronous=NORMAL, a busy timeout and a sized connection pool.
+DB_PROFILE = os.getenv('DB_PROFILE', 'default')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 15000))
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))                # seconds, server databases only
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 1000))                  # ids per bulk approve/reject request
+
+# -------------------------
+# On-chain deposit watcher
+# -------------------------
+WATCHER_INTERVAL = int(os.getenv('WATCHER_INTERVAL', 15))                # seconds between polls
+WATCHER_BATCH_SIZE = int(os.getenv('WATCHER_BATCH_SIZE', 500))           # deposits approved per batch
+TRONGRID_API_URL = os.getenv('TRONGRID_API_URL', 'https://api.trongrid.io')
+TRONGRID_API_KEY = os.getenv('TRONGRID_API_KEY')
+USDT_TRC20_CONTRACT = os.getenv('USDT_TRC20_CONTRACT', 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t')
+
+# -------------------------
+# Binance client layer
+# -------------------------
+BINANCE_CACHE_TTL = int(os.getenv('BINANCE_CACHE_TTL', 30))             # seconds for balance/address lookups
+BINANCE_POOL_SIZE = int(os.getenv('BINANCE_POOL_SIZE', 10))             # keep-alive connections
+BINANCE_WEIGHT_LIMIT = int(os.getenv('BINANCE_WEIGHT_LIMIT', 6000))     # request weight per minute
+BINANCE_MAX_RETRIES = int(os.getenv('BINANCE_MAX_RETRIES', 3))          # retries after 429/418
+
+# -------------------------
+# Withdrawal payouts
+# -------------------------
+PAYOUT_BATCH_SIZE = int(os.getenv('PAYOUT_BATCH_SIZE', 50))             # requests claimed per batch
+PAYOUT_CONCURRENCY = int(os.getenv('PAYOUT_CONCURRENCY', 4))            # parallel Binance withdraw calls
+PAYOUT_MAX_ATTEMPTS = int(os.getenv('PAYOUT_MAX_ATTEMPTS', 5))          # before a request is failed + refunded
+PAYOUT_STALE_MINUTES = int(os.getenv('PAYOUT_STALE_MINUTES', 10))       # "processing" longer than this is re-checked
+
+# -------------------------
+# Password hashing (argon2id)
+# -------------------------
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 3))                # iterations
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 65536))        # KiB per hash (64 MiB)
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 1))            # lanes per hash; the pool gives concurrency
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))      # hashes running at once per worker process
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 16))         # waiting hashes before login answers 503
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 5))   # seconds a request waits for its hash before 503
+
+# -------------------------
+# KYC document uploads
+# -------------------------
+KYC_MAX_UPLOAD_MB = int(os.getenv('KYC_MAX_UPLOAD_MB', 10))             # per document; larger requests get 413
+KYC_ALLOWED_EXTENSIONS = set(os.getenv('KYC_ALLOWED_EXTENSIONS', 'jpg,jpeg,png,webp,heic,pdf').lower().split(','))
+KYC_PREVIEW_MAX_SIDE = int(os.getenv('KYC_PREVIEW_MAX_SIDE', 2000))      # px, downscaled JPEG for viewing
+KYC_THUMB_SIDE = int(os.getenv('KYC_THUMB_SIDE', 240))                  # px, admin queue thumbnail
+KYC_WORKERS = int(os.getenv('KYC_WORKERS', 2))                          # background image-processing threads
+
+# -------------------------
+# Instrumentation (/metrics, slow-request log)
+# -------------------------
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')                              # if set, /metrics needs "Authorization: Bearer <token>"; unset: admins only
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 0))                  # log requests slower than this with their queries; 0 = off
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))        # same statement this often in one request = N+1
+
+# -------------------------
+# Data exports
+# -------------------------
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 2000))            # rows per read transaction
+
+# -------------------------
+# Transactional outbox (post-commit side effects)
+# -------------------------
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))             # events claimed per batch
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 120))       # a claimed event is retried after this if its worker dies
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))          # before an event is marked dead
+OUTBOX_RETRY_SECONDS = int(os.getenv('OUTBOX_RETRY_SECONDS', 5))         # first retry delay, doubled per attempt (max 1 h)
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 14))      # delivered events kept this long
+OUTBOX_WEBHOOK_URL = os.getenv('OUTBOX_WEBHOOK_URL')                     # if set, every event is POSTed here (accounting/notifications)
+OUTBOX_WEBHOOK_TIMEOUT = int(os.getenv('OUTBOX_WEBHOOK_TIMEOUT', 10))    # seconds
+
+# -------------------------
+# Liability projection / solvency check
+# -------------------------
+PROJECTION_WEEKS = int(os.getenv('PROJECTION_WEEKS', 52))                # horizon
+# weekly rates to project; default: half, equal to and 1.5x WEEKLY_INTEREST_RATE
+PROJECTION_RATES = [float(r) for r in os.getenv(
+    'PROJECTION_RATES', f"{WEEKLY_INTEREST_RATE / 2},{WEEKLY_INTEREST_RATE},{WEEKLY_INTEREST_RATE * 1.5}").split(',')]
+PROJECTION_BATCH_SIZE = int(os.getenv('PROJECTION_BATCH_SIZE', 50000))   # rows fetched + converted per batch
+PROJECTION_CACHE_TTL = int(os.getenv('PROJECTION_CACHE_TTL', 300))       # seconds a computed report is reused
+
+# -------------------------
+# Withdrawal unlocks (see unlocks.py)
+# -------------------------
+UNLOCK_SWEEP_BATCH_SIZE = int(os.getenv('UNLOCK_SWEEP_BATCH_SIZE', 1000))  # deposits unlocked per transaction
+
+# -------------------------
+# Rate limiting / load shedding (main blueprint, see ratelimit.py)
+# -------------------------
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+# "memory" (per worker), "sqlite:////dev/shm/ratelimit.db" (shared by the workers on a host)
+# or "redis://host:6379/1" (shared by every host)
+RATE_LIMIT_STORAGE = os.getenv('RATE_LIMIT_STORAGE', 'sqlite:///' + (
+    '/dev/shm' if os.path.isdir('/dev/shm') else os.getenv('TMPDIR', '/tmp')) + '/projectz-ratelimit.db')
+RATE_LIMIT_IP_BURST = float(os.getenv('RATE_LIMIT_IP_BURST', 60))        # tokens per client IP
+RATE_LIMIT_IP_RATE = float(os.getenv('RATE_LIMIT_IP_RATE', 1))           # tokens refilled per second
+RATE_LIMIT_USER_BURST = float(os.getenv('RATE_LIMIT_USER_BURST', 120))   # tokens per logged-in user
+RATE_LIMIT_USER_RATE = float(os.getenv('RATE_LIMIT_USER_RATE', 2))
+# endpoint[:METHOD]=cost; everything else costs 1. Cost > 1 also marks an endpoint as expensive.
+RATE_LIMIT_COSTS = os.getenv('RATE_LIMIT_COSTS',
+                             'main.login:POST=10,main.register:POST=20,main.kyc:POST=10,main.deposit=3')
+RATE_LIMIT_MAX_INFLIGHT = int(os.getenv('RATE_LIMIT_MAX_INFLIGHT', 64))            # requests in progress, all workers
+RATE_LIMIT_MAX_INFLIGHT_EXPENSIVE = int(os.getenv('RATE_LIMIT_MAX_INFLIGHT_EXPENSIVE', 4))  # ... of which expensive
+RATE_LIMIT_MAX_QUEUE_MS = int(os.getenv('RATE_LIMIT_MAX_QUEUE_MS', 0))   # shed if X-Request-Start is older; 0 = off
+RATE_LIMIT_PROXY_HOPS = int(os.getenv('RATE_LIMIT_PROXY_HOPS', 0))       # trusted proxies in X-Forwarded-For; set 1 behind Render/nginx
+
+# -------------------------
+# Archival of settled history (see archive.py)
+# -------------------------
+ARCHIVE_DEPOSIT_DAYS = int(os.getenv('ARCHIVE_DEPOSIT_DAYS', 180))     # rejected deposits older than this
+ARCHIVE_KYC_DAYS = int(os.getenv('ARCHIVE_KYC_DAYS', 90))              # reviewed, superseded KYC logs older than this
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))        # rows moved per transaction
+# Compressed KYC documents of archived rows; keep it outside static/ (never served directly)
+ARCHIVE_DOCUMENT_DIR = os.getenv('ARCHIVE_DOCUMENT_DIR', os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'archive', 'documents')))
+
+# -------------------------
+# Live admin queue (/admin/queue, Server-Sent Events, see live.py)
+# -------------------------
+ADMIN_LIVE_POLL_SECONDS = float(os.getenv('ADMIN_LIVE_POLL_SECONDS', 1))      # outbox reads per worker, whatever the number of admins
+ADMIN_LIVE_BUFFER = int(os.getenv('ADMIN_LIVE_BUFFER', 1000))                 # recent queue events kept per worker
+ADMIN_LIVE_HEARTBEAT_SECONDS = int(os.getenv('ADMIN_LIVE_HEARTBEAT_SECONDS', 15))
+ADMIN_LIVE_MAX_SECONDS = int(os.getenv('ADMIN_LIVE_MAX_SECONDS', 300))        # then the browser reconnects with Last-Event-ID
+# A stream holds a request thread while open: run gunicorn with threads or gevent
+# (`--worker-class gthread --threads 8`) and keep this below the thread count.
+# With sync workers set it to 0 and every admin polls instead.
+ADMIN_LIVE_MAX_STREAMS = int(os.getenv('ADMIN_LIVE_MAX_STREAMS', 2))          # open streams per worker; past it clients poll
+ADMIN_LIVE_FALLBACK_SECONDS = int(os.getenv('ADMIN_LIVE_FALLBACK_SECONDS', 5))  # poll interval once the cap is reached
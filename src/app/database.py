@@ -0,0 +1,70 @@
+# src/app/database.py
+"""
+Database engine configuration.
+
+`engine_options` builds SQLALCHEMY_ENGINE_OPTIONS for a URI + profile and
+`install_pragmas` sets SQLite pragmas on every new DB-API connection. Both
+are plain functions so the write-contention benchmark can build the exact
+same engines outside Flask.
+"""
+from sqlalchemy import event
+
+from .config import (
+    DB_PROFILE, SQLITE_BUSY_TIMEOUT_MS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE,
+)
+
+PROFILES = ("default", "production")
+
+
+def is_sqlite(uri):
+    return uri.startswith("sqlite")
+
+
+def engine_options(uri, profile=DB_PROFILE):
+    """SQLAlchemy create_engine() keyword arguments for a URI and profile."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {profile!r}, expected one of {PROFILES}")
+
+    if profile == "default":
+        return {}
+
+    if is_sqlite(uri):
+        return {
+            # sqlite3 waits this long on a locked database before raising
+            "connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+        }
+
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def sqlite_pragmas(profile=DB_PROFILE):
+    """PRAGMA statements run on each new SQLite connection."""
+    if profile == "default":
+        return []
+    return [
+        "PRAGMA journal_mode=WAL",          # readers no longer block the writer (and vice versa)
+        "PRAGMA synchronous=NORMAL",        # fsync at checkpoints only; safe with WAL
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def install_pragmas(engine, profile=DB_PROFILE):
+    """Run sqlite_pragmas() on every connection the engine opens (no-op for other databases)."""
+    pragmas = sqlite_pragmas(profile)
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
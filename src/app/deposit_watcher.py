@@ -0,0 +1,258 @@
+# src/app/deposit_watcher.py
+"""
+Background on-chain deposit watcher.
+
+Each poll asks every configured source for transfers newer than its stored
+checkpoint (sources are fetched concurrently with asyncio), records them in
+`chain_transfer`, and matches unmatched transfers to pending Deposit rows by
+tx_hash and exact amount. Matches are approved in batches through
+bulk.approve_deposits, i.e. the same ledger crediting the admin uses.
+
+Transfers that arrive before the user submits their Deposit stay in
+`chain_transfer` and match on a later poll.
+
+    flask --app run watch-deposits --source binance
+    flask --app run watch-deposits --source trongrid --once
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from . import db
+from .bulk import approve_deposits
+from .ledger import to_micro
+from .models import ChainTransfer, Deposit, WatcherCheckpoint
+from .config import (
+    WATCHER_BATCH_SIZE, TRONGRID_API_URL, TRONGRID_API_KEY, USDT_TRC20_CONTRACT,
+    BINANCE_MASTER_ADDRESS, BINANCE_NETWORK,
+)
+
+
+@dataclass(frozen=True)
+class Transfer:
+    tx_hash: str
+    amount_micro: int
+    cursor: int                # source position, stored as the checkpoint once processed
+    asset: str = "USDT"
+    network: str = BINANCE_NETWORK
+    block_time: datetime = None
+    confirmed: bool = True     # False: seen but not final yet, recorded on a later poll
+
+
+# -------------------------
+# Sources
+# -------------------------
+class BinanceDepositSource:
+    """Successful deposits from Binance deposit history (cursor = insertTime, ms)."""
+    name = "binance"
+    SUCCESS = 1
+    IN_PROGRESS = (0, 6, 8)  # pending, credited but locked, waiting for user confirmation
+
+    def __init__(self, asset="USDT"):
+        self.asset = asset
+
+    def _fetch(self, since):
+        from .binance_utils import get_deposit_history
+
+        return get_deposit_history(asset=self.asset, start_time=since + 1)
+
+    async def fetch(self, since):
+        rows = await asyncio.to_thread(self._fetch, since)
+        return [
+            Transfer(
+                tx_hash=row["txId"],
+                amount_micro=to_micro(row["amount"]),
+                cursor=int(row["insertTime"]),
+                asset=row.get("coin", self.asset),
+                network=row.get("network", BINANCE_NETWORK),
+                block_time=datetime.utcfromtimestamp(int(row["insertTime"]) / 1000),
+                confirmed=row.get("status") == self.SUCCESS,
+            )
+            for row in rows
+            if row.get("status") == self.SUCCESS or row.get("status") in self.IN_PROGRESS
+        ]
+
+
+class TronGridSource:
+    """Incoming USDT-TRC20 transfers to the master address (cursor = block_timestamp, ms)."""
+    name = "trongrid"
+
+    def __init__(self, address=BINANCE_MASTER_ADDRESS, contract=USDT_TRC20_CONTRACT,
+                 base_url=TRONGRID_API_URL, api_key=TRONGRID_API_KEY, timeout=10):
+        self.address = address
+        self.contract = contract
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"TRON-PRO-API-KEY": api_key} if api_key else {}
+        self.timeout = timeout
+
+    def _fetch(self, since):
+        import requests
+
+        url = f"{self.base_url}/v1/accounts/{self.address}/transactions/trc20"
+        params = {"only_to": "true", "contract_address": self.contract,
+                  "min_timestamp": since + 1, "order_by": "block_timestamp,asc", "limit": 200}
+        rows = []
+        with requests.Session() as session:
+            while url:
+                resp = session.get(url, params=params, headers=self.headers, timeout=self.timeout)
+                resp.raise_for_status()
+                body = resp.json()
+                rows += body.get("data", [])
+                url, params = body.get("meta", {}).get("links", {}).get("next"), None
+        return rows
+
+    async def fetch(self, since):
+        rows = await asyncio.to_thread(self._fetch, since)
+        transfers = []
+        for row in rows:
+            decimals = int(row.get("token_info", {}).get("decimals", 6))
+            # token base units -> micro-units (USDT-TRC20 has 6 decimals already)
+            amount_micro = int(row["value"]) * 10 ** 6 // 10 ** decimals
+            transfers.append(Transfer(
+                tx_hash=row["transaction_id"],
+                amount_micro=amount_micro,
+                cursor=int(row["block_timestamp"]),
+                network="TRC20",
+                block_time=datetime.utcfromtimestamp(int(row["block_timestamp"]) / 1000),
+            ))
+        return transfers
+
+
+class FakeSource:
+    """In-memory source for local runs and tests: add() transfers, fetch() returns the new ones."""
+
+    def __init__(self, name="fake"):
+        self.name = name
+        self.transfers = []
+
+    def add(self, tx_hash, amount, cursor=None, network=BINANCE_NETWORK):
+        cursor = cursor if cursor is not None else len(self.transfers) + 1
+        self.transfers.append(Transfer(tx_hash, to_micro(amount), cursor, network=network,
+                                       block_time=datetime.utcnow()))
+
+    async def fetch(self, since):
+        return [t for t in self.transfers if t.cursor > since]
+
+
+SOURCES = {
+    "binance": BinanceDepositSource,
+    "trongrid": TronGridSource,
+    "fake": FakeSource,
+}
+
+
+# -------------------------
+# Checkpoints + matching (synchronous DB work, inside an app context)
+# -------------------------
+def get_checkpoint(source_name):
+    checkpoint = db.session.get(WatcherCheckpoint, source_name)
+    return checkpoint.cursor if checkpoint else 0
+
+
+def record_transfers(source_name, transfers):
+    """
+    Store unseen confirmed transfers and advance the source checkpoint, in one
+    commit. The checkpoint stays before the oldest unconfirmed transfer, so
+    that one is fetched again until it is final.
+    """
+    pending = [t.cursor for t in transfers if not t.confirmed]
+    transfers = [t for t in transfers if t.confirmed]
+    if transfers or pending:
+        hashes = [t.tx_hash for t in transfers]
+        known = set(db.session.execute(
+            select(ChainTransfer.tx_hash).where(ChainTransfer.tx_hash.in_(hashes))
+        ).scalars())
+        db.session.add_all(
+            ChainTransfer(source=source_name, tx_hash=t.tx_hash, amount_micro=t.amount_micro,
+                          asset=t.asset, network=t.network, block_time=t.block_time)
+            for t in {t.tx_hash: t for t in transfers}.values()
+            if t.tx_hash not in known
+        )
+
+        checkpoint = db.session.get(WatcherCheckpoint, source_name) \
+            or WatcherCheckpoint(source=source_name, cursor=0)
+        cursor = max([checkpoint.cursor or 0] + [t.cursor for t in transfers])
+        if pending:
+            cursor = min(cursor, min(pending) - 1)
+        checkpoint.cursor = max(checkpoint.cursor or 0, cursor)
+        db.session.add(checkpoint)
+
+    db.session.commit()
+
+
+def match_pending(batch_size=WATCHER_BATCH_SIZE):
+    """
+    Approve pending deposits whose tx_hash and amount match an unmatched transfer.
+    A transfer claimed by more than one pending deposit (the same tx_hash
+    submitted twice) approves none of them: they are left for an admin.
+    Returns {"approved": n, "amount_mismatch": [deposit ids], "duplicate_hash": [deposit ids]}.
+    """
+    rows = db.session.execute(
+        select(Deposit.id, Deposit.amount, ChainTransfer.id, ChainTransfer.amount_micro)
+        .join(ChainTransfer, ChainTransfer.tx_hash == Deposit.tx_hash)
+        .where(ChainTransfer.deposit_id.is_(None), Deposit.status == "pending")
+    ).all()
+
+    claims = {}
+    for deposit_id, amount, transfer_id, transfer_micro in sorted(rows):
+        claims.setdefault((transfer_id, transfer_micro), []).append((deposit_id, amount))
+
+    matched, mismatched, duplicates = [], [], []
+    for (transfer_id, transfer_micro), deposits in claims.items():
+        if len(deposits) > 1:
+            duplicates += [deposit_id for deposit_id, _ in deposits]  # who paid is for a human to decide
+            continue
+        deposit_id, amount = deposits[0]
+        if to_micro(amount) != transfer_micro:
+            mismatched.append(deposit_id)  # left pending for an admin to look at
+        else:
+            matched.append((deposit_id, transfer_id))
+
+    approved = 0
+    for start in range(0, len(matched), batch_size):
+        batch = dict(matched[start:start + batch_size])
+        results = approve_deposits(list(batch))
+        done = [r["id"] for r in results if r["result"] == "approved"]
+        if done:
+            db.session.execute(
+                update(ChainTransfer),
+                [{"id": batch[dep_id], "deposit_id": dep_id} for dep_id in done],
+            )
+            db.session.commit()
+        approved += len(done)
+
+    return {"approved": approved, "amount_mismatch": mismatched, "duplicate_hash": duplicates}
+
+
+# -------------------------
+# Polling loop
+# -------------------------
+async def poll_once(sources):
+    """Fetch all sources concurrently, record new transfers, then match. Returns a summary."""
+    since = {source.name: get_checkpoint(source.name) for source in sources}
+    batches = await asyncio.gather(
+        *(source.fetch(since[source.name]) for source in sources), return_exceptions=True
+    )
+
+    summary = {"fetched": {}, "errors": {}}
+    for source, transfers in zip(sources, batches):
+        if isinstance(transfers, Exception):
+            summary["errors"][source.name] = repr(transfers)  # keep polling the other sources
+            continue
+        record_transfers(source.name, transfers)
+        summary["fetched"][source.name] = sum(t.confirmed for t in transfers)
+
+    summary.update(match_pending())
+    return summary
+
+
+async def run(sources, interval, once=False, on_poll=None):
+    while True:
+        summary = await poll_once(sources)
+        if on_poll:
+            on_poll(summary)
+        if once:
+            return summary
+        await asyncio.sleep(interval)
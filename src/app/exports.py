@@ -0,0 +1,128 @@
+# src/app/exports.py
+"""
+Streaming CSV / JSONL exports of users, deposits and KYC logs.
+
+Rows are read in keyset batches on the primary key (EXPORT_BATCH_SIZE rows
+per query); each batch is its own short read transaction, so an export never
+holds SQLite's lock for longer than one batch and writers keep committing
+between batches. Rows are encoded and yielded batch by batch (optionally
+gzip-compressed on the fly), so memory stays flat whatever the row count.
+Because batches are separate transactions, a long export is not a single
+point-in-time snapshot.
+
+Used by /admin/export/<kind> and `flask --app run export <kind>`.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from sqlalchemy import select
+
+from . import db
+from .models import User, Deposit, KYCLog, MICRO
+from .config import EXPORT_BATCH_SIZE
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def _micro(col):
+    return (col / float(MICRO)).label(col.key.removesuffix("_micro"))
+
+
+# kind -> (model, columns, timestamp column or None, status column)
+EXPORTS = {
+    "users": (User, [User.id, User.username, User.email, User.kyc_status, User.is_admin,
+                     _micro(User.balance_micro), _micro(User.total_deposits_micro),
+                     _micro(User.total_withdrawals_micro), User.total_earnings, User.earnings_as_of],
+              None, User.kyc_status),
+    "deposits": (Deposit, [Deposit.id, Deposit.user_id, Deposit.amount, Deposit.network, Deposit.tx_hash,
+                           Deposit.status, Deposit.timestamp, Deposit.accrued_interest, Deposit.accrued_at],
+                 Deposit.timestamp, Deposit.status),
+    "kyc": (KYCLog, [KYCLog.id, KYCLog.user_id, KYCLog.full_name, KYCLog.id_number, KYCLog.status,
+                     KYCLog.document_hash, KYCLog.document_path, KYCLog.timestamp],
+            KYCLog.timestamp, KYCLog.status),
+}
+
+
+def _query(kind, status=None, user_id=None, date_from=None, date_to=None):
+    model, columns, ts_col, status_col = EXPORTS[kind]
+    query = select(*columns)
+    if status:
+        query = query.where(status_col == status)
+    if user_id is not None:
+        query = query.where((model.id if model is User else model.user_id) == user_id)
+    if ts_col is not None and date_from:
+        query = query.where(ts_col >= date_from)
+    if ts_col is not None and date_to:
+        query = query.where(ts_col < date_to)
+    return model, query
+
+
+def iter_batches(kind, batch_size=EXPORT_BATCH_SIZE, **filters):
+    """Yield lists of row mappings, keyset-paged on id, one short transaction per batch."""
+    model, query = _query(kind, **filters)
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            query.where(model.id > last_id).order_by(model.id).limit(batch_size)
+        ).mappings().all()
+        db.session.rollback()  # end the read transaction between batches
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]["id"]
+
+
+def columns(kind):
+    return [col.key for col in EXPORTS[kind][1]]
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def encode(kind, fmt, batches):
+    """Yield text chunks: a CSV header + rows, or one JSON object per line."""
+    names = columns(kind)
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(names)
+        for rows in batches:
+            writer.writerows([_value(row[name]) for name in names] for row in rows)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+    else:
+        for rows in batches:
+            yield "".join(json.dumps({name: _value(row[name]) for name in names}) + "\n" for row in rows)
+
+
+def gzipped(chunks):
+    """Compress a stream of text chunks on the fly (gzip container)."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(kind, fmt="csv", gzip=False, batch_size=EXPORT_BATCH_SIZE, **filters):
+    """Chunks (bytes) for an export: the single entry point for the route and the CLI."""
+    if kind not in EXPORTS:
+        raise ValueError(f"unknown export {kind!r}")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}")
+    chunks = encode(kind, fmt, iter_batches(kind, batch_size, **filters))
+    return gzipped(chunks) if gzip else (chunk.encode() for chunk in chunks)
+
+
+def filename(kind, fmt, gzip=False):
+    return f"{kind}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}{'.gz' if gzip else ''}"
@@ -0,0 +1,165 @@
+# src/app/ledger.py
+"""
+Append-only balance ledger.
+
+Every balance change is one LedgerEntry (integer micro-USDT) plus a single
+conditional UPDATE on the cached counters in `user`:
+
+    UPDATE user SET balance_micro = balance_micro + :x ...
+    WHERE id = :id AND balance_micro + :x >= 0
+
+No row is read first, so concurrent approvals/credits cannot lose updates
+and no lock has to be held across a read-modify-write. Withdrawals and their
+refunds move `unlocked_micro` in the same UPDATE (a withdrawal also needs
+unlocked_micro >= x), so no more than the unlocked principal can leave (see
+unlocks.py). `post` does not commit: the caller commits it together with
+whatever caused the change.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from . import db, rollups
+from .models import User, LedgerEntry, MICRO
+
+# Which running total each entry kind feeds (besides the balance)
+DEPOSIT_KINDS = ("deposit", "credit")
+WITHDRAWAL_KINDS = ("debit", "withdrawal", "withdrawal_refund")
+# Which kinds spend (or give back) unlocked principal
+UNLOCKED_KINDS = ("withdrawal", "withdrawal_refund")
+
+
+class InsufficientFunds(Exception):
+    """The debit would take the user's balance (or, for a withdrawal, unlocked principal) below zero."""
+
+
+def to_micro(amount):
+    """USDT (float/str/Decimal) -> integer micro-USDT, rounded half-up."""
+    return int((Decimal(str(amount)) * MICRO).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_micro(amount_micro):
+    return amount_micro / MICRO
+
+
+def post(user_id, amount_micro, kind, reference=None, memo=None):
+    """
+    Apply a signed balance change atomically and append its ledger entry.
+    Raises InsufficientFunds if a negative amount exceeds the balance, or a
+    withdrawal the unlocked principal.
+    """
+    values = {"balance_micro": User.balance_micro + amount_micro}
+    if kind in DEPOSIT_KINDS:
+        values["total_deposits_micro"] = User.total_deposits_micro + amount_micro
+    elif kind in WITHDRAWAL_KINDS:
+        values["total_withdrawals_micro"] = User.total_withdrawals_micro - amount_micro
+    if kind in UNLOCKED_KINDS:
+        values["unlocked_micro"] = User.unlocked_micro + amount_micro
+
+    stmt = update(User).where(User.id == user_id).values(**values)
+    if amount_micro < 0:
+        stmt = stmt.where(User.balance_micro >= -amount_micro)
+        if kind in UNLOCKED_KINDS:
+            stmt = stmt.where(User.unlocked_micro >= -amount_micro)
+
+    result = db.session.execute(stmt, execution_options={"synchronize_session": False})
+    if result.rowcount != 1:
+        if amount_micro >= 0:
+            raise LookupError(f"User {user_id} not found")
+        raise InsufficientFunds(f"User {user_id} cannot cover {from_micro(-amount_micro):.6f} USDT")
+
+    rollups.balances_moved(amount_micro,
+                           amount_micro if kind in DEPOSIT_KINDS else 0,
+                           -amount_micro if kind in WITHDRAWAL_KINDS else 0)
+
+    entry = LedgerEntry(user_id=user_id, amount_micro=amount_micro, kind=kind,
+                        reference=reference, memo=memo)
+    db.session.add(entry)
+    db.session.flush()  # surfaces a duplicate (kind, reference) before the caller commits
+    return entry
+
+
+def post_many(entries):
+    """
+    Set-based variant of `post` for credits: entries are
+    (user_id, amount_micro, kind, reference) tuples with amount_micro >= 0.
+    Issues one executemany UPDATE (one row per user) and one bulk INSERT.
+    """
+    per_user = {}
+    for user_id, amount_micro, kind, _ in entries:
+        if amount_micro < 0:
+            raise ValueError("post_many only applies credits")
+        totals = per_user.setdefault(user_id, {"uid": user_id, "bal": 0, "dep": 0, "wd": 0})
+        totals["bal"] += amount_micro
+        if kind in DEPOSIT_KINDS:
+            totals["dep"] += amount_micro
+    if not per_user:
+        return 0
+
+    users = User.__table__
+    db.session.execute(
+        users.update()
+        .where(users.c.id == bindparam("uid"))
+        .values(balance_micro=users.c.balance_micro + bindparam("bal"),
+                total_deposits_micro=users.c.total_deposits_micro + bindparam("dep"),
+                total_withdrawals_micro=users.c.total_withdrawals_micro + bindparam("wd")),
+        list(per_user.values()),
+    )
+    db.session.execute(
+        insert(LedgerEntry),
+        [{"user_id": user_id, "amount_micro": amount_micro, "kind": kind, "reference": reference}
+         for user_id, amount_micro, kind, reference in entries],
+    )
+    rollups.balances_moved(sum(t["bal"] for t in per_user.values()),
+                           sum(t["dep"] for t in per_user.values()))
+    return len(entries)
+
+
+def credit(user_id, amount, kind="credit", reference=None, memo=None):
+    return post(user_id, to_micro(amount), kind, reference, memo)
+
+
+def debit(user_id, amount, kind="debit", reference=None, memo=None):
+    return post(user_id, -to_micro(amount), kind, reference, memo)
+
+
+# -------------------------
+# Derived balances / reconciliation
+# -------------------------
+def ledger_balance(user_id):
+    """Balance derived from the ledger alone (micro-USDT)."""
+    return db.session.execute(
+        select(func.coalesce(func.sum(LedgerEntry.amount_micro), 0))
+        .where(LedgerEntry.user_id == user_id)
+    ).scalar()
+
+
+def reconcile():
+    """
+    Users whose cached balance differs from their ledger sum, in one query.
+    Returns [(user_id, cached_micro, ledger_micro)]; empty means the books agree.
+    """
+    sums = (
+        select(LedgerEntry.user_id, func.sum(LedgerEntry.amount_micro).label("total"))
+        .group_by(LedgerEntry.user_id)
+        .subquery()
+    )
+    ledger_total = func.coalesce(sums.c.total, 0)
+    rows = db.session.execute(
+        select(User.id, User.balance_micro, ledger_total)
+        .outerjoin(sums, sums.c.user_id == User.id)
+        .where(User.balance_micro != ledger_total)
+    ).all()
+    return [tuple(r) for r in rows]
+
+
+def rebuild_balances():
+    """Reset every cached balance to its ledger sum (repair after a failed reconcile)."""
+    total = (
+        select(func.coalesce(func.sum(LedgerEntry.amount_micro), 0))
+        .where(LedgerEntry.user_id == User.id)
+        .scalar_subquery()
+    )
+    db.session.execute(update(User).values(balance_micro=total))
+    db.session.commit()
+    rollups.rebuild()  # platform balance totals follow the repaired balances
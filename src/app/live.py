@@ -0,0 +1,278 @@
+# src/app/live.py
+"""
+Live admin review queue over Server-Sent Events.
+
+The change feed is the outbox (see outbox.py). Every deposit and KYC status
+change already writes an outbox_event row in its own transaction, and ids
+grow in commit order because SQLite serializes writers. So "what changed
+since event N" is one primary-key range scan on outbox_event.
+
+Each worker keeps one ChangeFeed. At most once per ADMIN_LIVE_POLL_SECONDS,
+whichever stream asks first reads the new events. It loads the rows of newly
+submitted deposits/KYC logs (one query per kind) and appends the events to a
+ring buffer of ADMIN_LIVE_BUFFER events. Every open stream on the worker is
+served from that buffer, so ten admins cost the same as one.
+
+/admin/queue renders the pending rows once, with the outbox id it was taken
+at. /admin/queue/stream then sends only deltas:
+
+    id: 812
+    event: deposit
+    data: {"id": 57, "status": "pending", "row": {...}}
+
+An event with status "pending" adds or updates the row; any other status
+removes it. EventSource reconnects on its own and sends Last-Event-ID, so
+the stream resumes from there. Resuming from before the buffer reads the
+outbox directly. If those events were already purged, the stream sends
+`reset` and the page reloads. A stream ends after ADMIN_LIVE_MAX_SECONDS so
+it does not hold a worker thread forever; the browser then reconnects.
+
+An open stream occupies a request thread, so this needs a threaded or gevent
+worker class (`gunicorn --worker-class gthread --threads 8 run:app`); on
+sync workers every open stream is a worker the site cannot use. Each worker
+also keeps at most ADMIN_LIVE_MAX_STREAMS streams open. Past that, a
+connection gets the changes since its Last-Event-ID, `retry:
+ADMIN_LIVE_FALLBACK_SECONDS` and is closed at once, so EventSource polls
+instead. Set the cap to 0 on sync workers.
+
+The cursor is only sound because SQLite commits in id order. On a server
+database a transaction can commit an event with a lower id after a higher
+one is already visible, and a cursor would skip it for good. So
+`supported()` is False there: /admin/queue/stream answers 404, and the page
+instead polls full snapshots (/admin/queue?format=json) every
+ADMIN_LIVE_FALLBACK_SECONDS.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import func, select
+
+from . import db
+from .models import OutboxEvent, Deposit, KYCLog, User
+from .config import (
+    ADMIN_LIVE_POLL_SECONDS, ADMIN_LIVE_BUFFER, ADMIN_LIVE_HEARTBEAT_SECONDS, ADMIN_LIVE_MAX_SECONDS,
+    ADMIN_LIVE_MAX_STREAMS, ADMIN_LIVE_FALLBACK_SECONDS,
+)
+
+# outbox topic -> (SSE event, status it moves the row to)
+TOPICS = {
+    "deposit.submitted": ("deposit", "pending"),
+    "deposit.approved": ("deposit", "approved"),
+    "deposit.rejected": ("deposit", "rejected"),
+    "kyc.submitted": ("kyc", "pending"),
+    "kyc.approved": ("kyc", "approved"),
+    "kyc.rejected": ("kyc", "rejected"),
+}
+PAYLOAD_ID = {"deposit": "deposit_id", "kyc": "kyc_id"}
+
+
+# -------------------------
+# Rows as the live page shows them
+# -------------------------
+def _plain(row):
+    """Same JSON in the page and in the stream."""
+    if row["timestamp"]:
+        row["timestamp"] = row["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
+    return row
+
+
+def deposit_rows(where, limit=None):
+    query = (
+        select(Deposit.id, Deposit.user_id, User.username, Deposit.amount, Deposit.network,
+               Deposit.tx_hash, Deposit.status, Deposit.timestamp)
+        .join(User, User.id == Deposit.user_id).where(where)
+        .order_by(Deposit.timestamp, Deposit.id).limit(limit)
+    )
+    return [_plain(row._asdict()) for row in db.session.execute(query)]
+
+
+def kyc_rows(where, limit=None):
+    query = (
+        select(KYCLog.id, KYCLog.user_id, User.username, KYCLog.full_name, KYCLog.id_number,
+               KYCLog.status, KYCLog.timestamp, KYCLog.document_path, KYCLog.thumbnail_path)
+        .join(User, User.id == KYCLog.user_id).where(where)
+        .order_by(KYCLog.timestamp, KYCLog.id).limit(limit)
+    )
+    rows = []
+    for row in db.session.execute(query):
+        row = row._asdict()
+        # only the file names: the page links them under static/uploads
+        for path, name in (("document_path", "document"), ("thumbnail_path", "thumbnail")):
+            value = row.pop(path)
+            row[name] = value.split("/")[-1] if value else None
+        rows.append(_plain(row))
+    return rows
+
+
+def snapshot(limit):
+    """(cursor, deposits, kycs): the pending queue, oldest first, and the outbox id it is current to."""
+    cursor = latest_id()  # taken first: a change made during the reads is sent again, never lost
+    deposits = deposit_rows(Deposit.status == "pending", limit)
+    kycs = kyc_rows(KYCLog.status == "pending", limit)
+    db.session.rollback()
+    return cursor, deposits, kycs
+
+
+def supported():
+    """Outbox ids grow in commit order only on SQLite (one writer at a time)."""
+    return db.engine.dialect.name == "sqlite"
+
+
+def latest_id():
+    return db.session.execute(select(func.max(OutboxEvent.id))).scalar() or 0
+
+
+def oldest_id():
+    return db.session.execute(select(func.min(OutboxEvent.id))).scalar() or 0
+
+
+def read_events(after, limit):
+    """
+    Queue events with outbox id > after, up to `limit` outbox rows.
+    Returns (events, last id scanned); other topics are skipped but scanned.
+    """
+    rows = db.session.execute(
+        select(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload)
+        .where(OutboxEvent.id > after).order_by(OutboxEvent.id).limit(limit)
+    ).all()
+    scanned = rows[-1].id if rows else after
+
+    events, submitted = [], {"deposit": set(), "kyc": set()}
+    for event_id, topic, payload in rows:
+        if topic not in TOPICS or PAYLOAD_ID[TOPICS[topic][0]] not in payload:
+            continue
+        kind, status = TOPICS[topic]
+        record_id = payload[PAYLOAD_ID[kind]]
+        events.append({"id": event_id, "event": kind, "data": {"id": record_id, "status": status, "row": None}})
+        if status == "pending":
+            submitted[kind].add(record_id)
+
+    # Rows for new submissions, one query per kind (a row missing by now was archived or deleted)
+    found = {}
+    if submitted["deposit"]:
+        found["deposit"] = {r["id"]: r for r in deposit_rows(Deposit.id.in_(submitted["deposit"]))}
+    if submitted["kyc"]:
+        found["kyc"] = {r["id"]: r for r in kyc_rows(KYCLog.id.in_(submitted["kyc"]))}
+    for event in events:
+        if event["data"]["status"] == "pending":
+            event["data"]["row"] = found.get(event["event"], {}).get(event["data"]["id"])
+    db.session.rollback()  # end the read transaction before the stream sleeps
+    return events, scanned
+
+
+# -------------------------
+# Per-worker feed
+# -------------------------
+class ChangeFeed:
+    def __init__(self, size=ADMIN_LIVE_BUFFER, interval=ADMIN_LIVE_POLL_SECONDS):
+        self.events = deque()
+        self.size = size
+        self.interval = interval
+        self.floor = None   # the buffer holds every queue event with id > floor
+        self.head = None    # last outbox id read
+        self.polled = 0.0
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """Read new events into the buffer, at most once per interval for the whole worker."""
+        with self._lock:
+            now = time.monotonic()
+            if self.head is None:
+                self.floor = self.head = latest_id()
+                db.session.rollback()
+            elif now - self.polled >= self.interval:
+                events, self.head = read_events(self.head, self.size)
+                self.events.extend(events)
+                while len(self.events) > self.size:
+                    self.floor = self.events.popleft()["id"]
+            else:
+                return
+            self.polled = now
+
+    def since(self, last_id):
+        """(events after last_id, cursor to resume from)."""
+        self.poll()
+        with self._lock:
+            if last_id >= self.floor:
+                return [e for e in self.events if e["id"] > last_id], max(last_id, self.head)
+        return read_events(last_id, self.size)  # resuming from before the buffer
+
+    def can_resume(self, last_id):
+        """False if events after last_id may already have been purged from the outbox."""
+        self.poll()
+        if last_id >= self.floor:
+            return True
+        first = oldest_id()
+        db.session.rollback()
+        return last_id + 1 >= first
+
+
+class StreamSlots:
+    """Counts the streams a worker holds open; acquire() is False once `limit` are."""
+
+    def __init__(self, limit=ADMIN_LIVE_MAX_STREAMS):
+        self.limit = limit
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.open >= self.limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+feed = ChangeFeed()
+slots = StreamSlots()
+
+
+# -------------------------
+# Stream
+# -------------------------
+def format_event(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+def stream(last_id, change_feed=feed, stream_slots=slots, max_seconds=ADMIN_LIVE_MAX_SECONDS,
+           heartbeat=ADMIN_LIVE_HEARTBEAT_SECONDS, fallback=ADMIN_LIVE_FALLBACK_SECONDS):
+    """Generator of SSE text for the queue, starting after outbox id last_id."""
+    # The slot is taken here, not in the view: a generator that never starts never runs `finally`
+    if not stream_slots.acquire():
+        yield f"retry: {fallback * 1000}\n\nevent: polling\ndata: {{}}\n\n"
+        yield from _changes(last_id, change_feed)
+        return
+    try:
+        yield f"retry: {int(change_feed.interval * 1000) + 2000}\n\n"
+        yield from _changes(last_id, change_feed, max_seconds, heartbeat)
+    finally:
+        stream_slots.release()
+
+
+def _changes(last_id, change_feed, max_seconds=0, heartbeat=ADMIN_LIVE_HEARTBEAT_SECONDS):
+    """SSE text for the changes after last_id until max_seconds have passed (0: one read)."""
+    if not change_feed.can_resume(last_id):
+        yield "event: reset\ndata: {}\n\n"
+        return
+
+    started = quiet_since = time.monotonic()
+    while True:
+        events, cursor = change_feed.since(last_id)
+        for event in events:
+            yield format_event(event)
+        if events or cursor != last_id:
+            if not events or events[-1]["id"] != cursor:
+                yield f"id: {cursor}\n\n"  # moves Last-Event-ID past events of other topics
+            last_id, quiet_since = cursor, time.monotonic()
+        elif time.monotonic() - quiet_since >= heartbeat:
+            yield ": keepalive\n\n"  # keeps proxies from closing an idle connection
+            quiet_since = time.monotonic()
+        if time.monotonic() - started >= max_seconds:
+            return
+        time.sleep(change_feed.interval)
@@ -0,0 +1,188 @@
+# src/app/metrics.py
+"""
+Request, SQL and Binance instrumentation.
+
+init_metrics(app) times every request by endpoint (main.*, admin.*), counts
+and times the SQL it runs through SQLAlchemy cursor events, flags N+1
+patterns (the same statement N_PLUS_ONE_THRESHOLD+ times in one request),
+and serves everything as Prometheus text on /metrics: to scrapers that send
+METRICS_TOKEN, or to logged-in admins when no token is set. With
+SLOW_REQUEST_MS set, slower requests are logged together with their query
+list.
+
+Metrics live in the worker process; with several gunicorn workers each one
+reports its own series (scrape per worker or aggregate upstream).
+"""
+import hmac
+import threading
+import time
+from collections import Counter as _Tally
+
+from flask import Response, abort, g, has_request_context, request
+from flask_login import current_user
+
+from .config import METRICS_ENABLED, METRICS_TOKEN, SLOW_REQUEST_MS, N_PLUS_ONE_THRESHOLD
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+# -------------------------
+# Minimal Prometheus-style registry
+# -------------------------
+def _labels(names, values):
+    return ",".join(f'{n}="{str(v).replace(chr(34), chr(39))}"' for n, v in zip(names, values))
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values = _Tally()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{{{_labels(self.labels, key)}}} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                base = _labels(self.labels, key)
+                sep = "," if base else ""
+                for bound, count in zip(self.buckets, series):
+                    yield f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {count}'
+                yield f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {series[-1]}'
+                yield f"{self.name}_sum{{{base}}} {series[-2]:.6f}"
+                yield f"{self.name}_count{{{base}}} {series[-1]}"
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by endpoint.",
+                            ("endpoint", "method", "status"))
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements per request.",
+                            ("endpoint",), buckets=QUERY_BUCKETS)
+REQUEST_DB_TIME = Histogram("http_request_db_seconds", "Time spent in SQL per request.", ("endpoint",))
+N_PLUS_ONE = Counter("db_n_plus_one_total", "Requests that repeated one statement N_PLUS_ONE_THRESHOLD+ times.",
+                     ("endpoint",))
+SLOW_REQUESTS = Counter("http_slow_requests_total", "Requests slower than SLOW_REQUEST_MS.", ("endpoint",))
+BINANCE_LATENCY = Histogram("binance_call_duration_seconds", "Binance client call latency.",
+                            ("method", "outcome"))
+RATE_LIMITED = Counter("http_rate_limited_total", "Requests refused with 429/503 by ratelimit.py.",
+                       ("endpoint", "reason"))
+
+REGISTRY = [REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, N_PLUS_ONE, SLOW_REQUESTS, BINANCE_LATENCY,
+            RATE_LIMITED]
+
+
+def render_metrics():
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def observe_binance(method, outcome, seconds):
+    BINANCE_LATENCY.observe(seconds, method=method, outcome=outcome)
+
+
+# -------------------------
+# SQL hooks (only statements run inside a request are attributed)
+# -------------------------
+# The start time lives on the execution context, so a statement that raises
+# (no after_cursor_execute) leaves nothing behind on the connection.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_start", None)
+    if started is not None and has_request_context() and "metrics_queries" in g:
+        g.metrics_queries.append((statement, time.perf_counter() - started))
+
+
+def install_sql_hooks(engine):
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# -------------------------
+# Request hooks
+# -------------------------
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = []
+
+
+def _finish_request(response):
+    started = g.pop("metrics_started", None)
+    queries = g.pop("metrics_queries", None)
+    if started is None:
+        return response
+
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or "unmatched"
+    REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    REQUEST_QUERIES.observe(len(queries), endpoint=endpoint)
+    REQUEST_DB_TIME.observe(sum(d for _, d in queries), endpoint=endpoint)
+
+    repeated = [(stmt, n) for stmt, n in _Tally(stmt for stmt, _ in queries).items()
+                if n >= N_PLUS_ONE_THRESHOLD]
+    if repeated:
+        N_PLUS_ONE.inc(endpoint=endpoint)
+
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        from flask import current_app
+
+        SLOW_REQUESTS.inc(endpoint=endpoint)
+        lines = [f"  {d * 1000:7.2f} ms  {' '.join(stmt.split())[:200]}" for stmt, d in queries]
+        lines += [f"  N+1? x{n}: {' '.join(stmt.split())[:200]}" for stmt, n in repeated]
+        current_app.logger.warning("[SLOW] %s %s -> %s in %.1f ms, %d queries (%.1f ms SQL)\n%s",
+                                   request.method, request.path, response.status_code, elapsed * 1000,
+                                   len(queries), sum(d for _, d in queries) * 1000, "\n".join(lines))
+    return response
+
+
+def metrics_view():
+    if METRICS_TOKEN:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied, METRICS_TOKEN):
+            abort(403)
+    elif not (current_user.is_authenticated and current_user.is_admin):
+        abort(404)  # no token configured: admins only, and nobody else learns the endpoint exists
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app, engine):
+    """Register request timing, SQL counting and /metrics on the app."""
+    if not METRICS_ENABLED:
+        return
+    install_sql_hooks(engine)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
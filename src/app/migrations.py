@@ -0,0 +1,162 @@
+# src/app/migrations.py
+"""
+Versioned schema migrations.
+
+`db.create_all()` only creates missing tables; it never alters an existing
+platform.db. Every schema change after the baseline is listed in MIGRATIONS
+and applied once, in order. The applied version is kept in `schema_version`.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from . import db
+
+
+# -------------------------
+# Helpers (idempotent, so a fresh create_all() DB can run them safely)
+# -------------------------
+def add_column(table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists."""
+    columns = {c["name"] for c in inspect(db.session.connection()).get_columns(table)}
+    if column not in columns:
+        db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def create_indexes(model):
+    """
+    CREATE INDEX IF NOT EXISTS for every index declared on the model. Indexes on
+    columns a later migration adds are skipped; that migration creates them.
+    """
+    columns = {c["name"] for c in inspect(db.session.connection()).get_columns(model.__tablename__)}
+    for index in model.__table__.indexes:
+        if all(column.name in columns for column in index.columns):
+            db.session.execute(CreateIndex(index, if_not_exists=True))
+
+
+# -------------------------
+# Migrations
+# -------------------------
+def _001_accrual_columns():
+    add_column("user", "earnings_as_of", "DATETIME")
+    add_column("deposit", "accrued_interest", "FLOAT DEFAULT 0.0")
+    add_column("deposit", "accrued_at", "DATETIME")
+
+
+def _002_hot_query_indexes():
+    from .models import User, KYCLog, Deposit
+
+    for model in (User, KYCLog, Deposit):
+        create_indexes(model)
+
+
+def _003_ledger():
+    """
+    Integer micro-USDT balances, backfilled from the old float columns + opening ledger entries.
+    Every step is idempotent (SQLite commits ALTER TABLE on its own), so a failed run can be rerun.
+    """
+    add_column("user", "balance_micro", "BIGINT NOT NULL DEFAULT 0")
+    add_column("user", "total_deposits_micro", "BIGINT NOT NULL DEFAULT 0")
+    add_column("user", "total_withdrawals_micro", "BIGINT NOT NULL DEFAULT 0")
+
+    legacy = {c["name"] for c in inspect(db.session.connection()).get_columns("user")}
+    if {"balance", "total_deposits", "total_withdrawals"} <= legacy:
+        db.session.execute(text("""
+            UPDATE "user" SET
+                balance_micro = CAST(ROUND(COALESCE(balance, 0) * 1000000) AS INTEGER),
+                total_deposits_micro = CAST(ROUND(COALESCE(total_deposits, 0) * 1000000) AS INTEGER),
+                total_withdrawals_micro = CAST(ROUND(COALESCE(total_withdrawals, 0) * 1000000) AS INTEGER)
+        """))
+        # Opening entries so the ledger sum matches the migrated balances (one reference per user)
+        db.session.execute(text("""
+            INSERT INTO ledger_entry (user_id, amount_micro, kind, reference, memo, timestamp)
+            SELECT id, balance_micro, 'opening', 'migration:003:' || id, 'balance before ledger', CURRENT_TIMESTAMP
+            FROM "user" u WHERE balance_micro != 0 AND NOT EXISTS (
+                SELECT 1 FROM ledger_entry e WHERE e.kind = 'opening' AND e.reference = 'migration:003:' || u.id
+            )
+        """))
+
+
+def _004_deposit_watcher():
+    """chain_transfer / watcher_checkpoint come from create_all(); index the hash we match on."""
+    from .models import Deposit
+
+    create_indexes(Deposit)
+
+
+def _005_kyc_documents():
+    """Content-hash storage + background previews for KYC uploads."""
+    from .models import KYCLog
+
+    add_column("kyc_log", "document_hash", "VARCHAR(64)")
+    add_column("kyc_log", "preview_path", "VARCHAR(300)")
+    add_column("kyc_log", "thumbnail_path", "VARCHAR(300)")
+    create_indexes(KYCLog)
+
+
+def _006_platform_rollups():
+    """platform_stat comes from create_all(); fill it from the existing rows."""
+    from .rollups import rebuild
+
+    rebuild()
+
+
+def _007_withdrawal_unlocks():
+    """Precomputed unlock times / per-user eligibility, backfilled from the approved deposits."""
+    from .models import Deposit
+    from .unlocks import rebuild
+
+    add_column("deposit", "unlocks_at", "DATETIME")
+    add_column("deposit", "unlocked", "BOOLEAN NOT NULL DEFAULT 0")
+    add_column("user", "unlocked_micro", "BIGINT NOT NULL DEFAULT 0")
+    add_column("user", "next_unlock_at", "DATETIME")
+    create_indexes(Deposit)
+    rebuild()
+
+
+def _008_withdrawn_principal():
+    """unlocked_micro becomes what is left to withdraw: take out past withdrawals."""
+    from .unlocks import rebuild
+
+    rebuild()
+
+
+MIGRATIONS = [
+    (1, "accrual columns on user/deposit", _001_accrual_columns),
+    (2, "indexes for hot query shapes", _002_hot_query_indexes),
+    (3, "balance ledger, integer micro-USDT balances", _003_ledger),
+    (4, "deposit watcher tables and tx_hash index", _004_deposit_watcher),
+    (5, "kyc document hash and preview columns", _005_kyc_documents),
+    (6, "platform rollup counters", _006_platform_rollups),
+    (7, "deposit unlock times and per-user withdrawal eligibility", _007_withdrawal_unlocks),
+    (8, "unlocked principal net of withdrawals", _008_withdrawn_principal),
+]
+
+HEAD = MIGRATIONS[-1][0]
+
+
+# -------------------------
+# Runner
+# -------------------------
+def current_version():
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"
+    ))
+    version = db.session.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def upgrade(target=None):
+    """Create missing tables, then apply pending migrations. Returns the applied versions."""
+    target = HEAD if target is None else target
+    db.create_all()
+
+    applied = []
+    version = current_version()
+    for number, description, migrate in MIGRATIONS:
+        if version < number <= target:
+            migrate()
+            db.session.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": number})
+            db.session.commit()
+            applied.append((number, description))
+    db.session.commit()
+    return applied
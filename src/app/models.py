@@ -1,27 +1,76 @@
 # src/app/models.py
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import select, update
 from . import db, login_manager
+from .cache import identity_cache, invalidate_dashboard, invalidate_identity
+
+MICRO = 1_000_000  # micro-USDT per USDT
+
+
+class Identity(UserMixin):
+    """
+    What current_user is on most requests: the fields auth checks, from the
+    identity cache. Reading any other attribute (balance, email, ...) or
+    assigning one loads the full User row once for the request and delegates.
+    """
+    FIELDS = ("id", "username", "is_admin", "kyc_status")
+
+    def __init__(self, fields):
+        self.__dict__.update(fields, _row=None)
+
+    @property
+    def row(self):
+        if self._row is None:
+            self.__dict__["_row"] = db.session.get(User, self.id)
+        return self._row
+
+    def __getattr__(self, name):
+        return getattr(self.row, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.row, name, value)
+        if name in self.FIELDS:
+            self.__dict__[name] = value
+            invalidate_identity(self.id)
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    fields = identity_cache.get(user_id)
+    if fields is None:
+        row = db.session.execute(
+            select(*(getattr(User, name) for name in Identity.FIELDS)).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        fields = row._asdict()
+        identity_cache.set(user_id, fields)
+    return Identity(fields)
 
 
 class User(db.Model, UserMixin):
     __tablename__ = 'user'
+    __table_args__ = (
+        db.Index('ix_user_kyc_status_id', 'kyc_status', 'id'),  # admin users filtered by KYC state
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
 
-    # Financial
-    balance = db.Column(db.Float, default=0.0)
-    total_deposits = db.Column(db.Float, default=0.0)
-    total_withdrawals = db.Column(db.Float, default=0.0)
+    # Financial (integer micro-USDT, only changed through ledger.post)
+    balance_micro = db.Column(db.BigInteger, nullable=False, default=0)
+    total_deposits_micro = db.Column(db.BigInteger, nullable=False, default=0)
+    total_withdrawals_micro = db.Column(db.BigInteger, nullable=False, default=0)
     total_earnings = db.Column(db.Float, default=0.0)
+    earnings_as_of = db.Column(db.DateTime, nullable=True)  # set by the accrual job
+
+    # Withdrawal eligibility, kept up to date by unlocks.py (approvals + the unlock sweep)
+    unlocked_micro = db.Column(db.BigInteger, nullable=False, default=0)  # principal past MIN_INVEST_DAYS
+    next_unlock_at = db.Column(db.DateTime, nullable=True)                # earliest still-locked deposit
 
     # KYC
     kyc_status = db.Column(db.String(20), default='pending')
@@ -33,18 +82,50 @@ class User(db.Model, UserMixin):
     kycs = db.relationship('KYCLog', backref='user', lazy=True)
     deposits = db.relationship('Deposit', backref='user', lazy=True)
 
+    # USDT views of the integer columns, for templates and display
+    @property
+    def balance(self):
+        return (self.balance_micro or 0) / MICRO
+
+    @property
+    def total_deposits(self):
+        return (self.total_deposits_micro or 0) / MICRO
+
+    @property
+    def total_withdrawals(self):
+        return (self.total_withdrawals_micro or 0) / MICRO
+
+    @property
+    def withdrawable_micro(self):
+        """Unlocked principal not yet withdrawn, capped by what is left in the balance."""
+        return max(min(self.unlocked_micro or 0, self.balance_micro or 0), 0)
+
+    @property
+    def withdrawable_amount(self):
+        return self.withdrawable_micro / MICRO
+
     def __repr__(self):
         return f"<User {self.username} | Admin: {self.is_admin}>"
 
 
 class KYCLog(db.Model):
     __tablename__ = 'kyc_log'
+    __table_args__ = (
+        # latest KYC per user (dashboard, kyc)
+        db.Index('ix_kyc_log_user_id_id', 'user_id', 'id'),
+        # admin queue: status filter + keyset pages on (timestamp, id)
+        db.Index('ix_kyc_log_status_timestamp_id', 'status', 'timestamp', 'id'),
+        db.Index('ix_kyc_log_timestamp_id', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     full_name = db.Column(db.String(200), nullable=False)
     id_number = db.Column(db.String(100), nullable=False)
     document_path = db.Column(db.String(300))
+    document_hash = db.Column(db.String(64), index=True)     # sha256 of the stored file (uploads.py)
+    preview_path = db.Column(db.String(300))                 # downscaled JPEG, set by background processing
+    thumbnail_path = db.Column(db.String(300))
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -54,6 +135,19 @@ class KYCLog(db.Model):
 
 class Deposit(db.Model):
     __tablename__ = 'deposit'
+    __table_args__ = (
+        # can_withdraw: earliest approved deposit per user
+        db.Index('ix_deposit_user_id_status_timestamp', 'user_id', 'status', 'timestamp'),
+        # dashboard: a user's deposits, newest first
+        db.Index('ix_deposit_user_id_timestamp', 'user_id', 'timestamp'),
+        # admin queue: status filter + keyset pages on (timestamp, id)
+        db.Index('ix_deposit_status_timestamp_id', 'status', 'timestamp', 'id'),
+        db.Index('ix_deposit_timestamp_id', 'timestamp', 'id'),
+        # deposit watcher: match on-chain transfers by hash
+        db.Index('ix_deposit_tx_hash', 'tx_hash'),
+        # unlock sweep + payout planning: locked deposits by unlock time
+        db.Index('ix_deposit_unlocked_unlocks_at', 'unlocked', 'unlocks_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -67,22 +161,213 @@ class Deposit(db.Model):
 
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Interest accrued so far (written by accrual.accrue_all, never per request)
+    accrued_interest = db.Column(db.Float, default=0.0)
+    accrued_at = db.Column(db.DateTime, nullable=True)
+
+    # Set on approval (timestamp + MIN_INVEST_DAYS); `unlocked` is flipped by the unlock sweep
+    unlocks_at = db.Column(db.DateTime, nullable=True)
+    unlocked = db.Column(db.Boolean, nullable=False, default=False)
+
     def approve(self):
         """
         Admin approves deposit:
-        - Set deposit.status = approved
-        - Add to user.balance
-        - Add to user.total_deposits
+        - Set deposit.status = approved (only if it is not approved yet)
+        - Post a 'deposit' ledger entry, which adds to user balance + total deposits
+        Returns False if it was already approved; the caller owns the transaction then.
         """
-        if self.status == "approved":
+        from .ledger import post, to_micro
+        from .outbox import emit
+        from .rollups import deposits_moved
+        from .unlocks import deposits_approved
+
+        # Conditional UPDATE: two concurrent approvals cannot both win
+        old_status = self.status
+        claimed = old_status != "approved" and db.session.execute(
+            update(Deposit)
+            .where(Deposit.id == self.id, Deposit.status == old_status)
+            .values(status="approved"),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        if not claimed:
             return False  # Avoid double-crediting
 
-        self.status = "approved"
-        self.user.balance += self.amount
-        self.user.total_deposits += self.amount
+        post(self.user_id, to_micro(self.amount), "deposit", reference=f"deposit:{self.id}")
+        deposits_moved([(old_status, "approved", self.amount)])
+        deposits_approved([(self.id, self.user_id, self.amount, self.timestamp)])
+        emit("deposit.approved", deposit_id=self.id, user_id=self.user_id,
+             amount_micro=to_micro(self.amount), from_status=old_status)
 
         db.session.commit()
+        invalidate_dashboard(self.user_id)
         return True
 
     def __repr__(self):
-        return f"<Deposit User:{self.user_id} Amount:{self.amount} Status:{self.status}>"
\ No newline at end of file
+        return f"<Deposit User:{self.user_id} Amount:{self.amount} Status:{self.status}>"
+
+
+class LedgerEntry(db.Model):
+    """Append-only record of every balance change. Rows are never updated or deleted."""
+    __tablename__ = 'ledger_entry'
+    __table_args__ = (
+        # per-user history / derived balance
+        db.Index('ix_ledger_entry_user_id_id', 'user_id', 'id'),
+        # one entry per source event (e.g. deposit:12), so a retry cannot double-post
+        db.UniqueConstraint('kind', 'reference', name='uq_ledger_entry_kind_reference'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount_micro = db.Column(db.BigInteger, nullable=False)   # signed: credits > 0, debits < 0
+    kind = db.Column(db.String(20), nullable=False)           # opening, deposit, credit, debit, withdrawal(_refund)
+    reference = db.Column(db.String(100), nullable=True)
+    memo = db.Column(db.String(200), nullable=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<LedgerEntry User:{self.user_id} {self.kind} {self.amount_micro}>"
+
+
+class ChainTransfer(db.Model):
+    """Incoming transfer seen by the deposit watcher, kept until it matches a Deposit."""
+    __tablename__ = 'chain_transfer'
+    __table_args__ = (
+        db.Index('ix_chain_transfer_deposit_id', 'deposit_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(20), nullable=False)
+    tx_hash = db.Column(db.String(200), unique=True, nullable=False)
+    amount_micro = db.Column(db.BigInteger, nullable=False)
+    asset = db.Column(db.String(20), default='USDT')
+    network = db.Column(db.String(50))
+    block_time = db.Column(db.DateTime)
+    seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+    deposit_id = db.Column(db.Integer, db.ForeignKey('deposit.id'), nullable=True)  # set once matched
+
+    def __repr__(self):
+        return f"<ChainTransfer {self.tx_hash} {self.amount_micro} Deposit:{self.deposit_id}>"
+
+
+class WatcherCheckpoint(db.Model):
+    """Per-source cursor (source-specific position, e.g. last insertTime in ms)."""
+    __tablename__ = 'watcher_checkpoint'
+
+    source = db.Column(db.String(20), primary_key=True)
+    cursor = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class WithdrawalRequest(db.Model):
+    """
+    User payout request.
+    statuses: requested -> approved -> processing -> paid
+              requested -> rejected, processing -> failed (funds refunded)
+    """
+    __tablename__ = 'withdrawal_request'
+    __table_args__ = (
+        db.Index('ix_withdrawal_request_status_id', 'status', 'id'),      # payout worker queue
+        db.Index('ix_withdrawal_request_user_id_id', 'user_id', 'id'),    # user's history
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount_micro = db.Column(db.BigInteger, nullable=False)
+    address = db.Column(db.String(200), nullable=False)
+    network = db.Column(db.String(50), default='TRC20')
+    status = db.Column(db.String(20), nullable=False, default='requested')
+
+    # Sent to Binance as withdrawOrderId, so a retried payout is recognised, never paid twice
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    external_id = db.Column(db.String(100), nullable=True)   # Binance withdrawal id
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(300), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user = db.relationship('User', backref='withdrawals', lazy=True)
+    events = db.relationship('WithdrawalEvent', backref='withdrawal', lazy=True,
+                             order_by='WithdrawalEvent.id')
+
+    @property
+    def amount(self):
+        return self.amount_micro / MICRO
+
+    def __repr__(self):
+        return f"<WithdrawalRequest User:{self.user_id} Amount:{self.amount} Status:{self.status}>"
+
+
+class WithdrawalEvent(db.Model):
+    """Append-only status transition log for a WithdrawalRequest."""
+    __tablename__ = 'withdrawal_event'
+    __table_args__ = (
+        db.Index('ix_withdrawal_event_withdrawal_id', 'withdrawal_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    withdrawal_id = db.Column(db.Integer, db.ForeignKey('withdrawal_request.id'), nullable=False)
+    from_status = db.Column(db.String(20))
+    to_status = db.Column(db.String(20), nullable=False)
+    note = db.Column(db.String(300))
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PlatformStat(db.Model):
+    """Rollup counter (see rollups.py): scope is "total" or an ISO date."""
+    __tablename__ = 'platform_stat'
+
+    scope = db.Column(db.String(10), primary_key=True)
+    name = db.Column(db.String(60), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class OutboxEvent(db.Model):
+    """
+    Side effect recorded in the same transaction as the change that caused it
+    (see outbox.py). statuses: pending -> delivered, or dead after too many attempts.
+    """
+    __tablename__ = 'outbox_event'
+    __table_args__ = (
+        # worker queue: due pending events, oldest first
+        db.Index('ix_outbox_event_status_available_at_id', 'status', 'available_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic = db.Column(db.String(60), nullable=False)          # e.g. deposit.approved
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # Not picked up before this time: retry backoff, or the lease of the worker holding it
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.String(300), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxEvent {self.id} {self.topic} {self.status}>"
+
+
+class ArchivedRecord(db.Model):
+    """
+    A settled Deposit or KYCLog moved out of the hot tables by archive.py.
+    The full row is kept as zlib-compressed JSON; the columns lookups and
+    rollups need are kept beside it.
+    """
+    __tablename__ = 'archived_record'
+    __table_args__ = (
+        # admin lookup: a user's archived records, newest first
+        db.Index('ix_archived_record_kind_user_id_record_id', 'kind', 'user_id', 'record_id'),
+    )
+
+    kind = db.Column(db.String(20), primary_key=True)         # deposit, kyc_log
+    record_id = db.Column(db.Integer, primary_key=True)       # id in the hot table
+    user_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    amount = db.Column(db.Float, nullable=True)               # deposits only
+    timestamp = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<ArchivedRecord {self.kind}:{self.record_id} User:{self.user_id} {self.status}>"
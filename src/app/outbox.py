@@ -0,0 +1,199 @@
+# src/app/outbox.py
+"""
+Transactional outbox for post-commit side effects.
+
+Code that changes state calls `emit(topic, **payload)` before it commits. The
+event row is written in the same transaction, so it exists exactly when the
+change does. Nothing else happens on the request path. `flask --app run
+outbox-worker` drains the table in batches:
+
+1. claim due events with a conditional UPDATE that pushes `available_at` out
+   by a lease (OUTBOX_LEASE_SECONDS) and bumps `attempts`. If the worker dies,
+   the lease runs out and another worker picks the event up again;
+2. run every handler registered for the topic;
+3. mark the event delivered in the same transaction as any DB writes the
+   handlers made, or roll those back and schedule a retry with exponential
+   backoff (dead after OUTBOX_MAX_ATTEMPTS).
+
+Delivery is at-least-once: an external handler can see an event twice if a
+worker dies after calling it. Handlers must be idempotent; the event id is
+stable and makes a good idempotency key.
+
+Handlers are registered per topic ("deposit.approved"), per prefix
+("deposit.*") or for everything ("*"):
+
+    @outbox.handler("kyc.approved")
+    def notify_user(event):
+        ...  # event.id, event.topic, event.payload, event.attempts
+
+Topics: deposit.submitted/approved/rejected, kyc.submitted/approved/rejected,
+balance.credited/debited (admin adjustments), withdrawal.<status>.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+
+from . import db
+from .models import OutboxEvent
+from .config import (
+    OUTBOX_BATCH_SIZE, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_SECONDS,
+    OUTBOX_RETENTION_DAYS, OUTBOX_WEBHOOK_URL, OUTBOX_WEBHOOK_TIMEOUT,
+)
+
+log = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 3600
+
+
+# -------------------------
+# Emitting (inside the caller's transaction)
+# -------------------------
+def emit(topic, **payload):
+    """Queue one event; it commits or rolls back with the caller's transaction."""
+    emit_many(topic, [payload])
+
+
+def emit_many(topic, payloads):
+    """Queue one event per payload with a single multi-row INSERT."""
+    now = datetime.utcnow()
+    rows = [{"topic": topic, "payload": payload, "status": "pending", "attempts": 0,
+             "available_at": now, "created_at": now} for payload in payloads]
+    if rows:
+        db.session.execute(insert(OutboxEvent), rows)
+
+
+# -------------------------
+# Handlers
+# -------------------------
+HANDLERS = {}  # topic, "prefix.*" or "*" -> [handler(event)]
+
+
+def handler(topic):
+    """Decorator: run the function for every event matching `topic`."""
+    def register(fn):
+        HANDLERS.setdefault(topic, []).append(fn)
+        return fn
+    return register
+
+
+def handlers_for(topic):
+    prefix = topic.split(".", 1)[0]
+    return HANDLERS.get(topic, []) + HANDLERS.get(f"{prefix}.*", []) + HANDLERS.get("*", [])
+
+
+@handler("*")
+def audit_log(event):
+    """One structured log line per event: the audit trail of every state change."""
+    log.info("[OUTBOX] %s #%s %s", event.topic, event.id, event.payload)
+
+
+if OUTBOX_WEBHOOK_URL:
+    @handler("*")
+    def post_webhook(event):
+        """Forward the event to an external consumer (accounting sync, notifications)."""
+        import requests
+
+        resp = requests.post(
+            OUTBOX_WEBHOOK_URL, timeout=OUTBOX_WEBHOOK_TIMEOUT,
+            json={"id": event.id, "topic": event.topic, "payload": event.payload},
+            headers={"Idempotency-Key": f"outbox-{event.id}"},
+        )
+        resp.raise_for_status()
+
+
+# -------------------------
+# Worker
+# -------------------------
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE, lease_seconds=OUTBOX_LEASE_SECONDS):
+    """Lease up to batch_size due events to this worker; returns the claimed rows."""
+    now = datetime.utcnow()
+    ids = db.session.execute(
+        select(OutboxEvent.id)
+        .where(OutboxEvent.status == "pending", OutboxEvent.available_at <= now)
+        .order_by(OutboxEvent.available_at, OutboxEvent.id).limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        db.session.rollback()
+        return []
+
+    rows = db.session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id.in_(ids), OutboxEvent.status == "pending",
+               OutboxEvent.available_at <= now)
+        .values(available_at=now + timedelta(seconds=lease_seconds),
+                attempts=OutboxEvent.attempts + 1)
+        .returning(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.attempts),
+        execution_options={"synchronize_session": False},
+    ).all()
+    db.session.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def _finish(event, **values):
+    """Update an event we still hold (same attempt number), so an expired lease can't clobber a newer one."""
+    return db.session.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.id == event.id, OutboxEvent.status == "pending",
+               OutboxEvent.attempts == event.attempts)
+        .values(**values),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+
+
+def deliver(event, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """Run the handlers for one claimed event. Returns "delivered", "retry", "dead" or "lost"."""
+    try:
+        for fn in handlers_for(event.topic):
+            fn(event)
+        if not _finish(event, status="delivered", delivered_at=datetime.utcnow(), last_error=None):
+            db.session.rollback()  # lease expired and someone else owns it now
+            return "lost"
+        db.session.commit()
+        return "delivered"
+    except Exception as exc:
+        db.session.rollback()
+        log.warning("[OUTBOX] %s #%s attempt %s failed: %r", event.topic, event.id, event.attempts, exc)
+        error = repr(exc)[:300]
+        if event.attempts >= max_attempts:
+            _finish(event, status="dead", last_error=error)
+            result = "dead"
+        else:
+            delay = min(OUTBOX_RETRY_SECONDS * 2 ** (event.attempts - 1), MAX_BACKOFF_SECONDS)
+            _finish(event, available_at=datetime.utcnow() + timedelta(seconds=delay), last_error=error)
+            result = "retry"
+        db.session.commit()
+        return result
+
+
+def process_batch(batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """Claim and deliver one batch. Returns {"delivered": n, "retry": n, "dead": n, "lost": n}."""
+    summary = {"delivered": 0, "retry": 0, "dead": 0, "lost": 0}
+    for event in claim_batch(batch_size):
+        summary[deliver(event, max_attempts)] += 1
+    return summary
+
+
+def purge(retention_days=OUTBOX_RETENTION_DAYS):
+    """Delete delivered events older than the retention window. Returns the number removed."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    # a delivered event's available_at is (about) its delivery time, and it is indexed
+    removed = db.session.execute(
+        delete(OutboxEvent).where(OutboxEvent.status == "delivered", OutboxEvent.available_at < cutoff),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    db.session.commit()
+    return removed
+
+
+def requeue_dead(ids=None):
+    """Give dead events another round of attempts (all of them, or just `ids`)."""
+    stmt = update(OutboxEvent).where(OutboxEvent.status == "dead")
+    if ids:
+        stmt = stmt.where(OutboxEvent.id.in_(ids))
+    moved = db.session.execute(
+        stmt.values(status="pending", attempts=0, available_at=datetime.utcnow()),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    db.session.commit()
+    return moved
@@ -0,0 +1,59 @@
+# src/app/pagination.py
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are ordered newest first on (timestamp, id) and the cursor is the
+(timestamp, id) of the last row shown, so every page is an index range scan
+no matter how deep the admin scrolls.
+"""
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) or None for a missing/garbled cursor."""
+    if not cursor:
+        return None
+    try:
+        ts, row_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        return None
+
+
+def keyset_page(query, ts_col, id_col, cursor=None, limit=50):
+    """
+    Apply keyset pagination (newest first) to a query.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        query = query.filter(tuple_(ts_col, id_col) < position)
+
+    rows = query.order_by(ts_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, ts_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
+
+
+def id_page(query, id_col, after=None, limit=50):
+    """Keyset pagination on a bare integer id (ascending). Returns (rows, next_after)."""
+    if after:
+        query = query.filter(id_col > after)
+
+    rows = query.order_by(id_col.asc()).limit(limit + 1).all()
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = getattr(rows[-1], id_col.key)
+    return rows, next_after
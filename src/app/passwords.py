@@ -0,0 +1,112 @@
+# src/app/passwords.py
+"""
+Password hashing.
+
+New hashes are argon2id with the cost set in config (ARGON2_*). Hashing and
+verification run on a small per-process thread pool: argon2 releases the GIL,
+so the pool bounds how many hashes burn CPU and memory at once, and once
+PASSWORD_HASH_QUEUE callers are already waiting, new ones get HashingBusy
+(served as 503) instead of piling up behind them. The request thread waits
+for its hash (at most PASSWORD_HASH_TIMEOUT seconds, then HashingBusy too);
+a hash that outlives the wait keeps its slot until it finishes.
+
+verify_password also accepts the Werkzeug pbkdf2/scrypt hashes created before
+argon2 and reports when a stored hash should be replaced (legacy scheme or
+outdated cost), so users migrate transparently on their next login. If the
+pool is busy at that point the login still succeeds and the upgrade waits
+for a later one.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash
+
+from .config import (
+    ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE, PASSWORD_HASH_TIMEOUT,
+)
+
+log = logging.getLogger(__name__)
+
+_hasher = None
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
+
+class HashingBusy(Exception):
+    """Too many hashes already running or queued in this process."""
+
+
+def get_hasher():
+    """argon2 PasswordHasher with the configured cost (argon2 is imported on first use)."""
+    global _hasher
+    if _hasher is None:
+        from argon2 import PasswordHasher
+
+        _hasher = PasswordHasher(time_cost=ARGON2_TIME_COST, memory_cost=ARGON2_MEMORY_COST,
+                                 parallelism=ARGON2_PARALLELISM)
+    return _hasher
+
+
+def _run(fn, *args):
+    global _pool
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        if _pool is None:
+            with _pool_lock:
+                if _pool is None:
+                    _pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                               thread_name_prefix="password-hash")
+        future = _pool.submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())  # the slot is held until the hash is done
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeout:
+        raise HashingBusy() from None
+
+
+def is_argon2(stored):
+    return stored.startswith("$argon2")
+
+
+def _verify(stored, password):
+    """(matches, needs_rehash) for an argon2 or legacy Werkzeug hash."""
+    from argon2.exceptions import InvalidHashError, VerificationError
+
+    if not is_argon2(stored):
+        return check_password_hash(stored, password), True
+    hasher = get_hasher()
+    try:
+        hasher.verify(stored, password)
+    except (VerificationError, InvalidHashError):
+        return False, False
+    return True, hasher.check_needs_rehash(stored)
+
+
+# -------------------------
+# Public helpers
+# -------------------------
+def hash_password(password):
+    """argon2id hash with the configured cost. Raises HashingBusy."""
+    return _run(lambda: get_hasher().hash(password))
+
+
+def verify_password(stored, password):
+    """
+    Check a password against a stored hash. Returns (matches, new_hash), where
+    new_hash is a fresh argon2 hash to store when the old one is outdated.
+    Raises HashingBusy.
+    """
+    matches, needs_rehash = _run(_verify, stored, password)
+    if matches and needs_rehash:
+        try:
+            return True, hash_password(password)
+        except HashingBusy:
+            log.info("password rehash skipped, pool busy; upgrading on a later login")
+    return matches, None
@@ -0,0 +1,262 @@
+# src/app/payouts.py
+"""
+Withdrawal requests and the payout worker.
+
+A request debits the ledger as soon as it is made (the funds are held), an
+admin approves or rejects it, and the worker pays approved requests in
+batches:
+
+1. claim a batch with a conditional UPDATE (approved -> processing), so two
+   workers never take the same rows;
+2. call the gateway from a bounded thread pool (the Binance client's rate
+   limiter is shared by all threads);
+3. record every outcome as a status transition + WithdrawalEvent.
+
+Every request carries an idempotency key that is sent as Binance's
+withdrawOrderId. Before a request is re-sent (a retry, or a worker that died
+mid-payout) the gateway is asked whether that key was already paid, so a
+retry never pays twice. Failed requests are refunded through the ledger.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from . import db
+from .cache import invalidate_dashboard
+from .ledger import post, from_micro
+from .models import WithdrawalRequest, WithdrawalEvent
+from .outbox import emit
+from .config import (
+    PAYOUT_BATCH_SIZE, PAYOUT_CONCURRENCY, PAYOUT_MAX_ATTEMPTS, PAYOUT_STALE_MINUTES,
+)
+
+log = logging.getLogger(__name__)
+
+
+class PayoutError(Exception):
+    """Gateway refused or failed a payout. permanent=True means retrying will not help."""
+
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+# -------------------------
+# Gateways
+# -------------------------
+class BinanceGateway:
+    def withdraw(self, key, amount, address, network):
+        from binance.exceptions import BinanceAPIException
+        from .binance_utils import withdraw
+
+        try:
+            result = withdraw(amount=amount, address=address, network=network, withdraw_order_id=key)
+        except BinanceAPIException as exc:
+            # 4xx other than rate limiting = bad address/amount/permissions
+            raise PayoutError(str(exc), permanent=400 <= exc.status_code < 500
+                              and exc.status_code not in (418, 429)) from exc
+        except Exception as exc:  # timeouts, connection resets: the payout may or may not exist
+            raise PayoutError(str(exc)) from exc
+        return str(result.get("id"))
+
+    def lookup(self, key):
+        from .binance_utils import get_withdrawal
+
+        found = get_withdrawal(key)
+        return str(found["id"]) if found else None
+
+
+class FakeGateway:
+    """Local stand-in for Binance: remembers payouts by key, like withdrawOrderId does."""
+
+    def __init__(self, fail_keys=(), permanent=False):
+        self.payouts = {}
+        self.fail_keys = set(fail_keys)
+        self.permanent = permanent
+        self.calls = 0
+
+    def withdraw(self, key, amount, address, network):
+        self.calls += 1
+        if key in self.fail_keys:
+            raise PayoutError("fake failure", permanent=self.permanent)
+        return self.payouts.setdefault(key, f"fake-{len(self.payouts) + 1}")
+
+    def lookup(self, key):
+        return self.payouts.get(key)
+
+
+# -------------------------
+# Status transitions
+# -------------------------
+def _transition(request_id, from_statuses, to_status, note=None, **values):
+    """Conditionally move a request to a new status and log the event. Returns True if it moved."""
+    moved = db.session.execute(
+        update(WithdrawalRequest)
+        .where(WithdrawalRequest.id == request_id, WithdrawalRequest.status.in_(from_statuses))
+        .values(status=to_status, updated_at=datetime.utcnow(), **values)
+        .returning(WithdrawalRequest.user_id, WithdrawalRequest.amount_micro),
+        execution_options={"synchronize_session": False},
+    ).first()
+    if moved:
+        db.session.add(WithdrawalEvent(withdrawal_id=request_id, from_status="|".join(from_statuses),
+                                       to_status=to_status, note=note))
+        emit(f"withdrawal.{to_status}", withdrawal_id=request_id, user_id=moved.user_id,
+             amount_micro=moved.amount_micro, note=note)
+    return moved is not None
+
+
+def _refund(request_id, user_id, amount_micro):
+    post(user_id, amount_micro, "withdrawal_refund", reference=f"withdrawal:{request_id}")
+
+
+def request_withdrawal(user_id, amount_micro, address, network):
+    """Create a request and hold the funds. Raises ledger.InsufficientFunds."""
+    req = WithdrawalRequest(user_id=user_id, amount_micro=amount_micro, address=address,
+                            network=network, status="requested",
+                            idempotency_key=uuid.uuid4().hex)
+    db.session.add(req)
+    db.session.flush()
+    post(user_id, -amount_micro, "withdrawal", reference=f"withdrawal:{req.id}")
+    db.session.add(WithdrawalEvent(withdrawal_id=req.id, to_status="requested"))
+    emit("withdrawal.requested", withdrawal_id=req.id, user_id=user_id, amount_micro=amount_micro)
+    db.session.commit()
+    invalidate_dashboard(user_id)
+    return req
+
+
+def approve_withdrawal(request_id, note=None):
+    moved = _transition(request_id, ("requested",), "approved", note)
+    db.session.commit()
+    return moved
+
+
+def reject_withdrawal(request_id, note=None):
+    req = db.session.get(WithdrawalRequest, request_id)
+    if req is None or not _transition(request_id, ("requested",), "rejected", note):
+        db.session.rollback()
+        return False
+    _refund(req.id, req.user_id, req.amount_micro)
+    db.session.commit()
+    invalidate_dashboard(req.user_id)
+    return True
+
+
+# -------------------------
+# Worker
+# -------------------------
+def claim_batch(batch_size=PAYOUT_BATCH_SIZE):
+    """approved -> processing for up to batch_size requests; returns the claimed rows."""
+    ids = db.session.execute(
+        select(WithdrawalRequest.id).where(WithdrawalRequest.status == "approved")
+        .order_by(WithdrawalRequest.id).limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return []
+
+    rows = db.session.execute(
+        update(WithdrawalRequest)
+        .where(WithdrawalRequest.id.in_(ids), WithdrawalRequest.status == "approved")
+        .values(status="processing", attempts=WithdrawalRequest.attempts + 1,
+                updated_at=datetime.utcnow())
+        .returning(WithdrawalRequest.id, WithdrawalRequest.user_id, WithdrawalRequest.amount_micro,
+                   WithdrawalRequest.address, WithdrawalRequest.network,
+                   WithdrawalRequest.idempotency_key, WithdrawalRequest.attempts),
+        execution_options={"synchronize_session": False},
+    ).all()
+    db.session.add_all(WithdrawalEvent(withdrawal_id=row.id, from_status="approved",
+                                       to_status="processing", note=f"attempt {row.attempts}")
+                       for row in rows)
+    db.session.commit()
+    return rows
+
+
+def _pay(gateway, row):
+    """Runs on a pool thread: gateway calls only, no DB access."""
+    try:
+        if row.attempts > 1:
+            existing = gateway.lookup(row.idempotency_key)
+            if existing:
+                return row, existing, None
+        return row, gateway.withdraw(row.idempotency_key, from_micro(row.amount_micro),
+                                     row.address, row.network), None
+    except PayoutError as exc:
+        return row, None, exc
+    except Exception as exc:  # e.g. the lookup itself failed: treat as transient
+        return row, None, PayoutError(str(exc))
+
+
+def _settle(gateway, row, external_id, error, max_attempts):
+    """
+    Record one payout outcome. Every transition is conditional on the row
+    still being in processing; if recover_stale or another worker moved it
+    first, nothing is written (and nothing refunded) and this returns "skipped".
+    """
+    if error is None:
+        moved = _transition(row.id, ("processing",), "paid", external_id=external_id)
+        return "paid" if moved else "skipped"
+    if not error.permanent and row.attempts < max_attempts:
+        moved = _transition(row.id, ("processing",), "approved", note=str(error)[:300],
+                            last_error=str(error)[:300])
+        return "retry" if moved else "skipped"
+    if not error.permanent:
+        # A timeout may hide a payout that went through: never refund before asking the gateway
+        try:
+            existing = gateway.lookup(row.idempotency_key)
+        except Exception as exc:
+            log.warning("[PAYOUT] lookup for request %s failed, left for recovery: %s", row.id, exc)
+            return "retry"  # stays in processing; recover_stale reconciles it later
+        if existing:
+            moved = _transition(row.id, ("processing",), "paid", "found on reconcile", external_id=existing)
+            return "paid" if moved else "skipped"
+    if not _transition(row.id, ("processing",), "failed", note=str(error)[:300], last_error=str(error)[:300]):
+        return "skipped"
+    _refund(row.id, row.user_id, row.amount_micro)
+    return "failed"
+
+
+def recover_stale(gateway, stale_minutes=PAYOUT_STALE_MINUTES):
+    """Requests stuck in processing (worker died): paid if the gateway knows the key, else retried."""
+    cutoff = datetime.utcnow() - timedelta(minutes=stale_minutes)
+    stale = WithdrawalRequest.query.filter(WithdrawalRequest.status == "processing",
+                                           WithdrawalRequest.updated_at < cutoff).all()
+    recovered = 0
+    for req in stale:
+        try:
+            existing = gateway.lookup(req.idempotency_key)
+        except Exception as exc:  # leave this one for the next sweep
+            log.warning("[PAYOUT] lookup for stale request %s failed: %s", req.id, exc)
+            continue
+        if existing:
+            _transition(req.id, ("processing",), "paid", "recovered", external_id=existing)
+        else:
+            _transition(req.id, ("processing",), "approved", "stale, requeued")
+        recovered += 1
+    db.session.commit()
+    return recovered
+
+
+def process_batch(gateway, batch_size=PAYOUT_BATCH_SIZE, concurrency=PAYOUT_CONCURRENCY,
+                  max_attempts=PAYOUT_MAX_ATTEMPTS):
+    """Claim and pay one batch. Returns {"paid": n, "retry": n, "failed": n, "skipped": n}."""
+    rows = claim_batch(batch_size)
+    summary = {"paid": 0, "retry": 0, "failed": 0, "skipped": 0}
+    if not rows:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda row: _pay(gateway, row), rows))
+
+    refunded = set()
+    for row, external_id, error in outcomes:
+        result = _settle(gateway, row, external_id, error, max_attempts)
+        summary[result] += 1
+        if result == "failed":
+            refunded.add(row.user_id)
+    db.session.commit()
+
+    for user_id in refunded:
+        invalidate_dashboard(user_id)
+    return summary
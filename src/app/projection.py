@@ -0,0 +1,186 @@
+# src/app/projection.py
+"""
+Liability projection and solvency check.
+
+Loads every approved deposit once into two columnar arrays (amount, whole
+days since the deposit) and projects, week by week over a horizon and for
+several weekly rates, what the platform owes:
+
+- liability:  principal + compounded interest on all approved deposits
+- unlocked:   the part of it on deposits past MIN_INVEST_DAYS (withdrawable)
+- interest / unlocked principal broken out separately
+
+The interest formula is the one the accrual job uses,
+amount * ((1 + r) ** (days / 7) - 1). Today's value of a deposit is what
+has accrued so far, at WEEKLY_INTEREST_RATE. A scenario rate only applies
+from now on: k weeks ahead the value is today's times (1 + rate) ** k. So
+one vectorized pass computes today's values. Bucketing them by unlock week
+(np.bincount) then gives every week of the horizon from a cumulative sum,
+with no deposits x weeks matrix.
+
+Withdrawals come out of unlocked principal (see unlocks.py), so everything
+requested and not refunded is subtracted from the liability and from the
+unlocked part. Requests not paid yet are still owed, though, and the money
+is still in the treasury. They are therefore subtracted from the treasury as
+well: `treasury.available` is the balance less those held requests. The
+withdrawn principal stops growing, while its deposit keeps compounding in
+the arrays. That overstates interest slightly, which errs on the safe side.
+
+The result is compared with the Binance USDT balance (cached for
+BINANCE_CACHE_TTL): `first_shortfall_week` is the first week in which
+unlocked liabilities exceed the available treasury.
+
+    flask --app run liability-report --weeks 52 --rate 0.02 --rate 0.03
+    /admin/liabilities?weeks=26&rate=0.015
+"""
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import String, func, select, type_coerce
+
+from . import db
+from .cache import TTLCache
+from .ledger import from_micro
+from .models import Deposit, WithdrawalRequest
+from .config import (
+    WEEKLY_INTEREST_RATE, MIN_INVEST_DAYS, PROJECTION_WEEKS, PROJECTION_RATES,
+    PROJECTION_BATCH_SIZE, PROJECTION_CACHE_TTL,
+)
+
+_reports = TTLCache(maxsize=32, ttl=PROJECTION_CACHE_TTL)
+
+
+# -------------------------
+# Loading
+# -------------------------
+def load_deposits(now=None, batch_size=PROJECTION_BATCH_SIZE):
+    """
+    (amounts, days) float64/int64 arrays for all approved deposits. One
+    streamed query, converted to arrays batch_size rows at a time.
+    """
+    now = np.datetime64(now or datetime.utcnow(), "us")
+    amounts, days = [], []
+    result = db.session.execute(
+        select(Deposit.amount, type_coerce(Deposit.timestamp, String))  # numpy parses the raw value
+        .where(Deposit.status == "approved")
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        batch_amounts, timestamps = zip(*rows)
+        stamps = np.array([ts or now for ts in timestamps], dtype="datetime64[us]")
+        amounts.append(np.array(batch_amounts, dtype=np.float64))
+        days.append(np.maximum((now - stamps) // np.timedelta64(1, "D"), 0))
+    db.session.rollback()  # end the read transaction
+    if not amounts:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    return np.concatenate(amounts), np.concatenate(days).astype(np.int64)
+
+
+HELD = ("requested", "approved", "processing")
+
+
+def load_withdrawals():
+    """(withdrawn, held) in USDT: every request not refunded, and those of them not paid yet."""
+    rows = dict(db.session.execute(
+        select(WithdrawalRequest.status, func.coalesce(func.sum(WithdrawalRequest.amount_micro), 0))
+        .where(WithdrawalRequest.status.in_(HELD + ("paid",)))
+        .group_by(WithdrawalRequest.status)
+    ).all())
+    db.session.rollback()
+    held = sum(rows.get(status, 0) for status in HELD)
+    return from_micro(held + rows.get("paid", 0)), from_micro(held)
+
+
+# -------------------------
+# Projection (pure numpy)
+# -------------------------
+def project(amounts, days, weeks=PROJECTION_WEEKS, rate=WEEKLY_INTEREST_RATE,
+            min_invest_days=MIN_INVEST_DAYS, withdrawn=0.0, accrued_rate=WEEKLY_INTEREST_RATE):
+    """
+    Week-by-week obligations for k = 0..weeks (k = 0 is today), with interest
+    accrued so far at `accrued_rate` and future weeks at `rate`, less the
+    principal already withdrawn. Returns a dict of float64 arrays of length
+    weeks + 1, in USDT.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    days = np.asarray(days, dtype=np.int64)
+    growth = (1 + rate) ** np.arange(weeks + 1)
+
+    # Value of each deposit today (principal + interest), as in accrual.compute_interest
+    value = amounts * np.exp(days / 7 * np.log1p(accrued_rate))
+
+    # Week in which each deposit unlocks (0 = already unlocked); later than the horizon -> dropped
+    unlock_week = np.maximum(-((days - min_invest_days) // 7), 0)
+    in_horizon = unlock_week <= weeks
+    unlocked_value = np.cumsum(np.bincount(unlock_week[in_horizon], weights=value[in_horizon],
+                                           minlength=weeks + 1))
+    unlocked_principal = np.cumsum(np.bincount(unlock_week[in_horizon], weights=amounts[in_horizon],
+                                               minlength=weeks + 1))
+
+    liability = growth * value.sum() - withdrawn
+    unlocked = growth * unlocked_value - withdrawn
+    unlocked_principal = unlocked_principal - withdrawn
+    return {
+        "liability": liability,
+        "interest": liability - (amounts.sum() - withdrawn),
+        "unlocked": unlocked,
+        "unlocked_principal": unlocked_principal,
+        "unlocked_interest": unlocked - unlocked_principal,
+    }
+
+
+# -------------------------
+# Report
+# -------------------------
+def treasury_balance():
+    """(balance, error): the cached Binance USDT balance, or None and the reason it is missing."""
+    from .binance_utils import get_balance
+
+    try:
+        return get_balance("USDT"), None
+    except Exception as exc:  # no keys, network, rate limit: still show the projection
+        return None, str(exc)[:200]
+
+
+def report(weeks=PROJECTION_WEEKS, rates=PROJECTION_RATES, now=None, treasury=None, use_cache=True):
+    """
+    Projection for every rate plus the solvency comparison, as plain data.
+    Results are cached for PROJECTION_CACHE_TTL seconds per (weeks, rates).
+    """
+    key = (weeks, tuple(rates), treasury)
+    cacheable = use_cache and now is None
+    cached = _reports.get(key) if cacheable else None
+    if cached is not None:
+        return cached
+
+    now = now or datetime.utcnow()
+    amounts, days = load_deposits(now)
+    withdrawn, held = load_withdrawals()
+    error = None
+    if treasury is None:
+        treasury, error = treasury_balance()
+    available = treasury - held if treasury is not None else None
+
+    scenarios = []
+    for rate in rates:
+        weekly = project(amounts, days, weeks, rate, withdrawn=withdrawn)
+        shortfall = np.nonzero(weekly["unlocked"] > available)[0] if available is not None else []
+        scenarios.append({
+            "rate": rate,
+            "first_shortfall_week": int(shortfall[0]) if len(shortfall) else None,
+            "weeks": {name: np.round(values, 2).tolist() for name, values in weekly.items()},
+        })
+
+    result = {
+        "as_of": now,
+        "deposits": int(amounts.size),
+        "principal": round(float(amounts.sum()), 2),
+        "withdrawals": {"withdrawn": round(withdrawn, 2), "held": round(held, 2)},
+        "horizon_weeks": weeks,
+        "min_invest_days": MIN_INVEST_DAYS,
+        "treasury": {"balance": treasury, "available": available, "error": error},
+        "scenarios": scenarios,
+    }
+    if cacheable:
+        _reports.set(key, result)
+    return result
@@ -0,0 +1,78 @@
+# src/app/qr.py
+"""
+Content-addressed QR code cache.
+
+A deposit QR only depends on the wallet address, network and size, so each
+combination is encoded once, kept in memory and on disk as <sha256>.png, and
+served with immutable cache headers. A new address gives a new hash, which is
+the only time a new image gets generated.
+"""
+import hashlib
+import io
+import os
+import re
+import threading
+
+QR_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'qr')
+
+_images = {}          # digest -> PNG bytes
+_lock = threading.Lock()
+_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def qr_digest(address, network, size=10):
+    """Stable content hash for an (address, network, size) key."""
+    return hashlib.sha256(f"{address}|{network}|{size}".encode()).hexdigest()
+
+
+def _encode(address, size):
+    import qrcode  # PIL-backed, only loaded when an image actually has to be built
+
+    buf = io.BytesIO()
+    qrcode.make(address, box_size=size).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def get_qr(address, network, size=10):
+    """Return the digest for this key, generating and storing the PNG on first use."""
+    digest = qr_digest(address, network, size)
+    if digest in _images:
+        return digest
+
+    with _lock:
+        if digest in _images:
+            return digest
+
+        path = os.path.join(QR_FOLDER, f"{digest}.png")
+        if os.path.exists(path):
+            with open(path, "rb") as fh:
+                png = fh.read()
+        else:
+            png = _encode(address, size)
+            os.makedirs(QR_FOLDER, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                fh.write(png)
+            os.replace(tmp_path, path)  # atomic, so concurrent workers never see half a file
+
+        _images[digest] = png
+    return digest
+
+
+def load_qr(digest):
+    """PNG bytes for a digest, from memory or disk. None if unknown."""
+    if not _DIGEST_RE.fullmatch(digest):
+        return None
+
+    png = _images.get(digest)
+    if png is not None:
+        return png
+
+    path = os.path.join(QR_FOLDER, f"{digest}.png")
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as fh:
+        png = fh.read()
+    with _lock:
+        _images[digest] = png
+    return png
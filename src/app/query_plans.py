@@ -0,0 +1,79 @@
+# src/app/query_plans.py
+"""
+EXPLAIN QUERY PLAN check for the hot query shapes.
+
+Each entry mirrors a query a route runs on every request. `flask
+check-query-plans` and tests/test_query_plans.py fail if SQLite would answer
+any of them with a full table scan, i.e. an index went missing or a query
+stopped matching one.
+"""
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from . import db
+from .models import User, KYCLog, Deposit, ArchivedRecord
+
+
+def hot_queries():
+    """(name, SQLAlchemy query) pairs, built with representative parameters."""
+    cursor = (datetime(2025, 1, 1), 1)
+    return [
+        ("unlock sweep: deposits past their unlock time",
+         Deposit.query.filter(Deposit.unlocked.is_(False), Deposit.unlocks_at <= cursor[0])
+                      .order_by(Deposit.unlocks_at).limit(1000)),
+        ("payout planning: unlocks in a date range",
+         Deposit.query.filter(Deposit.unlocked.is_(False), Deposit.unlocks_at >= cursor[0],
+                              Deposit.unlocks_at < datetime(2025, 1, 8))),
+        ("archive: rejected deposits past the cutoff",
+         Deposit.query.filter(Deposit.status == "rejected", Deposit.timestamp < cursor[0])
+                      .order_by(Deposit.timestamp, Deposit.id).limit(1000)),
+        ("dashboard: user's deposits",
+         Deposit.query.filter_by(user_id=1).order_by(Deposit.timestamp.desc())),
+        ("dashboard/kyc: latest KYC",
+         KYCLog.query.filter_by(user_id=1).order_by(KYCLog.id.desc()).limit(1)),
+        ("admin: pending deposits page",
+         Deposit.query.filter(Deposit.status == "pending",
+                              tuple_(Deposit.timestamp, Deposit.id) < cursor)
+                      .order_by(Deposit.timestamp.desc(), Deposit.id.desc()).limit(51)),
+        ("admin: pending KYC page",
+         KYCLog.query.filter(KYCLog.status == "pending",
+                             tuple_(KYCLog.timestamp, KYCLog.id) < cursor)
+                     .order_by(KYCLog.timestamp.desc(), KYCLog.id.desc()).limit(51)),
+        ("admin: user's deposits",
+         Deposit.query.filter(Deposit.user_id == 1)
+                      .order_by(Deposit.timestamp.desc(), Deposit.id.desc()).limit(51)),
+        ("admin: user's archived KYC logs",
+         ArchivedRecord.query.filter_by(kind="kyc_log", user_id=1)
+                             .order_by(ArchivedRecord.record_id.desc()).limit(51)),
+        ("login: user by email",
+         User.query.filter_by(email="user@example.com").limit(1)),
+        ("admin: users by KYC status",
+         User.query.filter(User.kyc_status == "pending").order_by(User.id).limit(51)),
+    ]
+
+
+def explain(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query."""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = tuple(
+        value.isoformat(" ") if isinstance(value, datetime) else value
+        for value in (compiled.params[name] for name in compiled.positiontup)
+    )
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
+
+
+def is_full_scan(detail):
+    # "SCAN deposit" (or "SCAN TABLE deposit" on older SQLite) without an index
+    return detail.startswith("SCAN ") and "USING" not in detail
+
+
+def check_query_plans():
+    """Return [(name, plan, ok)] for every hot query."""
+    results = []
+    for name, query in hot_queries():
+        plan = explain(query)
+        results.append((name, plan, not any(is_full_scan(d) for d in plan)))
+    return results
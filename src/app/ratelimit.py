@@ -0,0 +1,355 @@
+# src/app/ratelimit.py
+"""
+Token-bucket rate limiting and load shedding for the main blueprint.
+
+Every request to a `main.*` endpoint, before any DB or hashing work:
+
+1. is shed with 503 if it waited in the proxy queue longer than
+   RATE_LIMIT_MAX_QUEUE_MS (from the X-Request-Start header, when a proxy
+   sets one);
+2. spends `cost` tokens from its client IP's bucket and, when the session
+   cookie names a user, from that user's bucket. Both are checked together
+   and charged only if both have enough; otherwise 429 with Retry-After.
+   Costs are per endpoint (RATE_LIMIT_COSTS): hashing, uploads and QR
+   rendering cost more than a dashboard view;
+3. takes an in-flight slot. Once RATE_LIMIT_MAX_INFLIGHT requests are
+   running across all workers it answers 503. Expensive endpoints (cost > 1)
+   get only RATE_LIMIT_MAX_INFLIGHT_EXPENSIVE slots, so a login burst cannot
+   occupy every worker and starve the dashboard.
+
+Buckets and slots live in a store shared by the workers:
+
+- SQLiteStore: a separate small SQLite file, by default in /dev/shm (RAM).
+  All workers on a host share it. Each check is a single upsert statement;
+- RedisStore: every host shares it, and each check is one Lua script call;
+- MemoryStore: per worker (tests, single-process runs).
+
+None of them touches the application database, and the user id comes from
+the session cookie, so the allow path costs no DB round-trip. If the store
+fails, requests are let through (fail open).
+
+The client IP is the socket address unless RATE_LIMIT_PROXY_HOPS is set to
+the number of proxies in front of the app (Render or nginx: 1); then it is
+that many entries from the right of X-Forwarded-For. The header is not
+trusted by default: without a proxy that overwrites it, any client could
+pick its own bucket. Behind a proxy with the default 0, everyone shares the
+proxy's address.
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import g, request, session
+
+from .metrics import RATE_LIMITED
+from .config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_STORAGE, RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_RATE,
+    RATE_LIMIT_USER_BURST, RATE_LIMIT_USER_RATE, RATE_LIMIT_COSTS, RATE_LIMIT_MAX_INFLIGHT,
+    RATE_LIMIT_MAX_INFLIGHT_EXPENSIVE, RATE_LIMIT_MAX_QUEUE_MS, RATE_LIMIT_PROXY_HOPS,
+)
+
+log = logging.getLogger(__name__)
+
+SLOT_TTL = 120  # seconds; a slot not released by then (killed worker) no longer counts
+
+
+def parse_costs(spec):
+    """"main.login:POST=10,main.deposit=3" -> {("main.login", "POST"): 10, ("main.deposit", None): 3}"""
+    costs = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        target, cost = item.split("=")
+        endpoint, _, method = target.partition(":")
+        costs[(endpoint, method.upper() or None)] = float(cost)
+    return costs
+
+
+# -------------------------
+# Stores
+# -------------------------
+class MemoryStore:
+    """Per-process buckets and slots."""
+
+    def __init__(self, maxsize=100_000):
+        self._buckets = OrderedDict()
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+
+    def take(self, buckets, cost, now):
+        """
+        Spend `cost` tokens from every (key, capacity, rate) bucket, or from
+        none if any of them is short. Returns (refused key or None, seconds to wait).
+        """
+        with self._lock:
+            levels = {}
+            for key, capacity, rate in buckets:
+                tokens, updated = self._buckets.pop(key, (capacity, now))
+                levels[key] = min(capacity, tokens + (now - updated) * rate)
+            refused, wait = _shortfall(buckets, levels, cost)
+            for key, _, _ in buckets:
+                self._buckets[key] = (levels[key] - (0 if refused else cost), now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return refused, wait
+
+    def acquire(self, pool, limit, now):
+        """Take an in-flight slot from `pool` unless `limit` are taken. Returns a token or None."""
+        with self._lock:
+            slots = self._slots.setdefault(pool, {})
+            for token in [t for t, started in slots.items() if started < now - SLOT_TTL]:
+                del slots[token]
+            if len(slots) >= limit:
+                return None
+            token = uuid.uuid4().hex
+            slots[token] = now
+            return token
+
+    def release(self, pool, token):
+        with self._lock:
+            self._slots.get(pool, {}).pop(token, None)
+
+
+class SQLiteStore:
+    """Buckets and slots in a side SQLite file shared by every worker on the host."""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS token_bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL,"
+        " updated REAL NOT NULL) WITHOUT ROWID",
+        "CREATE TABLE IF NOT EXISTS slot (pool TEXT NOT NULL, token TEXT NOT NULL,"
+        " started REAL NOT NULL, PRIMARY KEY (pool, token)) WITHOUT ROWID",
+    )
+    # Refill every bucket, charge all of them if all have `cost` tokens, and
+    # return the levels before the charge, in one statement (one write lock).
+    TAKE = """
+        WITH req (key, capacity, rate) AS (VALUES {values}),
+        level AS MATERIALIZED (
+            SELECT req.key, min(req.capacity, coalesce(b.tokens + (:now - b.updated) * req.rate,
+                                                       req.capacity)) AS tokens
+            FROM req LEFT JOIN token_bucket b ON b.key = req.key
+        ),
+        ok AS MATERIALIZED (SELECT min(tokens >= :cost) AS ok FROM level)
+        INSERT INTO token_bucket (key, tokens, updated)
+        SELECT key, tokens - :cost * (SELECT ok FROM ok), :now FROM level WHERE true
+        ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+        RETURNING key, tokens + :cost * (SELECT ok FROM ok)
+    """
+    ACQUIRE = """
+        INSERT INTO slot (pool, token, started)
+        SELECT :pool, :token, :now
+        WHERE (SELECT count(*) FROM slot WHERE pool = :pool AND started > :stale) < :limit
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():  # never reuse a connection across fork
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # counters only: losing them on a crash is fine
+            for ddl in self.SCHEMA:
+                conn.execute(ddl)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def take(self, buckets, cost, now):
+        params = {"now": now, "cost": cost}
+        for i, (key, capacity, rate) in enumerate(buckets):
+            params.update({f"k{i}": key, f"c{i}": capacity, f"r{i}": rate})
+        values = ", ".join(f"(:k{i}, :c{i}, :r{i})" for i in range(len(buckets)))
+        levels = dict(self._conn().execute(self.TAKE.format(values=values), params).fetchall())
+        return _shortfall(buckets, levels, cost)
+
+    def acquire(self, pool, limit, now):
+        conn = self._conn()
+        if random.random() < 0.01:  # occasional cleanup of slots left by killed workers
+            conn.execute("DELETE FROM slot WHERE started <= ?", (now - SLOT_TTL,))
+            conn.execute("DELETE FROM token_bucket WHERE updated <= ?", (now - 3600,))
+        token = uuid.uuid4().hex
+        inserted = conn.execute(self.ACQUIRE, {"pool": pool, "token": token, "now": now,
+                                               "stale": now - SLOT_TTL, "limit": limit}).rowcount
+        return token if inserted else None
+
+    def release(self, pool, token):
+        self._conn().execute("DELETE FROM slot WHERE pool = ? AND token = ?", (pool, token))
+
+
+class RedisStore:
+    """Buckets and slots in Redis (needs the `redis` package), shared by every host."""
+
+    # ARGV: cost, now, then capacity and rate per key. Charges every key or none.
+    TAKE = """
+        local cost, now = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local levels, ok = {}, 1
+        for i, key in ipairs(KEYS) do
+            local cap, rate = tonumber(ARGV[1 + 2 * i]), tonumber(ARGV[2 + 2 * i])
+            local state = redis.call('HMGET', key, 't', 'u')
+            local tokens = tonumber(state[1]) or cap
+            local updated = tonumber(state[2]) or now
+            levels[i] = math.min(cap, tokens + (now - updated) * rate)
+            if levels[i] < cost then ok = 0 end
+        end
+        for i, key in ipairs(KEYS) do
+            local cap, rate = tonumber(ARGV[1 + 2 * i]), tonumber(ARGV[2 + 2 * i])
+            redis.call('HSET', key, 't', tostring(levels[i] - cost * ok), 'u', tostring(now))
+            redis.call('EXPIRE', key, math.ceil(cap / rate) + 1)
+            levels[i] = tostring(levels[i])
+        end
+        return levels
+    """
+    ACQUIRE = """
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+        if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then return 0 end
+        redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+        return 1
+    """
+
+    def __init__(self, url, prefix="ratelimit"):
+        import redis  # optional dependency, only needed when a Redis store is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(self.TAKE)
+        self._acquire = self.client.register_script(self.ACQUIRE)
+
+    def take(self, buckets, cost, now):
+        args = [cost, now]
+        for _, capacity, rate in buckets:
+            args += [capacity, rate]
+        levels = self._take(keys=[f"{self.prefix}:b:{key}" for key, _, _ in buckets], args=args)
+        return _shortfall(buckets, {key: float(level) for (key, _, _), level in zip(buckets, levels)}, cost)
+
+    def acquire(self, pool, limit, now):
+        token = uuid.uuid4().hex
+        ok = self._acquire(keys=[f"{self.prefix}:s:{pool}"], args=[now - SLOT_TTL, limit, now, token])
+        return token if ok else None
+
+    def release(self, pool, token):
+        self.client.zrem(f"{self.prefix}:s:{pool}", token)
+
+
+def _shortfall(buckets, levels, cost):
+    """(first bucket without `cost` tokens, seconds until all have them), or (None, 0)."""
+    short = [(key, (cost - levels[key]) / rate) for key, _, rate in buckets if levels[key] < cost]
+    if not short:
+        return None, 0.0
+    return short[0][0], max(wait for _, wait in short)
+
+
+def make_store(url):
+    if url == "memory":
+        return MemoryStore()
+    if url.startswith("redis"):
+        return RedisStore(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unknown RATE_LIMIT_STORAGE: {url}")
+
+
+# -------------------------
+# Limiter
+# -------------------------
+class Limiter:
+    def __init__(self, store, costs=None, ip_burst=RATE_LIMIT_IP_BURST, ip_rate=RATE_LIMIT_IP_RATE,
+                 user_burst=RATE_LIMIT_USER_BURST, user_rate=RATE_LIMIT_USER_RATE,
+                 max_inflight=RATE_LIMIT_MAX_INFLIGHT,
+                 max_inflight_expensive=RATE_LIMIT_MAX_INFLIGHT_EXPENSIVE,
+                 max_queue_ms=RATE_LIMIT_MAX_QUEUE_MS, proxy_hops=RATE_LIMIT_PROXY_HOPS):
+        self.store = store
+        self.costs = parse_costs(RATE_LIMIT_COSTS) if costs is None else costs
+        self.ip = (ip_burst, ip_rate)
+        self.user = (user_burst, user_rate)
+        self.max_inflight = max_inflight
+        self.max_inflight_expensive = max_inflight_expensive
+        self.max_queue_ms = max_queue_ms
+        self.proxy_hops = proxy_hops
+        self._warned = False
+
+    def cost(self, endpoint, method):
+        return self.costs.get((endpoint, method), self.costs.get((endpoint, None), 1.0))
+
+    def client_ip(self):
+        forwarded = [ip.strip() for ip in request.headers.get("X-Forwarded-For", "").split(",") if ip.strip()]
+        if self.proxy_hops and len(forwarded) >= self.proxy_hops:
+            return forwarded[-self.proxy_hops]
+        if forwarded and not self.proxy_hops and not self._warned:
+            self._warned = True
+            log.warning("[RATELIMIT] X-Forwarded-For is set but ignored (RATE_LIMIT_PROXY_HOPS=0). Behind "
+                        "a proxy every client shares its IP bucket: set RATE_LIMIT_PROXY_HOPS to the "
+                        "number of proxies.")
+        return request.remote_addr or "unknown"
+
+    def queued_ms(self, now):
+        """Time since the proxy accepted the request (X-Request-Start: t=<s|ms|us>), or None."""
+        raw = request.headers.get("X-Request-Start", "").removeprefix("t=")
+        try:
+            started = float(raw)
+        except ValueError:
+            return None
+        while started > 1e11:  # ms or us since the epoch
+            started /= 1000
+        return (now - started) * 1000
+
+    def _refuse(self, status, reason, retry_after):
+        RATE_LIMITED.inc(endpoint=request.endpoint or "unmatched", reason=reason)
+        message = "Too many requests" if status == 429 else "The server is busy"
+        return (f"{message}, please retry in {retry_after} s.\n", status,
+                {"Retry-After": str(retry_after), "Content-Type": "text/plain; charset=utf-8"})
+
+    def check(self):
+        """before_request hook: None to continue, or a 429/503 response."""
+        now = time.time()
+        if self.max_queue_ms:
+            queued = self.queued_ms(now)
+            if queued is not None and queued > self.max_queue_ms:
+                return self._refuse(503, "queue", 1)
+
+        cost = self.cost(request.endpoint, request.method)
+        try:
+            buckets = [(f"ip:{self.client_ip()}", *self.ip)]
+            user_id = session.get("_user_id")  # from the signed cookie, no user lookup
+            if user_id:
+                buckets.append((f"user:{user_id}", *self.user))
+            refused, wait = self.store.take(buckets, cost, now)
+            if refused:
+                return self._refuse(429, refused.split(":")[0], max(1, int(wait + 0.999)))
+
+            pools = [("all", self.max_inflight)]
+            if cost > 1:
+                pools.append(("expensive", self.max_inflight_expensive))
+            g.ratelimit_slots = []
+            for pool, limit in pools:
+                token = self.store.acquire(pool, limit, now)
+                if token is None:
+                    self.release()
+                    return self._refuse(503, f"inflight_{pool}", 1)
+                g.ratelimit_slots.append((pool, token))
+        except Exception:  # store unavailable: never take the site down with it
+            log.exception("[RATELIMIT] store error, letting the request through")
+            return None
+        return None
+
+    def release(self, exc=None):
+        """teardown_request hook: give back this request's in-flight slots."""
+        for pool, token in g.pop("ratelimit_slots", []):
+            try:
+                self.store.release(pool, token)
+            except Exception:
+                log.exception("[RATELIMIT] could not release slot")
+
+
+def init_rate_limits(blueprint, limiter=None):
+    """Register the limiter on a blueprint (every request to its endpoints goes through it)."""
+    if not RATE_LIMIT_ENABLED and limiter is None:
+        return None
+    limiter = limiter or Limiter(make_store(RATE_LIMIT_STORAGE))
+    blueprint.before_request(limiter.check)
+    blueprint.teardown_request(limiter.release)
+    return limiter
@@ -0,0 +1,213 @@
+# src/app/rollups.py
+"""
+Incrementally maintained platform aggregates for the admin KPIs.
+
+`platform_stat` holds one row per (scope, name) counter. scope is "total"
+for platform-wide figures or an ISO date for per-day flows. Code paths that
+change a status or a balance call one of the helpers below inside their own
+transaction. The counters therefore commit or roll back with the change, and
+reading them costs one small indexed query however large the tables grow.
+
+Counters (all amounts in micro-USDT):
+    deposits.<status>.count / .amount_micro      total
+    kyc_logs.<status>.count                      total
+    users.count, users.kyc.<status>.count        total
+    users.balance_micro / deposits_micro / withdrawals_micro   total
+    interest.accrued_micro                       total (set by the accrual job)
+    deposits.created.count / .amount_micro       per day (submission day)
+    deposits.credited.count / .amount_micro      per day (approval day)
+
+`flask --app run rollups-rebuild` recomputes everything from the tables.
+Counters are lifetime totals, so rows moved to archived_record (archive.py)
+still count.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from . import db
+from .models import PlatformStat, User, KYCLog, Deposit, LedgerEntry, ArchivedRecord
+
+TOTAL = "total"
+
+
+def _micro(amount):
+    from .ledger import to_micro
+
+    return to_micro(amount)
+
+
+def _upsert():
+    """INSERT ... ON CONFLICT for the configured database (SQLite or PostgreSQL)."""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(PlatformStat)
+
+
+# -------------------------
+# Writing
+# -------------------------
+def bump(changes, scope=TOTAL):
+    """Add each delta in {name: delta} to its counter (in the caller's transaction)."""
+    rows = [{"scope": scope, "name": name, "value": int(delta)}
+            for name, delta in changes.items() if delta]
+    if not rows:
+        return
+    stmt = _upsert()
+    db.session.execute(
+        stmt.on_conflict_do_update(index_elements=["scope", "name"],
+                                   set_={"value": PlatformStat.value + stmt.excluded.value}),
+        rows,
+    )
+
+
+def set_values(values, scope=TOTAL):
+    """Overwrite counters with absolute values."""
+    stmt = _upsert()
+    db.session.execute(
+        stmt.on_conflict_do_update(index_elements=["scope", "name"],
+                                   set_={"value": stmt.excluded.value}),
+        [{"scope": scope, "name": name, "value": int(value)} for name, value in values.items()],
+    )
+
+
+def deposits_moved(moves):
+    """
+    Record deposit status changes: moves are (old_status, new_status, amount)
+    with old_status None for a new deposit. Approvals count as credited today (UTC).
+    """
+    total, daily = Counter(), Counter()
+    for old, new, amount in moves:
+        micro = _micro(amount)
+        if old:
+            total[f"deposits.{old}.count"] -= 1
+            total[f"deposits.{old}.amount_micro"] -= micro
+        else:
+            daily["deposits.created.count"] += 1
+            daily["deposits.created.amount_micro"] += micro
+        total[f"deposits.{new}.count"] += 1
+        total[f"deposits.{new}.amount_micro"] += micro
+        if new == "approved":
+            daily["deposits.credited.count"] += 1
+            daily["deposits.credited.amount_micro"] += micro
+    bump(total)
+    bump(daily, scope=datetime.utcnow().date().isoformat())
+
+
+def kyc_logs_moved(moves):
+    """KYC submission status changes: (old_status or None, new_status) pairs."""
+    changes = Counter()
+    for old, new in moves:
+        if old:
+            changes[f"kyc_logs.{old}.count"] -= 1
+        changes[f"kyc_logs.{new}.count"] += 1
+    bump(changes)
+
+
+def users_moved(moves):
+    """User.kyc_status changes: (old_status or None for a new user, new_status) pairs."""
+    changes = Counter()
+    for old, new in moves:
+        if old:
+            changes[f"users.kyc.{old}.count"] -= 1
+        else:
+            changes["users.count"] += 1
+        changes[f"users.kyc.{new}.count"] += 1
+    bump(changes)
+
+
+def balances_moved(balance_micro, deposits_micro=0, withdrawals_micro=0):
+    """Called by ledger.post / post_many for every balance change."""
+    bump({"users.balance_micro": balance_micro, "users.deposits_micro": deposits_micro,
+          "users.withdrawals_micro": withdrawals_micro})
+
+
+# -------------------------
+# Reading
+# -------------------------
+def snapshot(days=30):
+    """{"total": {name: value}, "daily": {iso_date: {name: value}}} for the last `days` days."""
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    rows = db.session.execute(
+        select(PlatformStat.scope, PlatformStat.name, PlatformStat.value)
+        .where((PlatformStat.scope == TOTAL) | (PlatformStat.scope >= since))
+    ).all()
+    result = {"total": {}, "daily": {}}
+    for scope, name, value in rows:
+        if scope == TOTAL:
+            result["total"][name] = value
+        elif scope < TOTAL:  # ISO dates sort before "total"
+            result["daily"].setdefault(scope, {})[name] = value
+    result["daily"] = dict(sorted(result["daily"].items(), reverse=True))
+    return result
+
+
+# -------------------------
+# Rebuild
+# -------------------------
+def rebuild():
+    """Recompute every counter from the source tables (one GROUP BY per table, plus the archive)."""
+    db.session.query(PlatformStat).delete(synchronize_session=False)
+    totals, daily = {}, {}
+
+    archived = ArchivedRecord
+    for model in (Deposit, archived):
+        query = select(model.status, func.count(), func.coalesce(func.sum(model.amount), 0))
+        if model is archived:
+            query = query.where(archived.kind == "deposit")
+        for status, count, amount in db.session.execute(query.group_by(model.status)):
+            totals[f"deposits.{status}.count"] = totals.get(f"deposits.{status}.count", 0) + count
+            totals[f"deposits.{status}.amount_micro"] = (totals.get(f"deposits.{status}.amount_micro", 0)
+                                                         + _micro(amount))
+
+    for model in (KYCLog, archived):
+        query = select(model.status, func.count())
+        if model is archived:
+            query = query.where(archived.kind == "kyc_log")
+        for status, count in db.session.execute(query.group_by(model.status)):
+            totals[f"kyc_logs.{status}.count"] = totals.get(f"kyc_logs.{status}.count", 0) + count
+
+    for status, count in db.session.execute(select(User.kyc_status, func.count()).group_by(User.kyc_status)):
+        totals[f"users.kyc.{status}.count"] = count
+
+    users, balance, deposited, withdrawn = db.session.execute(
+        select(func.count(), func.coalesce(func.sum(User.balance_micro), 0),
+               func.coalesce(func.sum(User.total_deposits_micro), 0),
+               func.coalesce(func.sum(User.total_withdrawals_micro), 0))
+    ).one()
+    totals.update({"users.count": users, "users.balance_micro": balance,
+                   "users.deposits_micro": deposited, "users.withdrawals_micro": withdrawn})
+
+    interest = db.session.execute(
+        select(func.coalesce(func.sum(Deposit.accrued_interest), 0)).where(Deposit.status == "approved")
+    ).scalar()
+    totals["interest.accrued_micro"] = _micro(interest)
+
+    # Per-day flows: submissions by deposit timestamp, credits by their ledger entry
+    for model in (Deposit, archived):
+        created_day = func.date(model.timestamp)
+        query = select(created_day, func.count(), func.sum(model.amount)).group_by(created_day)
+        if model is archived:
+            query = query.where(archived.kind == "deposit")
+        for day, count, amount in db.session.execute(query):
+            values = daily.setdefault(str(day), {})
+            values["deposits.created.count"] = values.get("deposits.created.count", 0) + count
+            values["deposits.created.amount_micro"] = (values.get("deposits.created.amount_micro", 0)
+                                                       + _micro(amount))
+    credited_day = func.date(LedgerEntry.timestamp)
+    for day, count, amount in db.session.execute(
+        select(credited_day, func.count(), func.sum(LedgerEntry.amount_micro))
+        .where(LedgerEntry.kind == "deposit").group_by(credited_day)
+    ):
+        daily.setdefault(str(day), {}).update({"deposits.credited.count": count,
+                                               "deposits.credited.amount_micro": amount})
+
+    set_values(totals)
+    for day, values in daily.items():
+        set_values(values, scope=day)
+    db.session.commit()
+    return {"counters": len(totals) + sum(len(v) for v in daily.values()), "days": len(daily),
+            "rebuilt_at": datetime.utcnow()}
@@ -1,22 +1,30 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, \
+    session, make_response, Response, abort
 from flask_login import login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-import os
 from datetime import datetime, timedelta
-import qrcode
 import math
-
-from . import db
-from .models import User, KYCLog, Deposit
-from .config import WEEKLY_INTEREST_RATE, MIN_INVEST_DAYS
+import hashlib
+import json
+
+from . import db, bulk, unlocks
+from .models import User, KYCLog, Deposit, WithdrawalRequest
+from .config import KYC_MAX_UPLOAD_MB
+from .cache import dashboard_cache, invalidate_dashboard, invalidate_identity
+from .qr import get_qr, load_qr
+from .admin import render_admin_dashboard
+from .ledger import to_micro, InsufficientFunds
+from .payouts import request_withdrawal
+from .passwords import HashingBusy, hash_password, verify_password
+from .uploads import UploadRejected, schedule_processing, store_upload
+from .rollups import deposits_moved, kyc_logs_moved, users_moved
+from .outbox import emit
+from .archive import restore_document
+from .ratelimit import init_rate_limits
 
 main = Blueprint('main', __name__)
-
-# Upload directory for KYC documents + QR codes
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
+init_rate_limits(main)  # per-IP/per-user token buckets + in-flight caps, before any DB work
 
 # ===============================
 # PUBLIC ROUTES
@@ -42,10 +50,14 @@ def register():
             flash("Username or email already exists.", "danger")
             return redirect(url_for('main.register'))
 
-        hashed = generate_password_hash(password)
-        new_user = User(username=username, email=email, password=hashed)
+        try:
+            hashed = hash_password(password)
+        except HashingBusy:
+            return _busy('register.html')
+        new_user = User(username=username, email=email, password=hashed, kyc_status="pending")
 
         db.session.add(new_user)
+        users_moved([(None, "pending")])
         db.session.commit()
 
         flash("Registration successful. Please login.", "success")
@@ -54,6 +66,12 @@ def register():
     return render_template('register.html')
 
 
+def _busy(template):
+    """All password-hash slots in this worker are taken: shed the request."""
+    flash("The server is busy, please try again in a moment.", "danger")
+    return render_template(template), 503, {"Retry-After": "2"}
+
+
 @main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -61,10 +79,18 @@ def login():
         password = request.form['password']
 
         user = User.query.filter_by(email=email).first()
-        if not user or not check_password_hash(user.password, password):
+        try:
+            matches, new_hash = verify_password(user.password, password) if user else (False, None)
+        except HashingBusy:
+            return _busy('login.html')
+        if not matches:
             flash("Invalid email or password.", "danger")
             return redirect(url_for('main.login'))
 
+        if new_hash:  # legacy Werkzeug hash or outdated argon2 cost
+            user.password = new_hash
+            db.session.commit()
+
         login_user(user)
         return redirect(url_for('main.dashboard'))
 
@@ -83,43 +109,80 @@ def logout():
 # USER DASHBOARD
 # ===============================
 
-@main.route('/dashboard')
-@login_required
-def dashboard():
-    latest_kyc = KYCLog.query.filter_by(user_id=current_user.id) \
+def build_dashboard_summary(user):
+    """Plain-data snapshot of everything dashboard.html shows for a user."""
+    latest_kyc = KYCLog.query.filter_by(user_id=user.id) \
                              .order_by(KYCLog.id.desc()).first()
 
-    deposits = Deposit.query.filter_by(user_id=current_user.id) \
+    deposits = Deposit.query.filter_by(user_id=user.id) \
                             .order_by(Deposit.timestamp.desc()).all()
 
     now = datetime.utcnow()
 
-    # Compute deposit interest and withdrawal eligibility
+    # Interest is precomputed by the accrual job (flask accrue-interest)
     deposit_info = []
-    total_earnings = 0
     for dep in deposits:
         if dep.status == "approved":
-            weeks_elapsed = (now - dep.timestamp).days / 7
-            interest = dep.amount * ((1 + WEEKLY_INTEREST_RATE) ** weeks_elapsed - 1) if weeks_elapsed > 0 else 0
-            total_earnings += interest
-            eligible_withdrawal = (now - dep.timestamp).days >= MIN_INVEST_DAYS
+            interest = dep.accrued_interest or 0
+            eligible_withdrawal = dep.unlocked or (dep.unlocks_at is not None and dep.unlocks_at <= now)
         else:
             interest = 0
             eligible_withdrawal = False
 
         deposit_info.append({
-            "deposit": dep,
+            "deposit": {
+                "amount": dep.amount,
+                "network": dep.network,
+                "status": dep.status,
+                "tx_hash": dep.tx_hash,
+                "timestamp": dep.timestamp,
+            },
             "interest": interest,
             "eligible_withdrawal": eligible_withdrawal
         })
 
-    current_user.total_earnings = total_earnings
-    db.session.commit()
+    summary = {
+        "user": {
+            "username": user.username,
+            "balance": user.balance,
+            "total_deposits": user.total_deposits,
+            "total_withdrawals": user.total_withdrawals,
+            "total_earnings": user.total_earnings,
+            "earnings_as_of": user.earnings_as_of,
+            "withdrawable_amount": user.withdrawable_amount,
+            "next_unlock_at": user.next_unlock_at,
+        },
+        "latest_kyc": {
+            "full_name": latest_kyc.full_name,
+            "id_number": latest_kyc.id_number,
+            "document_path": latest_kyc.document_path,
+            "status": latest_kyc.status,
+        } if latest_kyc else None,
+        "deposit_info": deposit_info,
+    }
+    etag = hashlib.sha1(json.dumps(summary, default=str, sort_keys=True).encode()).hexdigest()
+    return etag, summary
+
 
-    return render_template("dashboard.html",
-                           user=current_user,
-                           latest_kyc=latest_kyc,
-                           deposit_info=deposit_info)
+@main.route('/dashboard')
+@login_required
+def dashboard():
+    cached = dashboard_cache.get(current_user.id)
+    if cached is None:
+        cached = build_dashboard_summary(current_user)
+        dashboard_cache.set(current_user.id, cached)
+    etag, summary = cached
+
+    # Pending flash messages are part of the page, so never answer 304 or tag it then
+    has_flashes = bool(session.get("_flashes"))
+    if not has_flashes and etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = make_response(render_template("dashboard.html", **summary))
+    if not has_flashes:
+        response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 
 # ===============================
@@ -138,22 +201,37 @@ def kyc():
             flash("All fields are required including upload.", "danger")
             return redirect(url_for('main.kyc'))
 
-        filename = secure_filename(file.filename)
-        save_path = os.path.join(UPLOAD_FOLDER, f"{current_user.id}_{filename}")
-        file.save(save_path)
+        try:
+            digest, save_path, _ = store_upload(file, secure_filename(file.filename))
+        except UploadRejected as exc:
+            flash(str(exc), "danger")
+            return redirect(url_for('main.kyc'))
 
         entry = KYCLog(
             user_id=current_user.id,
             full_name=full_name,
             id_number=id_number,
             document_path=save_path,
+            document_hash=digest,
             status="pending",
             timestamp=datetime.utcnow()
         )
 
         db.session.add(entry)
-        current_user.kyc_status = "pending"
+        kyc_logs_moved([(None, "pending")])
+        user = db.session.get(User, current_user.id)
+        if user.kyc_status != "pending":
+            users_moved([(user.kyc_status, "pending")])
+            user.kyc_status = "pending"
+        db.session.flush()
+        emit("kyc.submitted", kyc_id=entry.id, user_id=current_user.id)
         db.session.commit()
+        restore_document(save_path)  # an archive run may have moved this file between store_upload and the commit
+        invalidate_dashboard(current_user.id)
+        invalidate_identity(current_user.id)
+
+        # Preview + thumbnail are built off the request thread
+        schedule_processing(current_app._get_current_object(), digest, save_path)
 
         flash("KYC submitted. Wait for approval.", "success")
         return redirect(url_for('main.dashboard'))
@@ -164,6 +242,12 @@ def kyc():
     return render_template("kyc.html", latest_kyc=latest_kyc)
 
 
+@main.errorhandler(RequestEntityTooLarge)
+def upload_too_large(exc):
+    flash(f"File is larger than {KYC_MAX_UPLOAD_MB} MB.", "danger")
+    return redirect(url_for('main.kyc'))
+
+
 # ===============================
 # DEPOSITS
 # ===============================
@@ -204,17 +288,18 @@ def deposit():
         )
 
         db.session.add(dep)
+        deposits_moved([(None, "pending", amount_f)])
+        db.session.flush()
+        emit("deposit.submitted", deposit_id=dep.id, user_id=current_user.id,
+             amount_micro=to_micro(amount_f))
         db.session.commit()
+        invalidate_dashboard(current_user.id)
 
         flash("Deposit submitted. Admin will review.", "success")
         return redirect(url_for("main.dashboard"))
 
-    # Generate QR Code
-    qr_img = qrcode.make(deposit_address)
-    qr_path = os.path.join(UPLOAD_FOLDER, f"{current_user.id}_deposit_qr.png")
-    qr_img.save(qr_path)
-
-    qr_url = url_for("static", filename=f"uploads/{current_user.id}_deposit_qr.png")
+    # QR image is shared by everyone with the same address/network
+    qr_url = url_for("main.qr_code", digest=get_qr(deposit_address, network))
 
     return render_template("deposit.html",
                            deposit_address=deposit_address,
@@ -222,18 +307,71 @@ def deposit():
                            qr_url=qr_url)
 
 
+@main.route('/qr/<digest>.png')
+def qr_code(digest):
+    png = load_qr(digest)
+    if png is None:
+        abort(404)
+
+    response = Response(png, mimetype="image/png")
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.set_etag(digest)
+    return response
+
+
 # ===============================
 # WITHDRAWAL CHECK
 # ===============================
 
 def can_withdraw(user: User):
-    earliest_deposit = Deposit.query.filter_by(user_id=user.id, status="approved") \
-                                    .order_by(Deposit.timestamp.asc()).first()
-    if not earliest_deposit:
-        return False, "No approved deposits yet."
-    if (datetime.utcnow() - earliest_deposit.timestamp).days < MIN_INVEST_DAYS:
-        return False, f"Deposits must be at least {MIN_INVEST_DAYS} days old to withdraw."
-    return True, ""
+    # O(1): unlock state is kept on the user row (see unlocks.py)
+    return unlocks.can_withdraw(user)
+
+
+@main.route('/withdraw', methods=['GET', 'POST'])
+@login_required
+def withdraw():
+    allowed, reason = can_withdraw(current_user)
+    if allowed:
+        unlocks.unlock_user(current_user.id)  # principal unlocked since the last sweep
+    user = db.session.get(User, current_user.id)
+
+    if request.method == 'POST':
+        if not allowed:
+            flash(reason, "danger")
+            return redirect(url_for('main.withdraw'))
+
+        address = request.form.get("address", "").strip()
+        try:
+            amount_micro = to_micro(request.form.get("amount", ""))
+            if amount_micro <= 0:
+                raise ValueError()
+        except (ValueError, ArithmeticError):
+            flash("Enter a valid amount.", "danger")
+            return redirect(url_for('main.withdraw'))
+        if not address:
+            flash("Enter the address to withdraw to.", "danger")
+            return redirect(url_for('main.withdraw'))
+        if amount_micro > user.withdrawable_micro:
+            flash(f"You can withdraw at most {user.withdrawable_amount:.2f} USDT: "
+                  "only unlocked deposits can be withdrawn.", "danger")
+            return redirect(url_for('main.withdraw'))
+
+        network = current_app.config.get("BINANCE_NETWORK", "TRC20")
+        try:
+            request_withdrawal(current_user.id, amount_micro, address, network)
+        except InsufficientFunds:  # another request spent it in the meantime
+            db.session.rollback()
+            flash("Insufficient withdrawable balance.", "danger")
+            return redirect(url_for('main.withdraw'))
+
+        flash("Withdrawal requested. Admin will review.", "success")
+        return redirect(url_for('main.dashboard'))
+
+    requests_ = WithdrawalRequest.query.filter_by(user_id=current_user.id) \
+                                       .order_by(WithdrawalRequest.id.desc()).limit(20).all()
+    return render_template("withdraw.html", allowed=allowed, reason=reason, withdrawals=requests_,
+                           balance=user.balance, withdrawable=user.withdrawable_amount)
 
 
 # ===============================
@@ -247,14 +385,7 @@ def admin_dashboard():
         flash("Access denied.", "danger")
         return redirect(url_for('main.dashboard'))
 
-    users = User.query.all()
-    kycs = KYCLog.query.order_by(KYCLog.timestamp.desc()).all()
-    deposits = Deposit.query.order_by(Deposit.timestamp.desc()).all()
-
-    return render_template("admin_dashboard.html",
-                           users=users,
-                           kycs=kycs,
-                           deposits=deposits)
+    return render_admin_dashboard()
 
 
 # ===============================
@@ -268,13 +399,13 @@ def approve_kyc(kyc_id):
         flash("Access denied.", "danger")
         return redirect(url_for('main.dashboard'))
 
-    rec = KYCLog.query.get_or_404(kyc_id)
-    rec.status = "approved"
-
-    user = User.query.get(rec.user_id)
-    user.kyc_status = "approved"
-
-    db.session.commit()
+    # Set-based path: only pending submissions move, and the rollups follow
+    result = bulk.set_kyc_status([kyc_id], "approved")[0]
+    if result["result"] == "not_found":
+        abort(404)
+    if result["result"] == "skipped":
+        flash(f"KYC already {result['status']}.", "info")
+        return redirect(url_for('main.admin_dashboard'))
 
     flash("KYC approved.", "success")
     return redirect(url_for('main.admin_dashboard'))
@@ -287,13 +418,13 @@ def reject_kyc(kyc_id):
         flash("Access denied.", "danger")
         return redirect(url_for('main.dashboard'))
 
-    rec = KYCLog.query.get_or_404(kyc_id)
-    rec.status = "rejected"
-
-    user = User.query.get(rec.user_id)
-    user.kyc_status = "rejected"
-
-    db.session.commit()
+    # Set-based path: only pending submissions move, and the rollups follow
+    result = bulk.set_kyc_status([kyc_id], "rejected")[0]
+    if result["result"] == "not_found":
+        abort(404)
+    if result["result"] == "skipped":
+        flash(f"KYC already {result['status']}.", "info")
+        return redirect(url_for('main.admin_dashboard'))
 
     flash("KYC rejected.", "danger")
     return redirect(url_for('main.admin_dashboard'))
@@ -312,20 +443,12 @@ def approve_deposit(deposit_id):
 
     dep = Deposit.query.get_or_404(deposit_id)
 
-    if dep.status == "approved":
+    # Claims the deposit and posts its ledger entry in one transaction
+    if not dep.approve():
+        db.session.rollback()  # nothing of ours to keep
         flash("Deposit already approved.", "info")
         return redirect(url_for('main.admin_dashboard'))
 
-    # Update deposit
-    dep.status = "approved"
-
-    # Update user balance and deposit stats
-    user = User.query.get(dep.user_id)
-    user.balance += dep.amount
-    user.total_deposits += dep.amount
-
-    db.session.commit()
-
     flash(f"Deposit of {dep.amount} USDT approved & credited.", "success")
     return redirect(url_for('main.admin_dashboard'))
 
@@ -337,10 +460,12 @@ def reject_deposit(deposit_id):
         flash("Access denied.", "danger")
         return redirect(url_for('main.dashboard'))
 
-    dep = Deposit.query.get_or_404(deposit_id)
-    dep.status = "rejected"
-
-    db.session.commit()
+    result = bulk.reject_deposits([deposit_id])[0]
+    if result["result"] == "not_found":
+        abort(404)
+    if result["result"] == "skipped":
+        flash(f"Only pending deposits can be rejected (this one is {result['status']}).", "info")
+        return redirect(url_for('main.admin_dashboard'))
 
     flash("Deposit rejected.", "danger")
     return redirect(url_for('main.admin_dashboard'))
@@ -363,6 +488,7 @@ def make_me_admin():
 
     user.is_admin = True  # or user.role = "admin" depending on your model
     db.session.commit()
+    invalidate_identity(user.id)
 
     return f"? {email} is now an admin!"
 
@@ -0,0 +1,246 @@
+# src/app/unlocks.py
+"""
+Precomputed withdrawal eligibility.
+
+A deposit's principal unlocks MIN_INVEST_DAYS after it was made. Instead of
+comparing every deposit's age with that limit on each request:
+
+- approval sets `deposit.unlocks_at` (timestamp + MIN_INVEST_DAYS). Deposits
+  that are already old enough are unlocked immediately; otherwise the
+  owner's `user.next_unlock_at` is pulled forward if this deposit unlocks
+  earlier;
+- the unlock sweep (`flask --app run unlock-sweep`) finds deposits whose
+  unlocks_at has passed through ix_deposit_unlocked_unlocks_at, flips
+  `unlocked`, adds their principal to `user.unlocked_micro` and recomputes
+  the owner's next_unlock_at.
+
+A user may withdraw once any approved deposit has unlocked, i.e.
+unlocked_micro > 0 or next_unlock_at <= now. The second test covers
+deposits that crossed the line since the last sweep, so the answer does not
+depend on how often the sweep runs. Both are columns on the user row.
+
+unlocked_micro is what is left to withdraw: a withdrawal takes its amount
+out of it in the ledger UPDATE and a refund puts it back (ledger.post). The
+withdraw page runs `unlock_user()` first, so principal that unlocked since
+the last sweep counts as well.
+
+`rebuild()` recomputes everything from the deposits (migration 007, seeding).
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, select, update
+
+from . import db
+from .cache import invalidate_dashboard
+from .ledger import UNLOCKED_KINDS, from_micro, to_micro
+from .models import User, Deposit, LedgerEntry
+from .config import MIN_INVEST_DAYS, UNLOCK_SWEEP_BATCH_SIZE
+
+LOCK = timedelta(days=MIN_INVEST_DAYS)
+
+
+def unlocks_at(timestamp):
+    return (timestamp or datetime.utcnow()) + LOCK
+
+
+def can_withdraw(user, now=None):
+    """(allowed, reason) from the user row alone."""
+    now = now or datetime.utcnow()
+    if user.unlocked_micro or (user.next_unlock_at and user.next_unlock_at <= now):
+        return True, ""
+    if user.next_unlock_at is None:
+        return False, "No approved deposits yet."
+    return False, f"Deposits must be at least {MIN_INVEST_DAYS} days old to withdraw."
+
+
+def next_unlocks(user_ids, now):
+    """
+    {user_id: earliest unlock after now}. Phrased on timestamp
+    (unlocks_at = timestamp + LOCK), so each user is one range seek in
+    ix_deposit_user_id_status_timestamp.
+    """
+    rows = db.session.execute(
+        select(Deposit.user_id, func.min(Deposit.timestamp))
+        .where(Deposit.user_id.in_(user_ids), Deposit.status == "approved",
+               Deposit.timestamp > now - LOCK)
+        .group_by(Deposit.user_id)
+    ).all()
+    return {user_id: unlocks_at(first) for user_id, first in rows}
+
+
+# -------------------------
+# Approval (inside the approving transaction)
+# -------------------------
+def deposits_approved(rows, now=None):
+    """rows: (deposit_id, user_id, amount, timestamp) for deposits that just became approved."""
+    now = now or datetime.utcnow()
+    deposits, unlocked, locked = [], {}, {}
+    for deposit_id, user_id, amount, timestamp in rows:
+        at = unlocks_at(timestamp)
+        deposits.append({"id": deposit_id, "unlocks_at": at, "unlocked": at <= now})
+        if at <= now:
+            unlocked[user_id] = unlocked.get(user_id, 0) + to_micro(amount)
+        else:
+            locked[user_id] = min(at, locked.get(user_id, at))
+    if not deposits:
+        return
+
+    db.session.execute(update(Deposit), deposits)
+    users = User.__table__
+    if unlocked:
+        db.session.execute(
+            users.update().where(users.c.id == bindparam("uid"))
+            .values(unlocked_micro=users.c.unlocked_micro + bindparam("micro")),
+            [{"uid": uid, "micro": micro} for uid, micro in unlocked.items()],
+        )
+    if locked:
+        current = users.c.next_unlock_at
+        db.session.execute(
+            users.update().where(users.c.id == bindparam("uid"),
+                                 (current.is_(None)) | (current > bindparam("at")))
+            .values(next_unlock_at=bindparam("at")),
+            [{"uid": uid, "at": at} for uid, at in locked.items()],
+        )
+
+
+# -------------------------
+# Sweep
+# -------------------------
+def sweep(now=None, batch_size=UNLOCK_SWEEP_BATCH_SIZE):
+    """Unlock every approved deposit whose unlocks_at has passed. Returns {"deposits", "users", "amount"}."""
+    now = now or datetime.utcnow()
+    summary = {"deposits": 0, "users": 0, "amount": 0.0}
+    while True:
+        ids = db.session.execute(
+            select(Deposit.id)
+            .where(Deposit.unlocked.is_(False), Deposit.unlocks_at <= now)
+            .order_by(Deposit.unlocks_at).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return summary
+
+        flipped, per_user = _unlock(ids, now)
+        db.session.commit()
+
+        for user_id in per_user:
+            invalidate_dashboard(user_id)
+        summary["deposits"] += flipped
+        summary["users"] += len(per_user)
+        summary["amount"] += from_micro(sum(per_user.values()))
+
+
+def unlock_user(user_id, now=None):
+    """Unlock one user's deposits that are past their lock (sweep for one user). Returns the micro-USDT unlocked."""
+    now = now or datetime.utcnow()
+    ids = db.session.execute(
+        select(Deposit.id)
+        .where(Deposit.user_id == user_id, Deposit.status == "approved",
+               Deposit.timestamp <= now - LOCK, Deposit.unlocked.is_(False))
+    ).scalars().all()
+    if not ids:
+        return 0
+    _, per_user = _unlock(ids, now)
+    db.session.commit()
+    invalidate_dashboard(user_id)
+    return per_user.get(user_id, 0)
+
+
+def _unlock(ids, now):
+    """Flip the given deposits and credit their owners' unlocked_micro. Returns (deposits, {user_id: micro})."""
+    flipped = db.session.execute(
+        update(Deposit)
+        .where(Deposit.id.in_(ids), Deposit.unlocked.is_(False), Deposit.status == "approved")
+        .values(unlocked=True)
+        .returning(Deposit.user_id, Deposit.amount),
+        execution_options={"synchronize_session": False},
+    ).all()
+    # rows that stopped being approved only lose their unlock time
+    db.session.execute(
+        update(Deposit).where(Deposit.id.in_(ids), Deposit.unlocked.is_(False))
+        .values(unlocks_at=None),
+        execution_options={"synchronize_session": False},
+    )
+
+    per_user = {}
+    for user_id, amount in flipped:
+        per_user[user_id] = per_user.get(user_id, 0) + to_micro(amount)
+    if per_user:
+        upcoming_at = next_unlocks(list(per_user), now)
+        users = User.__table__
+        db.session.execute(
+            users.update().where(users.c.id == bindparam("uid"))
+            .values(unlocked_micro=users.c.unlocked_micro + bindparam("micro"),
+                    next_unlock_at=bindparam("at")),
+            [{"uid": uid, "micro": micro, "at": upcoming_at.get(uid)}
+             for uid, micro in per_user.items()],
+        )
+    return len(flipped), per_user
+
+
+# -------------------------
+# Planning
+# -------------------------
+def upcoming(start, end):
+    """Principal unlocking in [start, end): (deposits, users, amount) from one index range scan."""
+    count, users, amount = db.session.execute(
+        select(func.count(), func.count(func.distinct(Deposit.user_id)),
+               func.coalesce(func.sum(Deposit.amount), 0))
+        .where(Deposit.unlocked.is_(False), Deposit.unlocks_at >= start, Deposit.unlocks_at < end)
+    ).one()
+    return count, users, float(amount)
+
+
+# -------------------------
+# Rebuild
+# -------------------------
+def rebuild(now=None, batch_size=10_000):
+    """
+    Recompute every deposit's unlock fields and every user's unlocked_micro /
+    next_unlock_at. unlocked_micro is the unlocked principal less what the
+    ledger says was withdrawn and not refunded.
+    """
+    now = now or datetime.utcnow()
+    db.session.execute(update(User).values(unlocked_micro=0, next_unlock_at=None))
+    db.session.execute(
+        update(Deposit).where((Deposit.unlocks_at.is_not(None)) | Deposit.unlocked)
+        .values(unlocks_at=None, unlocked=False),
+        execution_options={"synchronize_session": False},
+    )
+
+    unlocked, locked = {}, {}
+    last_id = count = 0
+    while True:
+        rows = db.session.execute(
+            select(Deposit.id, Deposit.user_id, Deposit.amount, Deposit.timestamp)
+            .where(Deposit.status == "approved", Deposit.id > last_id)
+            .order_by(Deposit.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for deposit_id, user_id, amount, timestamp in rows:
+            at = unlocks_at(timestamp)
+            updates.append({"id": deposit_id, "unlocks_at": at, "unlocked": at <= now})
+            if at <= now:
+                unlocked[user_id] = unlocked.get(user_id, 0) + to_micro(amount)
+            else:
+                locked[user_id] = min(at, locked.get(user_id, at))
+        db.session.execute(update(Deposit), updates)
+        last_id = rows[-1].id
+        count += len(rows)
+
+    withdrawn = dict(db.session.execute(
+        select(LedgerEntry.user_id, -func.sum(LedgerEntry.amount_micro))
+        .where(LedgerEntry.kind.in_(UNLOCKED_KINDS)).group_by(LedgerEntry.user_id)
+    ).all())
+    state = {uid: {"id": uid, "unlocked_micro": 0, "next_unlock_at": None}
+             for uid in set(unlocked) | set(locked)}
+    for uid, micro in unlocked.items():
+        state[uid]["unlocked_micro"] = max(micro - (withdrawn.get(uid) or 0), 0)
+    for uid, at in locked.items():
+        state[uid]["next_unlock_at"] = at
+    if state:
+        db.session.execute(update(User), list(state.values()))
+    db.session.commit()
+    return {"deposits": count, "users": len(state)}
@@ -0,0 +1,140 @@
+# src/app/uploads.py
+"""
+KYC document storage.
+
+Uploads are copied to disk in chunks while being hashed, capped at
+KYC_MAX_UPLOAD_MB, and stored as static/uploads/<sha256>.<ext>: a document
+that was uploaded before (a resubmission) is not written again. The KYCLog
+row is created immediately; a background pool then writes a downscaled JPEG
+preview (<sha256>_preview.jpg) and an admin thumbnail (<sha256>_thumb.jpg)
+and records them on every KYCLog row with that hash.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import db
+from .config import (
+    KYC_MAX_UPLOAD_MB, KYC_ALLOWED_EXTENSIONS, KYC_PREVIEW_MAX_SIDE, KYC_THUMB_SIDE, KYC_WORKERS,
+)
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
+MAX_UPLOAD_BYTES = KYC_MAX_UPLOAD_MB * 1024 * 1024
+CHUNK = 64 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class UploadRejected(Exception):
+    """The upload is too large or not an accepted document type."""
+
+
+# -------------------------
+# Streaming, content-addressed storage
+# -------------------------
+def extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if ext not in KYC_ALLOWED_EXTENSIONS:
+        raise UploadRejected(f"Unsupported file type. Allowed: {', '.join(sorted(KYC_ALLOWED_EXTENSIONS))}.")
+    return ext
+
+
+def store_upload(file, filename):
+    """
+    Copy an uploaded file to disk in chunks, hashing as it goes.
+    Returns (digest, path, is_new). Raises UploadRejected.
+    """
+    ext = extension(filename)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix=".part")
+    try:
+        os.fchmod(fd, 0o644)  # mkstemp creates 0600 and os.replace keeps it; static servers must read it
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file.stream.read(CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadRejected(f"File is larger than {KYC_MAX_UPLOAD_MB} MB.")
+                sha.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise UploadRejected("The uploaded file is empty.")
+
+        digest = sha.hexdigest()
+        path = os.path.join(UPLOAD_FOLDER, f"{digest}.{ext}")
+        if os.path.exists(path):
+            os.remove(tmp_path)  # same document already stored
+            return digest, path, False
+        os.replace(tmp_path, path)
+        return digest, path, True
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def derived_paths(digest):
+    return (os.path.join(UPLOAD_FOLDER, f"{digest}_preview.jpg"),
+            os.path.join(UPLOAD_FOLDER, f"{digest}_thumb.jpg"))
+
+
+# -------------------------
+# Background processing
+# -------------------------
+def _render(path, digest):
+    """Normalize to RGB JPEG: a preview (max KYC_PREVIEW_MAX_SIDE) and a thumbnail."""
+    from PIL import Image, ImageOps  # only the worker threads need Pillow
+
+    preview_path, thumb_path = derived_paths(digest)
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")  # phone photos carry rotation in EXIF
+        img.thumbnail((KYC_PREVIEW_MAX_SIDE, KYC_PREVIEW_MAX_SIDE))
+        img.save(f"{preview_path}.tmp", "JPEG", quality=85, optimize=True)
+        img.thumbnail((KYC_THUMB_SIDE, KYC_THUMB_SIDE))
+        img.save(f"{thumb_path}.tmp", "JPEG", quality=80)
+    os.replace(f"{preview_path}.tmp", preview_path)
+    os.replace(f"{thumb_path}.tmp", thumb_path)
+    return preview_path, thumb_path
+
+
+def record_derived(digest, preview_path, thumb_path):
+    from .models import KYCLog
+
+    KYCLog.query.filter(KYCLog.document_hash == digest, KYCLog.thumbnail_path.is_(None)) \
+                .update({"preview_path": preview_path, "thumbnail_path": thumb_path},
+                        synchronize_session=False)
+    db.session.commit()
+
+
+def process_document(app, digest, path):
+    """Runs on the pool: build preview + thumbnail, then record them. Non-images are left as-is."""
+    try:
+        preview_path, thumb_path = _render(path, digest)
+    except Exception as exc:  # PDFs, HEIC without a plugin, corrupt files: admins still get the original
+        app.logger.info("KYC document %s not processed: %s", digest, exc)
+        return
+    with app.app_context():
+        record_derived(digest, preview_path, thumb_path)
+
+
+def schedule_processing(app, digest, path):
+    """Hand a stored document to the background pool (or record existing derivatives now)."""
+    global _pool
+    preview_path, thumb_path = derived_paths(digest)
+    if os.path.exists(thumb_path):
+        record_derived(digest, preview_path, thumb_path)
+        return None
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=KYC_WORKERS, thread_name_prefix="kyc-docs")
+    return _pool.submit(process_document, app, digest, path)
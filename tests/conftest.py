@@ -0,0 +1,40 @@
+"""
+Test fixtures: one app on an in-memory SQLite database, with a fresh schema
+for every test. The environment is set before src.app is imported, because
+config.py reads it at import time.
+"""
+import os
+
+os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+os.environ["DB_PROFILE"] = "default"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+import pytest
+
+from src.app import create_app, db as _db
+from src.app.models import User
+
+
+@pytest.fixture(scope="session")
+def app():
+    return create_app()
+
+
+@pytest.fixture
+def db(app):
+    with app.app_context():
+        _db.create_all()
+        yield _db
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def make_user(db):
+    def make_user(username="bob", balance_micro=0, **values):
+        user = User(username=username, email=f"{username}@example.com", password="x",
+                    balance_micro=balance_micro, **values)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.app.accrual import accrue_all, unfinished_run
+from src.app.models import Deposit, User
+
+T0 = datetime(2026, 1, 1)
+
+
+def test_backdated_run_is_refused(db, make_user):
+    user = make_user()
+    db.session.add(Deposit(user_id=user.id, amount=100.0, tx_hash="tx1", status="approved",
+                           timestamp=T0 - timedelta(days=14)))
+    db.session.commit()
+
+    accrue_all(now=T0)
+    with pytest.raises(ValueError):
+        accrue_all(now=T0 - timedelta(days=1))
+
+    assert unfinished_run() is None
+    assert db.session.get(User, user.id).earnings_as_of == T0
+    assert accrue_all(now=T0)["resumed"] is False  # the same as-of time may be repeated
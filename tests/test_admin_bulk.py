@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.fixture
+def admin_client(app, make_user):
+    admin = make_user("admin", is_admin=True)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(admin.id)
+        session["_fresh"] = True
+    return client
+
+
+@pytest.mark.parametrize("body", [
+    [1, 2],                                # a bare list
+    {"action": "approve", "ids": "5"},     # would be iterated per character
+    {"action": "approve", "ids": 5},
+])
+def test_malformed_json_bulk_body_is_rejected(admin_client, body):
+    response = admin_client.post("/admin/deposits/bulk", json=body)
+    assert response.status_code == 400
+
+
+def test_json_bulk_body_reports_per_item_results(admin_client):
+    response = admin_client.post("/admin/deposits/bulk", json={"action": "approve", "ids": [99]})
+    assert response.status_code == 200
+    assert response.get_json()["results"] == [{"id": 99, "result": "not_found"}]
@@ -0,0 +1,87 @@
+import asyncio
+
+from src.app import bulk, deposit_watcher
+from src.app.deposit_watcher import FakeSource, Transfer, get_checkpoint, poll_once, record_transfers
+from src.app.models import ChainTransfer, Deposit, User
+
+
+def deposit(db, user, amount, tx_hash, status="pending"):
+    row = Deposit(user_id=user.id, amount=amount, network="TRC20", tx_hash=tx_hash, status=status)
+    db.session.add(row)
+    db.session.commit()
+    return row.id
+
+
+def poll(source):
+    return asyncio.run(poll_once([source]))
+
+
+def test_matching_transfer_approves_and_credits(db, make_user):
+    user = make_user()
+    deposit_id = deposit(db, user, 25.0, "tx-1")
+    source = FakeSource()
+    source.add("tx-1", 25.0)
+
+    summary = poll(source)
+
+    assert summary["approved"] == 1
+    assert db.session.get(Deposit, deposit_id).status == "approved"
+    assert db.session.get(User, user.id).balance_micro == 25_000_000
+    assert db.session.query(ChainTransfer).filter_by(tx_hash="tx-1").one().deposit_id == deposit_id
+    # the next poll sees nothing new and credits nothing twice
+    assert poll(source)["approved"] == 0
+    assert db.session.get(User, user.id).balance_micro == 25_000_000
+
+
+def test_amount_mismatch_stays_pending(db, make_user):
+    user = make_user()
+    deposit_id = deposit(db, user, 25.0, "tx-1")
+    source = FakeSource()
+    source.add("tx-1", 24.5)
+
+    summary = poll(source)
+
+    assert summary["approved"] == 0
+    assert summary["amount_mismatch"] == [deposit_id]
+    assert db.session.get(Deposit, deposit_id).status == "pending"
+    assert db.session.get(User, user.id).balance_micro == 0
+
+
+def test_deposit_rejected_mid_poll_is_not_approved(db, make_user, monkeypatch):
+    user = make_user()
+    deposit_id = deposit(db, user, 25.0, "tx-1")
+    source = FakeSource()
+    source.add("tx-1", 25.0)
+
+    def reject_first(ids):  # an admin rejects it between the match query and the approval
+        bulk.reject_deposits([deposit_id])
+        return bulk.approve_deposits(ids)
+    monkeypatch.setattr(deposit_watcher, "approve_deposits", reject_first)
+
+    assert poll(source)["approved"] == 0
+    assert db.session.get(Deposit, deposit_id).status == "rejected"
+    assert db.session.get(User, user.id).balance_micro == 0
+    assert db.session.query(ChainTransfer).filter_by(tx_hash="tx-1").one().deposit_id is None
+
+
+def test_shared_tx_hash_goes_to_review(db, make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    ids = [deposit(db, alice, 25.0, "tx-1"), deposit(db, bob, 25.0, "tx-1")]
+    source = FakeSource()
+    source.add("tx-1", 25.0)
+
+    summary = poll(source)
+
+    assert summary["approved"] == 0
+    assert sorted(summary["duplicate_hash"]) == sorted(ids)
+
+
+def test_checkpoint_waits_for_unconfirmed_transfer(db):
+    record_transfers("fake", [Transfer("tx-1", 1, cursor=10), Transfer("tx-2", 1, cursor=20, confirmed=False),
+                              Transfer("tx-3", 1, cursor=30)])
+    assert get_checkpoint("fake") == 19
+    assert db.session.query(ChainTransfer).count() == 2
+
+    record_transfers("fake", [Transfer("tx-2", 1, cursor=20), Transfer("tx-3", 1, cursor=30)])
+    assert get_checkpoint("fake") == 30
+    assert db.session.query(ChainTransfer).count() == 3
@@ -0,0 +1,16 @@
+import pytest
+from flask import g
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+def test_failed_statement_is_not_recorded_and_later_ones_are_timed(app, db):
+    with app.test_request_context():
+        g.metrics_queries = []
+        with pytest.raises(OperationalError):
+            db.session.execute(text("SELECT * FROM no_such_table"))
+        db.session.rollback()
+        db.session.execute(text("SELECT 1"))
+
+        assert [statement for statement, _ in g.metrics_queries] == ["SELECT 1"]
+        assert 0 <= g.metrics_queries[0][1] < 1
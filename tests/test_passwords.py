@@ -0,0 +1,37 @@
+import threading
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from src.app import passwords
+from src.app.passwords import HashingBusy, hash_password, verify_password
+
+
+def test_legacy_login_succeeds_when_the_rehash_is_busy(monkeypatch):
+    def busy(password):
+        raise HashingBusy()
+
+    monkeypatch.setattr(passwords, "hash_password", busy)
+    assert verify_password(generate_password_hash("secret"), "secret") == (True, None)
+
+
+def test_legacy_login_returns_an_argon2_hash():
+    matches, new_hash = verify_password(generate_password_hash("secret"), "secret")
+    assert matches and passwords.is_argon2(new_hash)
+    assert verify_password(new_hash, "secret") == (True, None)
+
+
+def test_slow_hash_times_out_and_keeps_its_slot_until_done(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_TIMEOUT", 0.01)
+    free = passwords._slots._value
+    release = threading.Event()
+    with pytest.raises(HashingBusy):
+        passwords._run(release.wait)
+    assert passwords._slots._value == free - 1
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while passwords._slots._value != free and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert passwords._slots._value == free
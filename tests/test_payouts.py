@@ -0,0 +1,78 @@
+from src.app import payouts
+from src.app.ledger import ledger_balance, post
+from src.app.models import LedgerEntry, User, WithdrawalRequest
+from src.app.payouts import FakeGateway, PayoutError, approve_withdrawal, process_batch, request_withdrawal
+
+
+class TimeoutAfterSend(FakeGateway):
+    """The payout goes through, but the response is lost."""
+
+    def withdraw(self, key, amount, address, network):
+        super().withdraw(key, amount, address, network)
+        raise PayoutError("read timeout")
+
+
+def approved_request(db, make_user, amount_micro=10_000_000):
+    user = make_user(unlocked_micro=50_000_000)
+    post(user.id, 50_000_000, "deposit", reference="deposit:1")
+    db.session.commit()
+    req = request_withdrawal(user.id, amount_micro, "T-address", "TRC20")
+    approve_withdrawal(req.id)
+    return user.id, req.id
+
+
+def refunds(db, request_id):
+    return db.session.query(LedgerEntry).filter_by(kind="withdrawal_refund",
+                                                   reference=f"withdrawal:{request_id}").count()
+
+
+def test_transient_error_then_lookup_hit_is_paid_once(db, make_user):
+    user_id, request_id = approved_request(db, make_user)
+    gateway = TimeoutAfterSend()
+
+    assert process_batch(gateway, max_attempts=3)["retry"] == 1
+    assert db.session.get(WithdrawalRequest, request_id).status == "approved"
+
+    # the retry asks the gateway first and finds the payout under the same key
+    assert process_batch(gateway, max_attempts=3)["paid"] == 1
+    req = db.session.get(WithdrawalRequest, request_id)
+    assert req.status == "paid" and req.external_id == "fake-1"
+    assert gateway.calls == 1
+    assert refunds(db, request_id) == 0
+    assert db.session.get(User, user_id).balance_micro == 40_000_000
+
+
+def test_transient_error_on_last_attempt_reconciles_before_refunding(db, make_user):
+    user_id, request_id = approved_request(db, make_user)
+
+    assert process_batch(TimeoutAfterSend(), max_attempts=1)["paid"] == 1
+    assert db.session.get(WithdrawalRequest, request_id).status == "paid"
+    assert refunds(db, request_id) == 0
+
+
+def test_permanent_error_refunds_once(db, make_user):
+    user_id, request_id = approved_request(db, make_user)
+    key = db.session.get(WithdrawalRequest, request_id).idempotency_key
+    gateway = FakeGateway(fail_keys=[key], permanent=True)
+
+    assert process_batch(gateway)["failed"] == 1
+    assert process_batch(gateway) == {"paid": 0, "retry": 0, "failed": 0, "skipped": 0}
+
+    assert db.session.get(WithdrawalRequest, request_id).status == "failed"
+    assert refunds(db, request_id) == 1
+    user = db.session.get(User, user_id)
+    assert user.balance_micro == ledger_balance(user_id) == 50_000_000
+    assert user.unlocked_micro == 50_000_000
+
+
+def test_row_moved_by_another_worker_is_not_refunded(db, make_user):
+    user_id, request_id = approved_request(db, make_user)
+    rows = payouts.claim_batch()
+    # recover_stale finds the payout while this worker is still waiting on the gateway
+    payouts._transition(request_id, ("processing",), "paid", "recovered", external_id="elsewhere")
+    db.session.commit()
+
+    assert payouts._settle(FakeGateway(), rows[0], None, PayoutError("bad address", permanent=True), 3) == "skipped"
+    db.session.commit()
+    assert db.session.get(WithdrawalRequest, request_id).status == "paid"
+    assert refunds(db, request_id) == 0
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from src.app.projection import project, report
+from src.app.config import WEEKLY_INTEREST_RATE
+
+
+def test_scenario_rate_only_applies_to_future_weeks():
+    amounts, days = [100.0, 50.0], [70, 14]
+    today = project(amounts, days, weeks=4)["liability"][0]
+    for rate in (0.0, 0.01, 0.1):
+        weekly = project(amounts, days, weeks=4, rate=rate)
+        assert weekly["liability"][0] == pytest.approx(today)
+        assert weekly["liability"] == pytest.approx(today * (1 + rate) ** np.arange(5))
+
+
+def test_withdrawn_principal_leaves_the_liability():
+    weekly = project([100.0], [70], weeks=2, withdrawn=40.0)
+    full = project([100.0], [70], weeks=2)
+    assert weekly["liability"] == pytest.approx(full["liability"] - 40.0)
+    assert weekly["unlocked_principal"][0] == pytest.approx(60.0)
+    assert weekly["interest"] == pytest.approx(full["interest"])
+
+
+def test_report_counts_held_withdrawals_against_the_treasury(db, make_user):
+    from src.app.models import Deposit, WithdrawalRequest
+    user = make_user()
+    db.session.add(Deposit(user_id=user.id, amount=100.0, status="approved"))
+    db.session.add_all([
+        WithdrawalRequest(user_id=user.id, amount_micro=30_000_000, address="T", network="TRC20",
+                          status="approved", idempotency_key="a"),
+        WithdrawalRequest(user_id=user.id, amount_micro=20_000_000, address="T", network="TRC20",
+                          status="paid", idempotency_key="b"),
+        WithdrawalRequest(user_id=user.id, amount_micro=5_000_000, address="T", network="TRC20",
+                          status="rejected", idempotency_key="c"),
+    ])
+    db.session.commit()
+
+    result = report(weeks=1, rates=[WEEKLY_INTEREST_RATE], treasury=80.0, use_cache=False)
+
+    assert result["withdrawals"] == {"withdrawn": 50.0, "held": 30.0}
+    assert result["treasury"]["available"] == 50.0
+    assert result["scenarios"][0]["weeks"]["liability"][0] == pytest.approx(50.0)
@@ -0,0 +1,8 @@
+from src.app.query_plans import check_query_plans
+
+
+def test_hot_queries_use_an_index(db):
+    plans = check_query_plans()
+    assert plans
+    scans = [(name, plan) for name, plan, ok in plans if not ok]
+    assert scans == [], "full table scans (SCAN without USING INDEX) in hot queries"
@@ -0,0 +1,24 @@
+import pytest
+
+from src.app.ratelimit import MemoryStore, SQLiteStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return MemoryStore() if request.param == "memory" else SQLiteStore(str(tmp_path / "ratelimit.db"))
+
+
+def test_charges_every_bucket_or_none(store):
+    buckets = [("ip:a", 10, 1), ("user:1", 4, 2)]
+    assert store.take(buckets, 2, now=100) == (None, 0.0)
+    assert store.take(buckets, 2, now=100) == (None, 0.0)  # user:1 down to exactly 0
+    assert store.take(buckets, 2, now=100) == ("user:1", 1.0)
+    # the refused check charged nothing: ip:a still has 6, user:1 refills 2/s
+    assert store.take([("ip:a", 10, 1)], 6, now=100) == (None, 0.0)
+    assert store.take(buckets, 2, now=101) == ("ip:a", 1.0)
+    assert store.take(buckets, 2, now=102) == (None, 0.0)
+
+
+def test_refill_is_capped(store):
+    assert store.take([("ip:b", 5, 1)], 5, now=0) == (None, 0.0)
+    assert store.take([("ip:b", 5, 1)], 6, now=1000) == ("ip:b", 1.0)
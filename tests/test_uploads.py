@@ -0,0 +1,16 @@
+import io
+import os
+import stat
+
+from werkzeug.datastructures import FileStorage
+
+from src.app import uploads
+
+
+def test_stored_upload_is_world_readable(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_FOLDER", str(tmp_path))
+    digest, path, is_new = uploads.store_upload(FileStorage(io.BytesIO(b"%PDF-1.4 id card")), "id.pdf")
+
+    assert is_new and os.path.basename(path) == f"{digest}.pdf"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    assert os.listdir(tmp_path) == [os.path.basename(path)]  # no .part file left behind